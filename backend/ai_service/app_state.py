@@ -0,0 +1,188 @@
+import os
+import threading
+from typing import Any, Callable, Optional
+
+from chunk_cache import SessionChunkCache
+from embeddings import EMBED_BACKEND, EmbeddingService
+from executor import ExecutionLayer
+from kv_cache import SessionStateCache
+from llm_client import LLMClientLayer
+from llm_router import LLMRouter, parse_routes, parse_slos
+from llm_service import PROVIDER_MODELS, LLMService
+from prompt_builder import PROMPT_BUDGET_HISTORY_SUMMARY, HistoryCompressor, TokenCounter, history_summary_prompt
+from query_expansion import QueryExpander
+from readiness import Readiness
+from report_jobs import ReportJobQueue
+from report_store import ReportSweeper, create_report_store
+from session_sweeper import SessionSweeper
+from summaries import SummaryStore
+from transcripts import TranscriptStore
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+class lazy:
+    """Like functools.cached_property, but the factory runs at most once even
+    when first accessed from several threads (warm-up, pool workers)."""
+
+    def __init__(self, factory: Callable[[Any], Any]):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if self.name in obj.__dict__:
+            return obj.__dict__[self.name]
+        with obj._locks.setdefault(self.name, threading.Lock()):
+            if self.name not in obj.__dict__:
+                obj.__dict__[self.name] = self.factory(obj)
+        return obj.__dict__[self.name]
+
+
+class AppState:
+    """Every resource the service uses, each built on first access.
+
+    Nothing heavy happens at import or construction, so importing `main` is
+    cheap. Keyword arguments replace a resource outright, which is how tests
+    swap in fakes: `AppState(vectors=FakeStore(), embedder=FakeEmbedder())`.
+    """
+
+    # async (state, job) -> result, set by main; kept here so report jobs can reach it
+    report_runner: Optional[Callable] = None
+
+    def __init__(self, **overrides):
+        self._locks = {}
+        for name, value in overrides.items():
+            if not isinstance(getattr(type(self), name, None), lazy) and name != "report_runner":
+                raise TypeError(f"Unknown app state resource '{name}'")
+            self.__dict__[name] = value
+
+    def created(self, name: str) -> bool:
+        return name in self.__dict__
+
+    @lazy
+    def readiness(self):
+        return Readiness()
+
+    @lazy
+    def execution(self):
+        return ExecutionLayer()
+
+    @lazy
+    def embed_model(self):
+        with self.readiness.phase("embeddings"):
+            if EMBED_BACKEND == "onnx":
+                from onnx_embeddings import OnnxSentenceEncoder
+                return OnnxSentenceEncoder.load()
+            if EMBED_BACKEND != "torch":
+                raise ValueError(f"Unknown EMBED_BACKEND '{EMBED_BACKEND}', expected 'torch' or 'onnx'")
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(EMBED_MODEL_NAME)
+
+    @lazy
+    def embedder(self):
+        # The backend is part of the cache key: int8 vectors are close to, not equal to, torch's
+        return EmbeddingService(model_name=f"{EMBED_MODEL_NAME}:{EMBED_BACKEND}", executor=self.execution.embed_pool,
+                                loader=lambda: self.embed_model)
+
+    @lazy
+    def vectors(self):
+        from vector_store import VectorStore
+        return VectorStore.connect()
+
+    @lazy
+    def chunk_cache(self):
+        return SessionChunkCache()
+
+    @lazy
+    def summary_store(self):
+        return SummaryStore()
+
+    @lazy
+    def transcript_store(self):
+        return TranscriptStore()
+
+    @lazy
+    def llama_states(self):
+        # Per-session llama_cpp KV states so each turn only prefills the new suffix
+        return SessionStateCache()
+
+    @lazy
+    def token_counter(self):
+        # Switched to the real tokenizer once the local model is loaded
+        return TokenCounter()
+
+    @lazy
+    def llm_clients(self):
+        # Timeouts, retries and per-model circuit breakers around every LLM call
+        return LLMClientLayer()
+
+    @lazy
+    def llm_router(self):
+        # LLM_PROVIDER is the default route; LLM_ROUTES overrides it per call type.
+        # Read here rather than at import so a .env loaded by main applies.
+        routes = parse_routes(os.getenv("LLM_ROUTES", ""), os.getenv("LLM_PROVIDER", "groq").lower(),
+                              os.getenv("LLM_FALLBACK_PROVIDER", "").lower())
+        return LLMRouter(routes, parse_slos(), is_available=lambda provider: self.llm_clients.breaker(
+            provider, PROVIDER_MODELS[provider]).state != "open")
+
+    @lazy
+    def llm(self):
+        return LLMService(self.execution, self.llm_clients, self.llm_router, self.llama_states,
+                          self.token_counter, self.readiness, groq_api_key=os.getenv("GROQ_API_KEY"))
+
+    @lazy
+    def history_compressor(self):
+        async def summarize(previous_summary, turns):
+            return await self.llm.call(history_summary_prompt(previous_summary, turns),
+                                       max_tokens=PROMPT_BUDGET_HISTORY_SUMMARY, stop=["</s>"], call_type="summary")
+        return HistoryCompressor(self.token_counter, summarize)
+
+    @lazy
+    def query_expander(self):
+        # Late-bound so replaced embedder/llm are picked up
+        return QueryExpander(embed_query=lambda text: self.embedder.embed_query(text),
+                             call_llm=lambda *args, **kwargs: self.llm.call(*args, call_type="expansion", **kwargs))
+
+    @lazy
+    def report_store(self):
+        return create_report_store()
+
+    @lazy
+    def report_sweeper(self):
+        return ReportSweeper(self.report_store)
+
+    @lazy
+    def report_jobs(self):
+        return ReportJobQueue(lambda job: self.report_runner(self, job))
+
+    @lazy
+    def session_sweeper(self):
+        return SessionSweeper(self.vectors, forget=self.forget_session)
+
+    def forget_session(self, cv_session_id: str):
+        """Drops everything held in memory for a session."""
+        for name in ("chunk_cache", "llama_states", "history_compressor"):
+            if self.created(name):
+                getattr(self, name).evict(cv_session_id)
+        for name in ("summary_store", "transcript_store"):
+            if self.created(name):
+                getattr(self, name).delete(cv_session_id)
+
+    async def close(self):
+        """Stops whatever was started; resources never touched are left alone."""
+        if self.created("report_sweeper"):
+            await self.report_sweeper.stop()
+        if self.created("session_sweeper"):
+            await self.session_sweeper.stop()
+        if self.created("report_jobs"):
+            await self.report_jobs.stop()
+        if self.created("vectors"):
+            await self.vectors.close()
+        if self.created("execution"):
+            self.execution.shutdown(wait=False)
@@ -0,0 +1,363 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+import zipfile
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from executor import CPU_POOL_WORKERS, ExecutionLayer
+from ingest import (UPLOAD_MAX_BYTES, UPLOAD_MAX_PAGES, UPLOAD_READ_CHUNK_BYTES, UPLOAD_SPOOL_DIR, Embed,
+                    UploadRejected, extract_document, spool_upload)
+
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "500"))
+# Bytes spooled for one upload, counting PDFs unpacked from zips
+BULK_MAX_TOTAL_BYTES = int(os.getenv("BULK_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+# Documents extracted at once; each may fan out into page-range tasks
+BULK_EXTRACT_CONCURRENCY = int(os.getenv("BULK_EXTRACT_CONCURRENCY", str(CPU_POOL_WORKERS)))
+# Chunks per embedding call, filled across documents
+BULK_EMBED_BATCH_SIZE = int(os.getenv("BULK_EMBED_BATCH_SIZE", "256"))
+# Points per Qdrant upsert (384 floats each, ~1.5 KB)
+BULK_UPSERT_BATCH_SIZE = int(os.getenv("BULK_UPSERT_BATCH_SIZE", "512"))
+
+
+class BulkItem:
+    """One PDF of a bulk upload as it moves through the pipeline."""
+
+    def __init__(self, filename: str, path: Optional[str] = None, content_hash: Optional[str] = None,
+                 size: int = 0, error: Optional[str] = None):
+        self.filename = filename
+        self.path = path
+        self.content_hash = content_hash
+        self.size = size
+        self.error = error
+        self.cv_session_id = str(uuid.uuid4())
+        # Other files of the same upload with identical bytes share this item's points
+        self.duplicates: List["BulkItem"] = []
+        self.document = None
+        self.vectors: List[Optional[List[float]]] = []
+        self.embedded = 0
+        self.points_left = 0
+        self.point_ids: List[str] = []
+
+    def result(self, status: str, **extra) -> dict:
+        return {"event": "file", "filename": self.filename, "status": status,
+                "cv_session_id": self.cv_session_id if status != "failed" else None,
+                "error": self.error if status == "failed" else None, **extra}
+
+
+def _describe(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def _is_pdf(name: str) -> bool:
+    return name.lower().endswith(".pdf")
+
+
+def _spool_zip_members(path: str, max_bytes: int, max_files: int, max_total_bytes: int,
+                       directory: Optional[str]) -> List[BulkItem]:
+    """Unpacks the PDFs of a zip into temp files. Sizes are enforced on the
+    bytes actually read, not the (forgeable) sizes in the directory, and
+    members past `max_total_bytes` in all are rejected unread."""
+    items: List[BulkItem] = []
+    total = 0
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not _is_pdf(name) or info.filename.startswith("__MACOSX/"):
+                continue
+            if len(items) >= max_files:
+                items.append(BulkItem(name, error=f"More than {max_files} files in one upload"))
+                continue
+            if total >= max_total_bytes:
+                items.append(BulkItem(name, error=f"Upload unpacks to more than {max_total_bytes} bytes"))
+                continue
+            digest, size = hashlib.sha256(), 0
+            fd, member_path = tempfile.mkstemp(suffix=".pdf", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as out, archive.open(info) as member:
+                    while chunk := member.read(UPLOAD_READ_CHUNK_BYTES):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise UploadRejected(f"Upload is larger than {max_bytes} bytes")
+                        if total + size > max_total_bytes:
+                            total = max_total_bytes
+                            raise UploadRejected(f"Upload unpacks to more than {max_total_bytes} bytes")
+                        digest.update(chunk)
+                        out.write(chunk)
+            except Exception as e:
+                os.unlink(member_path)
+                items.append(BulkItem(name, error=str(e)))
+                continue
+            total += size
+            items.append(BulkItem(name, member_path, digest.hexdigest(), size))
+    return items
+
+
+async def spool_bulk_uploads(files, max_bytes: int = UPLOAD_MAX_BYTES, max_files: int = BULK_MAX_FILES,
+                             max_total_bytes: int = BULK_MAX_TOTAL_BYTES,
+                             directory: Optional[str] = UPLOAD_SPOOL_DIR) -> List[BulkItem]:
+    """Spools PDFs and the PDFs inside zips to temp files. Files that are
+    rejected come back as items with `error` set rather than raising."""
+    items: List[BulkItem] = []
+    for file in files:
+        total = sum(item.size for item in items)
+        name = file.filename or "upload"
+        if len(items) >= max_files:
+            items.append(BulkItem(name, error=f"More than {max_files} files in one upload"))
+            continue
+        if not (_is_pdf(name) or name.lower().endswith(".zip")):
+            items.append(BulkItem(name, error="Only PDF files (or zips of them) are supported."))
+            continue
+        try:
+            upload = await spool_upload(file, max_bytes if _is_pdf(name) else max_total_bytes - total, directory)
+        except UploadRejected as e:
+            items.append(BulkItem(name, error=str(e)))
+            continue
+        if _is_pdf(name) and total + upload.size > max_total_bytes:
+            os.unlink(upload.path)
+            items.append(BulkItem(name, error=f"Upload unpacks to more than {max_total_bytes} bytes"))
+            continue
+        if _is_pdf(name):
+            items.append(BulkItem(name, upload.path, upload.content_hash, upload.size))
+            continue
+        try:
+            items.extend(await asyncio.to_thread(_spool_zip_members, upload.path, max_bytes,
+                                                 max_files - len(items), max_total_bytes - total, directory))
+        except zipfile.BadZipFile as e:
+            items.append(BulkItem(name, error=f"Not a valid zip: {e}"))
+        finally:
+            os.unlink(upload.path)
+    return items
+
+
+def discard(items: List[BulkItem]):
+    for item in items:
+        if item.path is not None and os.path.exists(item.path):
+            os.unlink(item.path)
+
+
+class BulkIngestPipeline:
+    """Extract -> embed -> upsert for many CVs, each stage running concurrently.
+
+    - extract: up to `extract_concurrency` documents at once on the cpu pool
+    - embed: one consumer filling `embed_batch_size` batches across documents
+    - upsert: points grouped into `upsert_batch_size` batches, sent with
+      `wait=False`
+
+    `run` yields NDJSON-ready events: a "file" event per input as soon as it
+    is stored, deduplicated or failed, "progress" counters after each stage
+    step, and a final "done" summary. A failing file never fails the batch.
+
+    `on_ingested(cv_session_ids, content_hash, text, cv_summary)` is called
+    once per distinct document that was stored or aliased; `cv_summary` is
+    the one already on the points, if any.
+    """
+
+    def __init__(self, execution: ExecutionLayer, vectors, embed: Embed,
+                 on_ingested: Optional[Callable[[List[str], str, str, Optional[str]], None]] = None,
+                 extract_concurrency: int = BULK_EXTRACT_CONCURRENCY, embed_batch_size: int = BULK_EMBED_BATCH_SIZE,
+                 upsert_batch_size: int = BULK_UPSERT_BATCH_SIZE, max_pages: int = UPLOAD_MAX_PAGES):
+        self.execution = execution
+        self.vectors = vectors
+        self.embed = embed
+        self.on_ingested = on_ingested
+        self.extract_concurrency = max(1, extract_concurrency)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.max_pages = max_pages
+        self.counts = {"files": 0, "extracted": 0, "embedded_chunks": 0, "upserted_points": 0,
+                       "ingested": 0, "deduplicated": 0, "failed": 0}
+
+    async def run(self, items: List[BulkItem]) -> AsyncIterator[dict]:
+        events: asyncio.Queue = asyncio.Queue()
+        self.counts["files"] = len(items)
+        start = time.perf_counter()
+        runner = asyncio.create_task(self._run(items, events.put_nowait))
+        runner.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            await runner
+        except Exception as e:
+            # Only whole-batch steps (the dedup lookup) get here; files not yet reported are lost
+            print(f"Error in bulk ingest: {e}", flush=True)
+            yield {"event": "error", "error": _describe(e)}
+        finally:
+            runner.cancel()
+        yield {"event": "done", **self.counts, "seconds": round(time.perf_counter() - start, 3)}
+
+    def _progress(self) -> dict:
+        return {"event": "progress", **self.counts}
+
+    def _finish(self, emit, item: BulkItem, status: str, **extra):
+        self.counts[status] += 1
+        emit(item.result(status, **extra))
+
+    def _fail(self, emit, item: BulkItem, error: str):
+        # Duplicates within the upload share the primary's fate
+        for failed in [item] + item.duplicates:
+            failed.error = error
+            self._finish(emit, failed, "failed")
+
+    async def _run(self, items: List[BulkItem], emit):
+        pending: List[BulkItem] = []
+        for item in items:
+            if item.error is not None:
+                self._finish(emit, item, "failed")
+            else:
+                pending.append(item)
+
+        # Files already in Qdrant (one lookup for the whole upload) only gain session ids
+        existing = await self.vectors.find_contents(list({item.content_hash for item in pending}))
+        fresh: Dict[str, BulkItem] = {}
+        aliased: Dict[str, List[BulkItem]] = {}
+        for item in pending:
+            if item.content_hash in existing:
+                aliased.setdefault(item.content_hash, []).append(item)
+            elif item.content_hash in fresh:
+                fresh[item.content_hash].duplicates.append(item)
+            else:
+                fresh[item.content_hash] = item
+        for content_hash, group in aliased.items():
+            points = existing[content_hash]
+            try:
+                await self.vectors.add_sessions(points, [item.cv_session_id for item in group])
+            except Exception as e:
+                for item in group:
+                    item.error = _describe(e)
+                    self._finish(emit, item, "failed")
+                continue
+            for item in group:
+                self._finish(emit, item, "deduplicated", chunk_count=len(points))
+            if self.on_ingested is not None:
+                points.sort(key=lambda p: p.payload.get("chunk_index", 0))
+                self.on_ingested([item.cv_session_id for item in group], content_hash,
+                                 "\n\n".join(p.payload["text"] for p in points), points[0].payload.get("cv_summary"))
+
+        extracted: asyncio.Queue = asyncio.Queue()
+        embedded: asyncio.Queue = asyncio.Queue()
+        stages = [
+            asyncio.create_task(self._extract_all(list(fresh.values()), extracted, emit)),
+            asyncio.create_task(self._embed_stage(extracted, embedded, emit)),
+            asyncio.create_task(self._upsert_stage(embedded, emit)),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+
+    async def _extract_all(self, items: List[BulkItem], out: asyncio.Queue, emit):
+        slots = asyncio.Semaphore(self.extract_concurrency)
+
+        async def extract(item: BulkItem):
+            async with slots:
+                try:
+                    item.document = await extract_document(self.execution, item.path, max_pages=self.max_pages)
+                except Exception as e:
+                    self._fail(emit, item, str(e) if isinstance(e, UploadRejected) else _describe(e))
+                    return
+            if not item.document.chunks:
+                self._fail(emit, item, "No text found in PDF")
+                return
+            item.vectors = [None] * len(item.document.chunks)
+            self.counts["extracted"] += 1
+            emit(self._progress())
+            out.put_nowait(item)
+
+        await asyncio.gather(*(extract(item) for item in items))
+        out.put_nowait(None)
+
+    async def _embed_stage(self, source: asyncio.Queue, out: asyncio.Queue, emit):
+        # (item, chunk index) pairs waiting for a full batch
+        batch: List[tuple] = []
+
+        async def flush():
+            taken, batch[:] = list(batch), []
+            texts = [item.document.chunks[i].text for item, i in taken]
+            try:
+                vectors = await self.embed(texts)
+            except Exception as e:
+                for item in {id(item): item for item, _ in taken}.values():
+                    if item.error is None:
+                        self._fail(emit, item, _describe(e))
+                return
+            self.counts["embedded_chunks"] += len(taken)
+            for (item, i), vector in zip(taken, vectors):
+                item.vectors[i] = vector
+                item.embedded += 1
+                if item.embedded == len(item.vectors) and item.error is None:
+                    out.put_nowait(item)
+            emit(self._progress())
+
+        while (item := await source.get()) is not None:
+            batch.extend((item, i) for i in range(len(item.document.chunks)))
+            while len(batch) >= self.embed_batch_size:
+                overflow = batch[self.embed_batch_size:]
+                del batch[self.embed_batch_size:]
+                await flush()
+                batch.extend(overflow)
+        if batch:
+            await flush()
+        out.put_nowait(None)
+
+    async def _upsert_stage(self, source: asyncio.Queue, emit):
+        points: List = []
+        owners: List[BulkItem] = []
+
+        async def flush():
+            # Points of a file that failed in an earlier batch are dropped
+            kept = [(point, item) for point, item in zip(points, owners) if item.error is None]
+            points.clear()
+            owners.clear()
+            if not kept:
+                return
+            taken, taken_owners = [point for point, _ in kept], [item for _, item in kept]
+            try:
+                await self.vectors.upsert_points(taken, wait=False)
+            except Exception as e:
+                for item in {id(item): item for item in taken_owners}.values():
+                    if item.error is None:
+                        await self._discard_points(item)
+                        self._fail(emit, item, _describe(e))
+                return
+            self.counts["upserted_points"] += len(taken)
+            for item in taken_owners:
+                item.points_left -= 1
+                if item.points_left == 0 and item.error is None:
+                    self._stored(emit, item)
+            emit(self._progress())
+
+        while (item := await source.get()) is not None:
+            document = item.document
+            session_ids = [item.cv_session_id] + [d.cv_session_id for d in item.duplicates]
+            item_points = self.vectors.chunk_points(session_ids, item.content_hash, [c.text for c in document.chunks],
+                                                    item.vectors, [c.section for c in document.chunks])
+            item.points_left = len(item_points)
+            item.point_ids = [point.id for point in item_points]
+            for point in item_points:
+                points.append(point)
+                owners.append(item)
+                if len(points) >= self.upsert_batch_size:
+                    await flush()
+        if points:
+            await flush()
+
+    async def _discard_points(self, item: BulkItem):
+        """Deletes what earlier batches stored of a failed file; a partial
+        copy would otherwise be what the next upload deduplicates against."""
+        try:
+            await self.vectors.delete_points(item.point_ids)
+        except Exception as e:
+            print(f"DEBUG: Could not delete partial points of {item.filename}: {e}", flush=True)
+
+    def _stored(self, emit, item: BulkItem):
+        chunk_count = len(item.document.chunks)
+        self._finish(emit, item, "ingested", chunk_count=chunk_count, pages=item.document.pages)
+        for duplicate in item.duplicates:
+            self._finish(emit, duplicate, "deduplicated", chunk_count=chunk_count)
+        if self.on_ingested is not None:
+            self.on_ingested([item.cv_session_id] + [d.cv_session_id for d in item.duplicates], item.content_hash,
+                             item.document.text, None)
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+CHUNK_CACHE_MAX_BYTES = int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CHUNK_CACHE_TTL_SECONDS = float(os.getenv("CHUNK_CACHE_TTL_SECONDS", "3600"))
+
+
+class _SessionChunks:
+    __slots__ = ("matrix", "texts", "sections", "nbytes", "expires_at")
+
+    def __init__(self, matrix: np.ndarray, texts: List[str], sections: Optional[np.ndarray], expires_at: float):
+        self.matrix = matrix
+        self.texts = texts
+        self.sections = sections
+        self.nbytes = matrix.nbytes + sum(len(t) for t in texts) + (sections.nbytes if sections is not None else 0)
+        self.expires_at = expires_at
+
+
+class SessionChunkCache:
+    """LRU/TTL cache of each session's chunk vectors as one normalized matrix.
+
+    A CV is only a few dozen chunks, so top-k is a single matrix-vector
+    product instead of a filtered Qdrant query. Eviction is by total bytes
+    (least recently used first) and by idle TTL.
+    """
+
+    def __init__(self, max_bytes: int = CHUNK_CACHE_MAX_BYTES, ttl_seconds: float = CHUNK_CACHE_TTL_SECONDS,
+                 clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, _SessionChunks]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, session_id: str, vectors: List[List[float]], texts: List[str],
+            sections: Optional[List[Optional[str]]] = None):
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        section_array = np.asarray(sections, dtype=object) if sections is not None else None
+        entry = _SessionChunks(np.ascontiguousarray(matrix), list(texts), section_array, self._clock() + self.ttl_seconds)
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(session_id)
+            self._entries[session_id] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def search(self, session_id: str, query_vector: List[float], limit: int = 5,
+               section: Optional[str] = None) -> Optional[List[str]]:
+        """Top-`limit` chunk texts by cosine similarity, or None on a miss.
+        With `section`, only chunks tagged with that section are ranked."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            now = self._clock()
+            if entry is not None and entry.expires_at <= now:
+                self._remove(session_id)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.expires_at = now + self.ttl_seconds
+            self._entries.move_to_end(session_id)
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        candidates = np.arange(len(entry.texts))
+        if section is not None:
+            if entry.sections is None:
+                return []
+            candidates = np.flatnonzero(entry.sections == section)
+        scores = entry.matrix[candidates] @ query if section is not None else entry.matrix @ query
+        k = min(limit, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [entry.texts[candidates[i]] for i in top]
+
+    def evict(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,231 @@
+import os
+import re
+from itertools import groupby
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from prompt_builder import TokenCounter
+
+# Chunk sizes are TokenCounter estimates (3.5 chars per token, see
+# prompt_builder). all-MiniLM-L6-v2 truncates at 256 word pieces; max + min
+# is at most 770 characters, which stays under that
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "180"))
+# Chunks smaller than this are merged into a neighbour of the same section
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "40"))
+# Tokens repeated at the start of the next piece when a long block is split
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
+
+# Text before the first recognised heading (name, title, contact details)
+HEADER_SECTION = "header"
+
+# Canonical section -> heading phrases seen on CVs
+SECTION_HEADINGS: Dict[str, List[str]] = {
+    "summary": ["summary", "professional summary", "profile", "about", "about me", "objective", "career objective"],
+    "experience": ["experience", "work experience", "professional experience", "employment", "employment history",
+                   "work history", "career history"],
+    "skills": ["skills", "technical skills", "core skills", "competencies", "core competencies", "technologies",
+               "tech stack", "tools"],
+    "projects": ["projects", "personal projects", "selected projects", "side projects"],
+    "education": ["education", "academic background", "qualifications", "academic qualifications"],
+    "certifications": ["certifications", "certificates", "licenses", "courses", "training"],
+    "languages": ["languages"],
+    "publications": ["publications", "talks", "publications and talks"],
+    "awards": ["awards", "honors", "honours", "achievements"],
+    "interests": ["interests", "hobbies", "volunteering", "volunteer experience"],
+}
+SECTIONS = tuple(SECTION_HEADINGS) + (HEADER_SECTION,)
+_HEADING_TO_SECTION = {phrase: section for section, phrases in SECTION_HEADINGS.items() for phrase in phrases}
+_HEADING_MAX_WORDS = 5
+
+
+class Chunk(NamedTuple):
+    text: str
+    section: str
+
+
+def _normalize_heading(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z& ]", " ", text.lower())).strip()
+
+
+def heading_section(line: dict, body_size: float) -> Optional[str]:
+    """Section a line opens, if it is a heading.
+
+    A line that is exactly a known heading phrase counts regardless of style,
+    so plain-text CVs work. A short bold or larger-than-body line only needs
+    to contain one ("Work Experience & Internships"); bold alone is not
+    enough, since job titles are usually bold too.
+    """
+    text = _normalize_heading(line["text"])
+    if not text or len(text.split()) > _HEADING_MAX_WORDS:
+        return None
+    if text in _HEADING_TO_SECTION:
+        return _HEADING_TO_SECTION[text]
+    if line.get("bold") or line.get("size", 0) > body_size * 1.1:
+        for phrase in sorted(_HEADING_TO_SECTION, key=len, reverse=True):
+            if re.search(rf"\b{re.escape(phrase)}\b", text):
+                return _HEADING_TO_SECTION[phrase]
+    return None
+
+
+def _add_size_weights(weights: Dict[float, int], lines: List[dict]) -> Dict[float, int]:
+    for line in lines:
+        size = round(line.get("size", 0), 1)
+        weights[size] = weights.get(size, 0) + len(line["text"])
+    return weights
+
+
+def _body_size(weights: Dict[float, int]) -> float:
+    # Most common font size by characters is the body text
+    return max(weights, key=weights.get) if weights else 0.0
+
+
+def _is_noise(text: str) -> bool:
+    # Page numbers, bullets and rules carry no retrievable content
+    return sum(c.isalpha() for c in text) < 2
+
+
+def section_paragraphs(lines: List[dict], body_size: Optional[float] = None,
+                       section: str = HEADER_SECTION) -> Tuple[List[Chunk], str]:
+    """Paragraphs (consecutive lines of one PDF block) tagged with the
+    section they fall under, and the section still open after the last line.
+    Heading lines themselves are dropped."""
+    if body_size is None:
+        body_size = _body_size(_add_size_weights({}, lines))
+    paragraphs: List[Chunk] = []
+    current: List[str] = []
+    current_block = None
+
+    def flush():
+        if current:
+            paragraphs.append(Chunk(" ".join(current), section))
+            current.clear()
+
+    for line in lines:
+        text = line["text"].strip()
+        if _is_noise(text):
+            continue
+        opened = heading_section(line, body_size)
+        if opened is not None:
+            flush()
+            section = opened
+            current_block = None
+            continue
+        if line.get("block") != current_block:
+            flush()
+            current_block = line.get("block")
+        current.append(text)
+    flush()
+    return paragraphs, section
+
+
+def _windows(text: str, max_tokens: int, overlap: int, counter: TokenCounter) -> List[str]:
+    """Splits `text` at word boundaries into pieces of at most `max_tokens`,
+    each starting with the last ~`overlap` tokens of the previous one."""
+    words = text.split()
+    costs = [counter.count(word + " ") for word in words]
+    pieces, start = [], 0
+    while start < len(words):
+        end, used = start, 0
+        while end < len(words) and (end == start or used + costs[end] <= max_tokens):
+            used += costs[end]
+            end += 1
+        pieces.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        back, carried = end, 0
+        while back > start + 1 and carried + costs[back - 1] <= overlap:
+            back -= 1
+            carried += costs[back]
+        start = back
+    return pieces
+
+
+def pack_section(paragraphs: Iterable[str], counter: TokenCounter, max_tokens: int = CHUNK_MAX_TOKENS,
+                 min_tokens: int = CHUNK_MIN_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Packs one section's paragraphs into chunks of about `max_tokens`:
+    small paragraphs are merged and oversize ones split with overlap. A
+    fragment under `min_tokens` is never left on its own if a neighbour can
+    take it, even if that stretches the neighbour by up to `min_tokens`."""
+    chunks: List[str] = []
+    current = ""
+    for paragraph in paragraphs:
+        merged = f"{current}\n{paragraph}" if current else paragraph
+        size = counter.count(merged)
+        fragment = bool(current) and counter.count(current) < min_tokens
+        if size <= max_tokens or (fragment and size <= max_tokens + min_tokens):
+            current = merged
+            continue
+        if counter.count(paragraph) > max_tokens:
+            # A fragment in front of an oversize block rides along into its first piece
+            if current and not fragment:
+                chunks.append(current)
+            chunks.extend(_windows(merged if fragment else paragraph, max_tokens, overlap, counter))
+            current = ""
+            continue
+        chunks.append(current)
+        current = paragraph
+    if current:
+        if chunks and counter.count(current) < min_tokens and \
+                counter.count(f"{chunks[-1]}\n{current}") <= max_tokens + min_tokens:
+            chunks[-1] = f"{chunks[-1]}\n{current}"
+        else:
+            chunks.append(current)
+    return chunks
+
+
+class StreamingChunker:
+    """`chunk_lines` for lines that arrive a page range at a time.
+
+    `feed` returns the chunks of every section that a later heading has
+    closed, so they can be embedded while further pages are still being
+    extracted; the open section is held back until `finish`. The body font
+    size is estimated from the lines seen so far.
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None, max_tokens: int = CHUNK_MAX_TOKENS,
+                 min_tokens: int = CHUNK_MIN_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS):
+        self.counter = counter or TokenCounter()
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.overlap = overlap
+        self.section = HEADER_SECTION
+        self._open: List[str] = []
+        self._sizes: Dict[float, int] = {}
+
+    def _pack(self, section: str, texts: List[str]) -> List[Chunk]:
+        packed = pack_section(texts, self.counter, self.max_tokens, self.min_tokens, self.overlap)
+        return [Chunk(text, section) for text in packed]
+
+    def feed(self, lines: List[dict]) -> List[Chunk]:
+        _add_size_weights(self._sizes, lines)
+        paragraphs, end_section = section_paragraphs(lines, _body_size(self._sizes), self.section)
+        runs = [(section, [p.text for p in group]) for section, group in groupby(paragraphs, key=lambda p: p.section)]
+        if self._open:
+            if runs and runs[0][0] == self.section:
+                runs[0] = (self.section, self._open + runs[0][1])
+            else:
+                runs.insert(0, (self.section, self._open))
+        self._open = []
+        if runs and runs[-1][0] == end_section:
+            self._open = runs.pop()[1]
+        self.section = end_section
+        chunks: List[Chunk] = []
+        for section, texts in runs:
+            chunks.extend(self._pack(section, texts))
+        return chunks
+
+    def finish(self) -> List[Chunk]:
+        chunks = self._pack(self.section, self._open) if self._open else []
+        self._open = []
+        return chunks
+
+
+def chunk_lines(lines: List[dict], counter: Optional[TokenCounter] = None, max_tokens: int = CHUNK_MAX_TOKENS,
+                min_tokens: int = CHUNK_MIN_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Chunk]:
+    """Section-aware chunks from `documents.extract_pdf_lines` output, in
+    document order. A section that appears twice is chunked per appearance."""
+    chunker = StreamingChunker(counter, max_tokens, min_tokens, overlap)
+    return chunker.feed(lines) + chunker.finish()
+
+
+def lines_text(lines: List[dict]) -> str:
+    return "\n".join(line["text"] for line in lines)
@@ -0,0 +1,101 @@
+import fitz  # PyMuPDF
+from fpdf import FPDF
+
+# Module-level functions so they can be shipped to a process pool.
+
+def _open_pdf(source):
+    # A path lets process-pool workers open the spooled upload instead of receiving its bytes
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source, filetype="pdf")
+
+def pdf_page_count(source) -> int:
+    with _open_pdf(source) as doc:
+        return doc.page_count
+
+def extract_pdf_lines(source, start: int = 0, stop: int = None) -> list:
+    """Text lines of pages [start, stop) with the font details the chunker
+    uses to find headings: {"text", "size" (largest span), "bold", "block"
+    (unique per page block), "page"}. `source` is PDF bytes or a file path."""
+    with _open_pdf(source) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        return [line for number in range(start, stop) for line in _page_lines(doc[number])]
+
+def _page_lines(page) -> list:
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:  # images
+            continue
+        for line in block["lines"]:
+            spans = [s for s in line["spans"] if s["text"].strip()]
+            if not spans:
+                continue
+            lines.append({
+                "text": "".join(s["text"] for s in line["spans"]).strip(),
+                "size": max(s["size"] for s in spans),
+                # flags bit 4 is bold; some fonts only say so in their name
+                "bold": all(s["flags"] & 16 or "bold" in s["font"].lower() for s in spans),
+                "block": (page.number, block["number"]),
+                "page": page.number,
+            })
+    return lines
+
+class ReportPDF(FPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 15)
+        self.cell(0, 10, 'IntelliView AI - Candidate Evaluation Report', 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+def render_report(candidate_name: str, evaluation: dict) -> bytes:
+    pdf = ReportPDF()
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(pdf.epw, 10, f"Candidate: {candidate_name}", 0, 1)
+
+    # Score Grid
+    pdf.set_font('Arial', 'B', 10)
+    col_width = pdf.epw / 4
+    pdf.cell(col_width, 10, f"Technical: {evaluation['technical_score']}/10", 1, 0)
+    pdf.cell(col_width, 10, f"Comm: {evaluation['communication_score']}/10", 1, 0)
+    pdf.cell(col_width, 10, f"Problem: {evaluation['problem_solving_score']}/10", 1, 0)
+    pdf.cell(col_width, 10, f"Match: {evaluation['experience_match_score']}/10", 1, 1)
+
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(pdf.epw, 10, "Auditor Review Notes:", 0, 1)
+    pdf.set_font('Arial', 'I', 10)
+    pdf.multi_cell(pdf.epw, 6, evaluation['auditor_notes'])
+
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(pdf.epw, 10, "Executive Summary & Recommendation:", 0, 1)
+    pdf.set_font('Arial', '', 11)
+    pdf.multi_cell(pdf.epw, 7, evaluation['summary'])
+
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(pdf.epw, 10, "Proven Technical Skills (Evidence-Based):", 0, 1)
+    pdf.set_font('Arial', '', 10)
+    for skill in evaluation['proven_skills']:
+        pdf.cell(pdf.epw, 7, f"* {skill}", 0, 1)
+
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(pdf.epw, 10, "Key Strengths:", 0, 1)
+    pdf.set_font('Arial', '', 10)
+    for s in evaluation['strengths']:
+        pdf.multi_cell(pdf.epw, 6, f"+ {s}")
+
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 11)
+    pdf.cell(pdf.epw, 10, "Critical Weaknesses:", 0, 1)
+    pdf.set_font('Arial', '', 10)
+    for w in evaluation['weaknesses']:
+        pdf.multi_cell(pdf.epw, 6, f"- {w}")
+
+    return bytes(pdf.output())
@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional
+
+from metrics import EMBEDDING, QUERY_EMBEDDING, stage
+
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_CHUNK_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CHUNK_CACHE_MAX_ENTRIES", "50000"))
+EMBED_QUERY_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_QUERY_CACHE_MAX_ENTRIES", "10000"))
+EMBED_QUERY_CACHE_TTL_SECONDS = float(os.getenv("EMBED_QUERY_CACHE_TTL_SECONDS", "3600"))
+# "torch" runs SentenceTransformer; "onnx" the onnxruntime export (see onnx_embeddings.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+
+
+class BatchStats:
+    """Running batch-size / latency counters for one embedding path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_size = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, batch_size: int, latency: float):
+        with self._lock:
+            self.batches += 1
+            self.items += batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "avg_latency_ms": round(self.total_latency / self.batches * 1000, 2) if self.batches else 0.0,
+                "max_latency_ms": round(self.max_latency * 1000, 2),
+            }
+
+
+def normalize_text(text: str) -> str:
+    # all-MiniLM-L6-v2 is uncased, so case-folding does not change the vector
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """Thread-safe LRU of vectors keyed by model name + normalized text.
+
+    Entries expire `ttl_seconds` after they were stored (0 disables expiry).
+    """
+
+    def __init__(self, model_name: str, max_entries: int, ttl_seconds: float = 0, clock=time.monotonic):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and entry[1] <= self._clock():
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, text: str, vector: List[float]):
+        if self.max_entries <= 0:
+            return
+        key = self.key(text)
+        with self._lock:
+            self._entries[key] = (vector, self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class EmbeddingService:
+    """Wraps the sentence embedding model.
+
+    `encode_batch` encodes a whole document's chunks in one forward pass;
+    `embed_query` groups concurrent single-query calls into micro-batches
+    of at most `max_batch_size`, waiting at most `max_wait_ms` for stragglers.
+    Both paths check an embedding cache before touching the model.
+    """
+
+    def __init__(self, model=None, model_name: str = "default", max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+                 max_wait_ms: float = EMBED_MAX_WAIT_MS, executor: Optional[Executor] = None,
+                 loader: Optional[Callable[[], Any]] = None):
+        # Either a model, or a loader called on first encode (on a pool thread)
+        self._model = model
+        self._loader = loader
+        self._model_lock = threading.Lock()
+        self.model_name = model_name
+        self.executor = executor
+        self.chunk_cache = EmbeddingCache(model_name, EMBED_CHUNK_CACHE_MAX_ENTRIES)
+        self.query_cache = EmbeddingCache(model_name, EMBED_QUERY_CACHE_MAX_ENTRIES, EMBED_QUERY_CACHE_TTL_SECONDS)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.ingest_stats = BatchStats()
+        self.query_stats = BatchStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._loader()
+        return self._model
+
+    def warm_up(self):
+        """Loads the model and runs one encode that bypasses the caches."""
+        self._encode(["warm-up"])
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts, batch_size=self.max_batch_size, convert_to_numpy=True).tolist()
+
+    def encode_batch(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = [self.chunk_cache.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            start = time.perf_counter()
+            with stage(EMBEDDING):
+                encoded = self._encode([texts[i] for i in missing])
+            self.ingest_stats.record(len(missing), time.perf_counter() - start)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+                self.chunk_cache.put(texts[i], vector)
+        return vectors
+
+    async def embed_query(self, text: str) -> List[float]:
+        cached = self.query_cache.get(text)
+        if cached is not None:
+            return cached
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            # Concurrent identical queries (e.g. gateway retries) are encoded once
+            keys = {}
+            for text, _ in batch:
+                keys.setdefault(self.query_cache.key(text), text)
+            texts = list(keys.values())
+            start = time.perf_counter()
+            try:
+                with stage(QUERY_EMBEDDING):
+                    vectors = await self._loop.run_in_executor(self.executor, self._encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.query_stats.record(len(texts), time.perf_counter() - start)
+            by_key = dict(zip(keys, vectors))
+            for text, vector in zip(texts, vectors):
+                self.query_cache.put(text, vector)
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_key[self.query_cache.key(text)])
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "ingest": self.ingest_stats.snapshot(),
+            "query": self.query_stats.snapshot(),
+            "chunk_cache": self.chunk_cache.stats(),
+            "query_cache": self.query_cache.stats(),
+        }
@@ -0,0 +1,156 @@
+import json
+import math
+import os
+from typing import Annotated, List
+
+from pydantic import BaseModel, Field, StringConstraints, ValidationError, field_validator
+
+EVALUATION_ITEM_MAX_CHARS = int(os.getenv("EVALUATION_ITEM_MAX_CHARS", "160"))
+EVALUATION_MAX_ITEMS = int(os.getenv("EVALUATION_MAX_ITEMS", "5"))
+EVALUATION_TEXT_MAX_CHARS = int(os.getenv("EVALUATION_TEXT_MAX_CHARS", "600"))
+# Budget multiplier for the one retry after an answer ran out of tokens
+EVALUATION_RETRY_TOKEN_FACTOR = float(os.getenv("EVALUATION_RETRY_TOKEN_FACTOR", "2"))
+
+Item = Annotated[str, StringConstraints(max_length=EVALUATION_ITEM_MAX_CHARS)]
+Text = Annotated[str, StringConstraints(max_length=EVALUATION_TEXT_MAX_CHARS)]
+Score = Annotated[int, Field(ge=0, le=10)]
+
+
+class Evaluation(BaseModel):
+    """Shape of the evaluation LLM call. Field order matters: the grammar makes
+    the model write `auditor_notes` before committing to scores."""
+
+    auditor_notes: Text
+    technical_score: Score
+    communication_score: Score
+    problem_solving_score: Score
+    experience_match_score: Score
+    strengths: List[Item] = Field(max_length=EVALUATION_MAX_ITEMS)
+    weaknesses: List[Item] = Field(max_length=EVALUATION_MAX_ITEMS)
+    proven_skills: List[Item] = Field(max_length=EVALUATION_MAX_ITEMS)
+    summary: Text
+
+    @field_validator("technical_score", "communication_score", "problem_solving_score",
+                     "experience_match_score", mode="before")
+    @classmethod
+    def _clamp_score(cls, value):
+        # Hosted JSON mode only guarantees valid JSON, not the bounds
+        return min(10, max(0, int(value))) if isinstance(value, (int, float)) else value
+
+    @field_validator("auditor_notes", "summary", mode="before")
+    @classmethod
+    def _clip_text(cls, value):
+        return value[:EVALUATION_TEXT_MAX_CHARS] if isinstance(value, str) else value
+
+    @field_validator("strengths", "weaknesses", "proven_skills", mode="before")
+    @classmethod
+    def _clip_items(cls, value):
+        # Length limits are not in the grammar (see grammar_schema), so enforce them here
+        if not isinstance(value, list):
+            return value
+        return [v[:EVALUATION_ITEM_MAX_CHARS] if isinstance(v, str) else v for v in value[:EVALUATION_MAX_ITEMS]]
+
+
+EVALUATION_SCHEMA = Evaluation.model_json_schema()
+
+DEFAULT_EVALUATION = {
+    "technical_score": 1,
+    "communication_score": 1,
+    "problem_solving_score": 1,
+    "experience_match_score": 1,
+    "auditor_notes": "N/A",
+    "summary": "The evaluation failed due to insufficient data or LLM error.",
+    "strengths": ["N/A"],
+    "weaknesses": ["Analysis failed: Transcript likely too short or incoherent."],
+    "proven_skills": ["None detected"],
+}
+
+
+class EvaluationTruncated(ValueError):
+    """The model stopped before closing the evaluation object."""
+
+
+def grammar_schema(schema: dict) -> dict:
+    """`schema` without string length limits. llama_cpp's GBNF converter
+    unrolls maxLength into one nested rule per character, which makes the
+    grammar huge and sampling slow; lengths are clipped on validation instead.
+    maxItems and the score bounds stay in the grammar."""
+    if isinstance(schema, dict):
+        return {k: grammar_schema(v) for k, v in schema.items() if k not in ("maxLength", "minLength")}
+    if isinstance(schema, list):
+        return [grammar_schema(v) for v in schema]
+    return schema
+
+
+def max_json_chars(schema: dict) -> int:
+    """Upper bound on the serialized length of a document matching `schema`."""
+    kind = schema.get("type")
+    if kind == "object":
+        props = schema.get("properties", {})
+        return 2 + sum(len(name) + 4 + max_json_chars(sub) for name, sub in props.items()) + len(props)
+    if kind == "array":
+        return 2 + schema.get("maxItems", 1) * (max_json_chars(schema.get("items", {})) + 2)
+    if kind == "string":
+        return schema.get("maxLength", 256) + 2
+    if kind == "integer":
+        return len(str(schema.get("maximum", 10 ** 6)))
+    return 16
+
+
+def schema_max_tokens(schema: dict = EVALUATION_SCHEMA, chars_per_token: float = 3.0) -> int:
+    """Token budget that fits an answer honouring every bound in `schema`.
+    Neither the grammar nor hosted JSON mode enforces string lengths, so a
+    verbose model can still overrun it; see `evaluation_truncated`."""
+    return math.ceil(max_json_chars(schema) / chars_per_token)
+
+
+def evaluation_truncated(text: str) -> bool:
+    """True when `text` opens a JSON object but ends inside it, i.e. the
+    model hit max_tokens mid-answer rather than ignoring the format."""
+    start = text.find("{")
+    if start == -1:
+        return False
+    depth, in_string, escaped = 0, False, False
+    for char in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return False
+    return True
+
+
+def parse_evaluation(text: str) -> dict:
+    """Validates the model output against `Evaluation`.
+
+    Constrained decoding makes the first branch the normal path; the brace
+    scan and defaults only cover providers that ignored the constraint.
+    """
+    try:
+        return Evaluation.model_validate_json(text).model_dump()
+    except ValidationError:
+        pass
+    evaluation = {}
+    start_idx, end_idx = text.find("{"), text.rfind("}")
+    if start_idx != -1:
+        try:
+            evaluation = json.loads(text[start_idx:end_idx + 1])
+        except ValueError as e:
+            print(f"JSON Extraction Error: {e}. Raw: {text}")
+    else:
+        print(f"JSON Extraction Error: no JSON object in LLM output. Raw: {text}")
+    if not isinstance(evaluation, dict):
+        evaluation = {}
+    for key, value in DEFAULT_EVALUATION.items():
+        evaluation.setdefault(key, value)
+    return evaluation
@@ -0,0 +1,47 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+# "thread" keeps everything in-process; "process" sidesteps the GIL for
+# PDF extraction/rendering at the cost of pickling the inputs.
+CPU_POOL_KIND = os.getenv("CPU_POOL_KIND", "thread").lower()
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMBED_POOL_WORKERS = int(os.getenv("EMBED_POOL_WORKERS", "2"))
+
+
+class ExecutionLayer:
+    """Bounded pools that keep blocking work off the event loop.
+
+    - cpu: PDF text extraction and PDF rendering (thread or process pool)
+    - embed: SentenceTransformer inference (threads; torch releases the GIL)
+    - llm: local llama_cpp inference, single worker since a Llama instance
+      is not safe to call concurrently
+    """
+
+    def __init__(self, cpu_kind: str = CPU_POOL_KIND, cpu_workers: int = CPU_POOL_WORKERS,
+                 embed_workers: int = EMBED_POOL_WORKERS):
+        if cpu_kind == "process":
+            self.cpu_pool: Executor = ProcessPoolExecutor(max_workers=cpu_workers)
+        else:
+            self.cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="cpu")
+        self.embed_pool = ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="embed")
+        self.llm_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm")
+
+    @staticmethod
+    async def _run(pool: Executor, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+    async def run_cpu(self, fn, *args, **kwargs):
+        return await self._run(self.cpu_pool, fn, *args, **kwargs)
+
+    async def run_embed(self, fn, *args, **kwargs):
+        return await self._run(self.embed_pool, fn, *args, **kwargs)
+
+    async def run_llm(self, fn, *args, **kwargs):
+        return await self._run(self.llm_pool, fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        for pool in (self.cpu_pool, self.embed_pool, self.llm_pool):
+            pool.shutdown(wait=wait, cancel_futures=True)
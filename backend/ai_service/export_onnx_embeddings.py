@@ -0,0 +1,65 @@
+"""Exports all-MiniLM-L6-v2 to ONNX (fp32 and dynamic int8) for EMBED_BACKEND=onnx
+and checks the result against the PyTorch SentenceTransformer.
+
+    python export_onnx_embeddings.py [output_dir]
+
+Needs torch, transformers, onnx, onnxruntime and sentence-transformers; the
+service itself only needs onnxruntime and tokenizers at runtime.
+"""
+import os
+import sys
+
+from onnx_embeddings import (EMBED_ONNX_DIR, EMBED_ONNX_MIN_COSINE, MODEL_FILE, QUANTIZED_MODEL_FILE,
+                             OnnxSentenceEncoder, cosine_parity)
+
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def export(output_dir: str):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+    model = AutoModel.from_pretrained(MODEL_ID).eval()
+    # Writes tokenizer.json, which OnnxSentenceEncoder loads with `tokenizers`
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    inputs = ("input_ids", "attention_mask", "token_type_ids")
+    dynamic = {"batch": 0, "sequence": 1}
+    fp32_path = os.path.join(output_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in inputs),
+            fp32_path,
+            input_names=list(inputs),
+            output_names=["token_embeddings"],
+            dynamic_axes={**{name: dynamic for name in inputs}, "token_embeddings": dynamic},
+            opset_version=17,
+            dynamo=False,
+        )
+    quantize_dynamic(fp32_path, os.path.join(output_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+    print(f"Exported {MODEL_ID} to {output_dir}")
+
+
+def check(output_dir: str) -> bool:
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer("all-MiniLM-L6-v2")
+    ok = True
+    for quantized in (False, True):
+        result = cosine_parity(reference, OnnxSentenceEncoder.load(output_dir, quantized=quantized))
+        passed = result["dim"] == 384 and result["min_cosine"] >= EMBED_ONNX_MIN_COSINE
+        ok = ok and passed
+        print(f"{'int8' if quantized else 'fp32'}: dim={result['dim']} min_cosine={result['min_cosine']:.5f} "
+              f"mean_cosine={result['mean_cosine']:.5f} {'OK' if passed else 'BELOW ' + str(EMBED_ONNX_MIN_COSINE)}")
+    return ok
+
+
+if __name__ == "__main__":
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else EMBED_ONNX_DIR
+    export(output_dir)
+    sys.exit(0 if check(output_dir) else 1)
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Tuple
+
+from chunking import Chunk, StreamingChunker, lines_text
+from executor import ExecutionLayer
+from metrics import CHUNKING, PDF_EXTRACTION, stage
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_MAX_PAGES = int(os.getenv("UPLOAD_MAX_PAGES", "60"))
+# Where uploads are spooled; defaults to the system temp dir
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+# Pages per extraction task; longer documents are split into ranges that
+# run in parallel on the cpu pool (CPU_POOL_KIND=process to use every core)
+EXTRACT_PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "8"))
+
+Embed = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class UploadRejected(Exception):
+    """The upload is over the byte or page limit."""
+
+    status_code = 413
+
+
+class SpooledUpload(NamedTuple):
+    path: str
+    content_hash: str
+    size: int
+
+
+class ExtractedDocument(NamedTuple):
+    chunks: List[Chunk]
+    # Empty unless extract_document was given an `embed` function
+    vectors: List[List[float]]
+    text: str
+    pages: int
+
+
+async def spool_upload(file, max_bytes: int = UPLOAD_MAX_BYTES, directory: Optional[str] = UPLOAD_SPOOL_DIR) -> SpooledUpload:
+    """Streams `file` (anything with an async `read(n)`) to a temp file,
+    hashing it on the way, so the document is never held in memory whole.
+    The caller deletes `path`."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_READ_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(f"Upload is larger than {max_bytes} bytes")
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return SpooledUpload(path, digest.hexdigest(), size)
+
+
+def page_ranges(page_count: int, per_task: int = EXTRACT_PAGES_PER_TASK) -> List[Tuple[int, int]]:
+    per_task = max(1, per_task)
+    return [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+
+
+async def extract_document(execution: ExecutionLayer, path: str, embed: Optional[Embed] = None,
+                           max_pages: int = UPLOAD_MAX_PAGES,
+                           pages_per_task: int = EXTRACT_PAGES_PER_TASK) -> ExtractedDocument:
+    """Extracts and chunks a spooled PDF, page ranges in parallel.
+
+    Ranges are consumed in page order as they finish, and the sections they
+    complete are chunked (and, with `embed`, sent for embedding) straight
+    away, so early pages are embedded while later ones are still extracted.
+    """
+    from documents import extract_pdf_lines, pdf_page_count
+
+    async def extract(start: int, stop: int) -> List[dict]:
+        # Includes the wait for a cpu worker, which is what a request sees
+        with stage(PDF_EXTRACTION):
+            return await execution.run_cpu(extract_pdf_lines, path, start, stop)
+
+    with stage(PDF_EXTRACTION):
+        pages = await execution.run_cpu(pdf_page_count, path)
+    if pages > max_pages:
+        raise UploadRejected(f"PDF has {pages} pages; the limit is {max_pages}")
+    extractions = [asyncio.ensure_future(extract(start, stop)) for start, stop in page_ranges(pages, pages_per_task)]
+    embeddings: List[asyncio.Future] = []
+    chunker = StreamingChunker()
+    chunks: List[Chunk] = []
+    texts: List[str] = []
+
+    def ready(new_chunks: List[Chunk]):
+        chunks.extend(new_chunks)
+        if embed is not None and new_chunks:
+            embeddings.append(asyncio.ensure_future(embed([c.text for c in new_chunks])))
+
+    try:
+        for extraction in extractions:
+            lines = await extraction
+            texts.append(lines_text(lines))
+            with stage(CHUNKING):
+                new_chunks = chunker.feed(lines)
+            ready(new_chunks)
+        with stage(CHUNKING):
+            new_chunks = chunker.finish()
+        ready(new_chunks)
+        vectors = [vector for batch in await asyncio.gather(*embeddings) for vector in batch]
+    except BaseException:
+        for task in extractions + embeddings:
+            task.cancel()
+        raise
+    return ExtractedDocument(chunks, vectors, "\n".join(texts), pages)
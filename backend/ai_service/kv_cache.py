@@ -0,0 +1,90 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+LLAMA_STATE_CACHE_MAX_BYTES = int(os.getenv("LLAMA_STATE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+class SavedState(NamedTuple):
+    """A llama_cpp state and the text its KV cache was built from."""
+    prompt: str
+    state: Any
+
+    @property
+    def llama_state_size(self) -> int:
+        return int(getattr(self.state, "llama_state_size", 0))
+
+
+class SessionStateCache:
+    """LRU of llama_cpp KV states (`Llama.save_state()`) keyed by cv_session_id.
+
+    Loading a session's state before the next turn lets llama_cpp match the
+    longest common token prefix and only prefill the new suffix. Each
+    session keeps two: its last turn, and under `prefix_key` its stable
+    prompt prefix, which still matches after the turn tail is re-rendered
+    or the history is folded. Bounded by the total `llama_state_size` of
+    the stored states.
+    """
+
+    def __init__(self, max_bytes: int = LLAMA_STATE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._states: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def prefix_key(session_id: str) -> str:
+        return f"{session_id}\0prefix"
+
+    @staticmethod
+    def _size(state) -> int:
+        return int(getattr(state, "llama_state_size", 0))
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._states.move_to_end(session_id)
+            return state
+
+    def put(self, session_id: str, state):
+        size = self._size(state)
+        with self._lock:
+            self._remove(session_id)
+            if size > self.max_bytes:
+                return
+            self._states[session_id] = state
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._states)))
+                self.evictions += 1
+
+    def evict(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+            self._remove(self.prefix_key(session_id))
+
+    def _remove(self, session_id: str):
+        state = self._states.pop(session_id, None)
+        if state is not None:
+            self.nbytes -= self._size(state)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "states": len(self._states),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,262 @@
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LOCAL_LLM_TIMEOUT_SECONDS = float(os.getenv("LOCAL_LLM_TIMEOUT_SECONDS", "180"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+
+T = TypeVar("T")
+
+
+class LLMError(Exception):
+    """Base for provider failures; endpoints map these to 503/504 instead of
+    passing provider text on to candidates."""
+
+    status_code = 503
+
+    def __init__(self, message: str, provider: str = "", model: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.model = model
+        self.retry_after = retry_after
+
+
+class LLMTimeout(LLMError):
+    status_code = 504
+
+
+class LLMUnavailable(LLMError):
+    """Retries exhausted on a transient error (429, 5xx, connection)."""
+
+
+class LLMRateLimited(LLMUnavailable):
+    pass
+
+
+class LLMCircuitOpen(LLMUnavailable):
+    pass
+
+
+class LLMBadRequest(LLMError):
+    """A non-retryable 4xx: the request itself is wrong, retrying will not help."""
+
+    status_code = 502
+
+
+def pooled_http_client(timeout: float = LLM_TIMEOUT_SECONDS) -> httpx.AsyncClient:
+    """Shared keep-alive pool for hosted provider SDKs (`http_client=`)."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE),
+    )
+
+
+def status_of(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_of(exc: BaseException, now: Optional[float] = None) -> Optional[float]:
+    """Seconds from the Retry-After header (delta-seconds or HTTP date), if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (time.time() if now is None else now))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)) or "Timeout" in type(exc).__name__
+
+
+def is_transient(exc: BaseException) -> bool:
+    status = status_of(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    return is_timeout(exc) or isinstance(exc, httpx.TransportError) or "Connection" in type(exc).__name__
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after
+    `reset_seconds` lets a single trial call through (half-open)."""
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    @property
+    def trial_in_flight(self) -> bool:
+        return self._trial_in_flight
+
+    def release(self):
+        """Gives back a half-open trial that ended without a verdict (the
+        call was cancelled or the stream abandoned), so another may run."""
+        self._trial_in_flight = False
+
+    def retry_in(self) -> float:
+        return 0.0 if self.opened_at is None else max(0.0, self.reset_seconds - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                self.trips += 1
+            self.opened_at = self.clock()
+        self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+
+class LLMClientLayer:
+    """Timeouts, jittered retries and a circuit breaker per (provider, model)
+    around provider calls. Callers pass a zero-argument coroutine factory so
+    each attempt issues a fresh request."""
+
+    def __init__(self, max_retries: int = LLM_MAX_RETRIES, base_delay: float = LLM_RETRY_BASE_DELAY,
+                 max_delay: float = LLM_RETRY_MAX_DELAY, breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_factory = breaker_factory
+        self.sleep = sleep
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self.calls = 0
+        self.retries = 0
+        self.errors: Dict[str, int] = {}
+
+    def breaker(self, provider: str, model: str) -> CircuitBreaker:
+        key = (provider, model)
+        if key not in self._breakers:
+            self._breakers[key] = self.breaker_factory()
+        return self._breakers[key]
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # Full jitter, but never earlier than the server asked for
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def _typed(self, exc: BaseException, provider: str, model: str) -> LLMError:
+        if isinstance(exc, LLMError):
+            return exc
+        detail = f"{provider}/{model}: {type(exc).__name__}: {exc}"
+        if is_timeout(exc):
+            return LLMTimeout(detail, provider, model)
+        status = status_of(exc)
+        if status == 429:
+            return LLMRateLimited(detail, provider, model, retry_after_of(exc))
+        if is_transient(exc):
+            return LLMUnavailable(detail, provider, model, retry_after_of(exc))
+        return LLMBadRequest(detail, provider, model)
+
+    def _count_error(self, error: LLMError):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def check(self, provider: str, model: str) -> CircuitBreaker:
+        breaker = self.breaker(provider, model)
+        if not breaker.allow():
+            error = LLMCircuitOpen(f"{provider}/{model}: circuit open", provider, model, breaker.retry_in())
+            self._count_error(error)
+            raise error
+        return breaker
+
+    def failure(self, exc: BaseException, provider: str, model: str) -> LLMError:
+        """Records a failure outside `call` (e.g. mid-stream) and returns its typed error."""
+        error = self._typed(exc, provider, model)
+        if not isinstance(error, LLMBadRequest):
+            self.breaker(provider, model).record_failure()
+        self._count_error(error)
+        return error
+
+    async def call(self, provider: str, model: str, request: Callable[[], Awaitable[T]],
+                   timeout: float = LLM_TIMEOUT_SECONDS, retries: Optional[int] = None) -> T:
+        retries = self.max_retries if retries is None else retries
+        deadline = time.monotonic() + timeout * (retries + 1)
+        self.calls += 1
+        attempt = 0
+        while True:
+            breaker = self.check(provider, model)
+            trial = breaker.trial_in_flight
+            try:
+                result = await asyncio.wait_for(request(), timeout)
+            except Exception as exc:
+                error = self._typed(exc, provider, model)
+                if isinstance(error, LLMBadRequest):
+                    # The provider is healthy; do not count this against the breaker
+                    breaker.record_success()
+                    self._count_error(error)
+                    raise error from exc
+                breaker.record_failure()
+                delay = self.backoff(attempt, error.retry_after)
+                if attempt >= retries or time.monotonic() + delay > deadline:
+                    self._count_error(error)
+                    raise error from exc
+                attempt += 1
+                self.retries += 1
+                print(f"DEBUG: {error}; retry {attempt}/{retries} in {delay:.2f}s", flush=True)
+                await self.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled: the trial says nothing about the provider
+                if trial:
+                    breaker.release()
+                raise
+            breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "errors": dict(self.errors),
+            "breakers": {f"{p}/{m}": b.stats() for (p, m), b in self._breakers.items()},
+        }
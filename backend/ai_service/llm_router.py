@@ -0,0 +1,174 @@
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+from llm_client import LLMError
+
+CALL_TYPES = ("summary", "expansion", "chat", "evaluation")
+PROVIDERS = ("groq", "local")
+
+# A provider slower than this (EWMA per call type) yields to the next one in its route.
+# Streams are measured to the first token under "<call type>_stream".
+LLM_ROUTE_LATENCY_SLO_MS = os.getenv("LLM_ROUTE_LATENCY_SLO_MS",
+                                     "summary=10000;expansion=2000;chat=5000;chat_stream=1500;evaluation=60000")
+LLM_ROUTE_EWMA_ALPHA = float(os.getenv("LLM_ROUTE_EWMA_ALPHA", "0.2"))
+# A provider failing more often than this (EWMA) yields even when it is fast
+LLM_ROUTE_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTE_MAX_ERROR_RATE", "0.5"))
+# Stats older than this no longer demote a provider, so the next call probes it
+LLM_ROUTE_STATS_TTL_S = float(os.getenv("LLM_ROUTE_STATS_TTL_S", "60"))
+
+T = TypeVar("T")
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for part in spec.split(";"):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+
+def parse_routes(spec: str, primary: str, fallback: str = "") -> Dict[str, List[str]]:
+    """Route per call type from "summary=local,groq;chat=groq,local". Call
+    types not listed use `primary`, then `fallback` if set."""
+    default = [primary] + ([fallback] if fallback and fallback != primary else [])
+    routes = {call_type: list(default) for call_type in CALL_TYPES}
+    for call_type, providers in _parse_pairs(spec).items():
+        if call_type not in CALL_TYPES:
+            raise ValueError(f"Unknown LLM call type '{call_type}', expected one of {CALL_TYPES}")
+        route = [p.strip().lower() for p in providers.split(",") if p.strip()]
+        unknown = [p for p in route if p not in PROVIDERS]
+        if unknown or not route:
+            raise ValueError(f"Invalid providers {providers!r} for '{call_type}', expected some of {PROVIDERS}")
+        routes[call_type] = route
+    return routes
+
+
+def parse_slos(spec: str = LLM_ROUTE_LATENCY_SLO_MS) -> Dict[str, float]:
+    return {call_type: float(ms) for call_type, ms in _parse_pairs(spec).items()}
+
+
+class Routed(NamedTuple):
+    value: object
+    provider: str
+
+
+class RouteStats:
+    __slots__ = ("calls", "failures", "latency_ms", "error_rate", "last_error", "updated_at")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.last_error: Optional[str] = None
+        self.updated_at: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "ewma_latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "ewma_error_rate": round(self.error_rate, 4),
+            "last_error": self.last_error,
+        }
+
+
+class LLMRouter:
+    """Orders providers per call type and fails over down the route.
+
+    The configured route is the preference order. Providers whose circuit is
+    open go last, then those whose smoothed error rate is over
+    `max_error_rate`, then those whose smoothed latency is over the call
+    type's SLO. Demotion only lasts `stats_ttl_s` without new samples: a
+    demoted provider gets no traffic to prove it recovered, so stale stats
+    are ignored, the next call probes it and its averages start over.
+    """
+
+    def __init__(self, routes: Dict[str, List[str]], latency_slo_ms: Optional[Dict[str, float]] = None,
+                 is_available: Callable[[str], bool] = lambda provider: True, alpha: float = LLM_ROUTE_EWMA_ALPHA,
+                 max_error_rate: float = LLM_ROUTE_MAX_ERROR_RATE, stats_ttl_s: float = LLM_ROUTE_STATS_TTL_S,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.routes = routes
+        self.latency_slo_ms = latency_slo_ms or {}
+        self.is_available = is_available
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.stats_ttl_s = stats_ttl_s
+        self.clock = clock
+        self._stats: Dict[Tuple[str, str], RouteStats] = {}
+        self.failovers = 0
+
+    def _stat(self, call_type: str, provider: str) -> RouteStats:
+        key = (call_type, provider)
+        if key not in self._stats:
+            self._stats[key] = RouteStats()
+        return self._stats[key]
+
+    def order(self, call_type: str, stats_type: Optional[str] = None) -> List[str]:
+        stats_type = stats_type or call_type
+        slo = self.latency_slo_ms.get(stats_type)
+        now = self.clock()
+
+        def rank(item):
+            index, provider = item
+            stat = self._stats.get((stats_type, provider))
+            if stat is None or self._stale(stat, now):
+                return (not self.is_available(provider), False, False, index)
+            failing = stat.error_rate > self.max_error_rate
+            slow = slo is not None and stat.latency_ms is not None and stat.latency_ms > slo
+            return (not self.is_available(provider), failing, slow, index)
+
+        return [provider for _, provider in sorted(enumerate(self.routes[call_type]), key=rank)]
+
+    def _stale(self, stat: RouteStats, now: float) -> bool:
+        return stat.updated_at is not None and now - stat.updated_at > self.stats_ttl_s
+
+    def record(self, call_type: str, provider: str, latency_ms: Optional[float], error: Optional[BaseException] = None):
+        stat = self._stat(call_type, provider)
+        now = self.clock()
+        if self._stale(stat, now):
+            # Averages from before the gap describe a provider that may have recovered
+            stat.latency_ms, stat.error_rate = None, (1.0 if error else 0.0)
+        else:
+            stat.error_rate += self.alpha * ((1.0 if error else 0.0) - stat.error_rate)
+        stat.updated_at = now
+        stat.calls += 1
+        if error is not None:
+            stat.failures += 1
+            stat.last_error = type(error).__name__
+        if latency_ms is not None:
+            stat.latency_ms = latency_ms if stat.latency_ms is None else \
+                stat.latency_ms + self.alpha * (latency_ms - stat.latency_ms)
+
+    async def run(self, call_type: str, attempt: Callable[[str], Awaitable[T]],
+                  stats_type: Optional[str] = None) -> Routed:
+        """Runs `attempt(provider)` down the route until one succeeds; raises
+        the last provider's LLMError if all fail. `stats_type` keeps latency
+        of a different shape (e.g. time to first token) in its own series."""
+        stats_type = stats_type or call_type
+        last_error: Optional[LLMError] = None
+        for provider in self.order(call_type, stats_type):
+            if last_error is not None:
+                self.failovers += 1
+                print(f"DEBUG: {call_type} failing over to {provider} after {type(last_error).__name__}", flush=True)
+            start = self.clock()
+            try:
+                value = await attempt(provider)
+            except LLMError as e:
+                # Only a timeout says something about latency; fast rejections would flatter the provider
+                self.record(stats_type, provider, None if e.status_code != 504 else (self.clock() - start) * 1000, e)
+                last_error = e
+                continue
+            self.record(stats_type, provider, (self.clock() - start) * 1000)
+            return Routed(value, provider)
+        raise last_error
+
+    def stats(self) -> dict:
+        return {
+            "routes": {call_type: self.order(call_type) for call_type in self.routes},
+            "failovers": self.failovers,
+            "providers": {f"{stats_type}/{provider}": stat.as_dict()
+                          for (stats_type, provider), stat in self._stats.items()},
+        }
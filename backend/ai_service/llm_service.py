@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+from evaluation import grammar_schema
+from executor import ExecutionLayer
+from kv_cache import SavedState, SessionStateCache
+from llm_client import LOCAL_LLM_TIMEOUT_SECONDS, LLMClientLayer, pooled_http_client
+from llm_router import LLMRouter, Routed
+from metrics import record_error, record_generation
+from prompt_builder import TokenCounter
+from readiness import FAILED, READY, Readiness
+
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+LOCAL_MODEL_REPO = "TheBloke/Mistral-7B-Instruct-v0.2-GGUF"
+LOCAL_MODEL_FILE = "mistral-7b-instruct-v0.2.Q4_K_M.gguf"
+PROVIDER_MODELS = {"groq": GROQ_MODEL, "local": LOCAL_MODEL_FILE}
+
+
+class LLMService:
+    """Provider clients plus routed completion and streaming.
+
+    Clients are created on first use: the local Mistral GGUF on the llm
+    worker thread (under a lock, so concurrent first calls load it once),
+    the Groq client with a pooled HTTP connection.
+    """
+
+    def __init__(self, execution: ExecutionLayer, clients: LLMClientLayer, router: LLMRouter,
+                 llama_states: SessionStateCache, token_counter: TokenCounter, readiness: Readiness,
+                 groq_api_key: Optional[str] = None):
+        self.execution = execution
+        self.clients = clients
+        self.router = router
+        self.llama_states = llama_states
+        self.token_counter = token_counter
+        self.readiness = readiness
+        self.groq_api_key = groq_api_key
+        self.local = None
+        self.groq = None
+        self._lock = threading.Lock()
+        self._grammars = {}
+
+    def get_llm(self, provider: str):
+        if provider == "local":
+            if self.local is not None:
+                return self.local
+            # Warm-up and the llm thread can race on first use; only one may load the model
+            with self._lock:
+                if self.local is not None:
+                    return self.local
+                from llama_cpp import Llama
+                from huggingface_hub import hf_hub_download
+                print("Loading Local LLM (Mistral)...")
+                with self.readiness.phase("llm:local"):
+                    MODEL_PATH = hf_hub_download(
+                        repo_id=LOCAL_MODEL_REPO,
+                        filename=LOCAL_MODEL_FILE
+                    )
+                    model = Llama(model_path=MODEL_PATH, n_ctx=4096, n_threads=4)
+                self.token_counter.tokenize = lambda text: model.tokenize(text.encode("utf-8"), add_bos=False)
+                self.local = model
+                print("Local LLM Loaded.")
+                return self.local
+        if self.groq is None:
+            with self._lock:
+                if self.groq is None:
+                    from groq import AsyncGroq
+                    print("Using Groq API.")
+                    if not self.groq_api_key:
+                        print("WARNING: GROQ_API_KEY not set!")
+                    # Retries are owned by self.clients; the SDK's own would multiply them
+                    self.groq = AsyncGroq(api_key=self.groq_api_key, max_retries=0, http_client=pooled_http_client())
+        return self.groq
+
+    def _restore_session(self, model, session_id, prompt, prefix=None):
+        """Loads whichever of the session's saved states shares the longest
+        prefix with `prompt`. `prefix` is the stable start of the prompt; if
+        no state holds it yet (first turn, or history was just folded) it is
+        evaluated on its own and saved, so the next turns start from it."""
+        if not session_id:
+            return
+        prefix_key = self.llama_states.prefix_key(session_id)
+        saved = [s for s in (self.llama_states.get(session_id), self.llama_states.get(prefix_key)) if s is not None]
+        shared = {id(s): len(os.path.commonprefix([s.prompt, prompt])) for s in saved}
+        best = max(saved, key=lambda s: shared[id(s)], default=None)
+        if best is not None and shared[id(best)] > 0:
+            # llama_cpp then reuses the longest common token prefix of the new prompt
+            model.load_state(best.state)
+        if prefix and prompt.startswith(prefix) and not any(s.prompt == prefix for s in saved):
+            # A one-token generation leaves the prefix's KV state in the model
+            model(prefix, max_tokens=1, echo=False)
+            self.llama_states.put(prefix_key, SavedState(prefix, model.save_state()))
+
+    def _save_session(self, model, session_id, text):
+        """`text` is what the KV cache now holds: the prompt and the reply."""
+        if session_id:
+            self.llama_states.put(session_id, SavedState(text, model.save_state()))
+
+    def _json_grammar(self, json_schema):
+        # GBNF compilation is not free; schemas are module constants, so compile once.
+        # Key order is kept: the grammar emits properties in schema order.
+        key = json.dumps(json_schema)
+        if key not in self._grammars:
+            from llama_cpp import LlamaGrammar
+            self._grammars[key] = LlamaGrammar.from_json_schema(json.dumps(grammar_schema(json_schema)), verbose=False)
+        return self._grammars[key]
+
+    def _local_completion(self, prompt, max_tokens, stop, session_id=None, json_schema=None, prefix=None):
+        # Runs on the single llm worker thread
+        model = self.get_llm("local")
+        self._restore_session(model, session_id, prompt, prefix)
+        grammar = self._json_grammar(json_schema) if json_schema else None
+        output = model(prompt, max_tokens=max_tokens, stop=stop, echo=False, grammar=grammar)
+        text = output["choices"][0]["text"]
+        self._save_session(model, session_id, prompt + text)
+        return text.strip()
+
+    async def provider_completion(self, provider, prompt, max_tokens, stop=None, session_id=None, json_schema=None,
+                                  prefix=None):
+        if provider == "local":
+            # A timeout frees the caller; the generation itself finishes on the llm thread
+            return await self.clients.call(
+                "local", LOCAL_MODEL_FILE,
+                lambda: self.execution.run_llm(self._local_completion, prompt, max_tokens, stop, session_id,
+                                               json_schema, prefix),
+                timeout=LOCAL_LLM_TIMEOUT_SECONDS, retries=0)
+        client = self.get_llm("groq")
+        extra = {"response_format": {"type": "json_object"}} if json_schema else {}
+        chat_completion = await self.clients.call("groq", GROQ_MODEL, lambda: client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=GROQ_MODEL,
+            max_tokens=max_tokens,
+            stop=stop,
+            **extra,
+        ))
+        return chat_completion.choices[0].message.content.strip()
+
+    def _mark_serving(self, provider):
+        # A provider whose warm-up failed is usable again once it serves a call
+        if self.readiness.status(f"llm:{provider}") == FAILED:
+            self.readiness.register(f"llm:{provider}", READY)
+
+    async def complete(self, call_type, prompt, max_tokens=500, stop=None, session_id=None, json_schema=None,
+                       prefix=None) -> Routed:
+        """Routed completion; `.value` is the text, `.provider` who served it.
+        `json_schema` constrains the output to JSON: a grammar built from the
+        schema locally, Groq's JSON mode for the hosted provider. `prefix`
+        is the part of `prompt` that stays the same across the session's
+        turns; the local model keeps its KV state (see SessionStateCache)."""
+        async def attempt(provider):
+            start = time.perf_counter()
+            try:
+                text = await self.provider_completion(provider, prompt, max_tokens, stop, session_id, json_schema,
+                                                      prefix=prefix)
+            except Exception as e:
+                record_error(f"llm:{provider}", e)
+                raise
+            record_generation(provider, call_type, "complete", time.perf_counter() - start,
+                              self.token_counter.count(prompt), self.token_counter.count(text))
+            return text
+
+        routed = await self.router.run(call_type, attempt)
+        self._mark_serving(routed.provider)
+        return routed
+
+    async def call(self, prompt, max_tokens=500, stop=None, session_id=None, json_schema=None, call_type="chat"):
+        return (await self.complete(call_type, prompt, max_tokens, stop, session_id, json_schema)).value
+
+    async def _provider_stream(self, provider, prompt, max_tokens, stop, session_id, prefix=None):
+        if provider == "local":
+            loop = asyncio.get_running_loop()
+            queue = asyncio.Queue()
+            cancelled = threading.Event()
+
+            def produce():
+                try:
+                    model = self.get_llm("local")
+                    self._restore_session(model, session_id, prompt, prefix)
+                    text = []
+                    for chunk in model(prompt, max_tokens=max_tokens, stop=stop, echo=False, stream=True):
+                        if cancelled.is_set():
+                            break
+                        text.append(chunk["choices"][0]["text"])
+                        loop.call_soon_threadsafe(queue.put_nowait, text[-1])
+                    self._save_session(model, session_id, prompt + "".join(text))
+                finally:
+                    loop.call_soon_threadsafe(queue.put_nowait, None)
+
+            breaker = self.clients.check("local", LOCAL_MODEL_FILE)
+            trial = breaker.trial_in_flight
+            producer = asyncio.ensure_future(self.execution.run_llm(produce))
+            try:
+                while (token := await queue.get()) is not None:
+                    yield token
+                await producer
+                breaker.record_success()
+            except Exception as e:
+                raise self.clients.failure(e, "local", LOCAL_MODEL_FILE) from e
+            except BaseException:
+                # Cancelled, or closed early by a client disconnect: no verdict on the provider
+                if trial:
+                    breaker.release()
+                raise
+            finally:
+                cancelled.set()
+        else:
+            client = self.get_llm("groq")
+            # Only opening the stream is retried; once tokens flow a failure is final
+            stream = await self.clients.call("groq", GROQ_MODEL, lambda: client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=GROQ_MODEL,
+                max_tokens=max_tokens,
+                stop=stop,
+                stream=True,
+            ))
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except Exception as e:
+                raise self.clients.failure(e, "groq", GROQ_MODEL) from e
+            finally:
+                await stream.close()
+
+    @staticmethod
+    async def _prepend(first, tokens):
+        try:
+            if first is not None:
+                yield first
+            async for token in tokens:
+                yield token
+        finally:
+            await tokens.aclose()
+
+    async def _metered(self, provider, call_type, prompt, start, tokens):
+        # Recorded when the stream ends, whether finished or abandoned by the client
+        text = []
+        try:
+            async for token in tokens:
+                text.append(token)
+                yield token
+        except Exception as e:
+            record_error(f"llm:{provider}", e)
+            raise
+        finally:
+            await tokens.aclose()
+            record_generation(provider, call_type, "stream", time.perf_counter() - start,
+                              self.token_counter.count(prompt), self.token_counter.count("".join(text)))
+
+    async def open_stream(self, call_type, prompt, max_tokens=500, stop=None, session_id=None, prefix=None) -> Routed:
+        """Routed token stream. Failover is only possible until the first token
+        arrives, so each provider is tried up to that point."""
+        async def attempt(provider):
+            start = time.perf_counter()
+            tokens = self._provider_stream(provider, prompt, max_tokens, stop, session_id, prefix)
+            try:
+                first = await tokens.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except BaseException as e:
+                await tokens.aclose()
+                if isinstance(e, Exception):
+                    record_error(f"llm:{provider}", e)
+                raise
+            return self._metered(provider, call_type, prompt, start, self._prepend(first, tokens))
+
+        routed = await self.router.run(call_type, attempt, stats_type=f"{call_type}_stream")
+        self._mark_serving(routed.provider)
+        return routed
+
+    def providers(self):
+        return sorted({provider for route in self.router.routes.values() for provider in route})
+
+    async def warm_up(self, provider: str):
+        """One single-token generation, bypassing the router's stats."""
+        if provider == "local":
+            await self.execution.run_llm(self._local_completion, "[INST] Hi [/INST]", 1, None)
+        else:
+            await self.provider_completion(provider, "Hi", 1)
+
+    def stats(self) -> dict:
+        return {**self.clients.stats(), "router": self.router.stats()}
@@ -0,0 +1,407 @@
+"""Offline concurrent load test.
+
+Simulated candidates arrive at `--arrival-rate` per second (Poisson) and each
+runs the whole flow: parse a CV -> init -> `--turns` answers -> report, pausing
+`--think-time` seconds on average between steps. The app runs in-process with
+Qdrant in :memory: mode, a simulated LLM (`--llm-latency` to the first token,
+then `--llm-tokens-per-second`) and a hashing embedder, so no network or model
+download is needed; everything else (chunking, retrieval, prompt building,
+routing, PDF rendering) is the real code.
+
+Reports throughput and p50/p95/p99 latency per endpoint (measured by the
+client) and per stage (from the Prometheus histograms in metrics.py), and
+saves them as JSON so runs can be compared:
+
+    python load_test.py --candidates 50 --arrival-rate 2 --turns 4 --output results.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import time
+import warnings
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+from fpdf import FPDF
+from prometheus_client import REGISTRY
+
+import main
+from app_state import AppState, lazy
+from llm_service import LLMService
+from report_jobs import ReportJobQueue
+from report_store import LocalReportStore
+from vector_store import EMBEDDING_DIM
+
+ANSWERS = [
+    "I moved our monolith to FastAPI services and cut p95 latency by 40% with connection pooling.",
+    "We used Redis for caching hot reads and Kafka for the order events between services.",
+    "I profiled the slow endpoint with py-spy; most time went to N+1 queries, which I batched.",
+    "I have not used Kubernetes operators myself, but I deployed with Helm charts on EKS.",
+    "For testing I wrote contract tests between services and ran them in CI on every merge.",
+]
+SKILLS = ["Python", "FastAPI", "PostgreSQL", "Redis", "Kafka", "Docker", "Kubernetes", "AWS", "Go", "Terraform"]
+SIMULATED_QUESTION = "Could you walk me through how you designed that service and what you would change today? "
+SIMULATED_EVALUATION = {
+    "auditor_notes": "Simulated evaluation.", "technical_score": 7, "communication_score": 7,
+    "problem_solving_score": 6, "experience_match_score": 7, "strengths": ["Load testing"],
+    "weaknesses": ["Simulated"], "proven_skills": ["Python"], "summary": "HIRE: simulated run.",
+}
+
+
+def candidate_cv(index: int) -> bytes:
+    """A small CV whose bytes differ per candidate, so every parse is a full ingest."""
+    rng = random.Random(index)
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 16)
+    pdf.cell(0, 10, f"Candidate {index} - Backend Engineer", new_x="LMARGIN", new_y="NEXT")
+    sections = [
+        ("Professional Summary", f"Engineer with {rng.randint(2, 15)} years building backend systems."),
+        ("Experience", " ".join(f"Built {rng.choice(SKILLS)} services handling {rng.randint(1, 900)}k requests "
+                                f"a day, owning design, rollout and on-call." for _ in range(6))),
+        ("Projects", " ".join(f"Open-source {rng.choice(SKILLS)} tool for {rng.choice(SKILLS)} users."
+                              for _ in range(3))),
+        ("Skills", ", ".join(rng.sample(SKILLS, 6))),
+        ("Education", "BSc Computer Science"),
+    ]
+    for heading, body in sections:
+        pdf.set_font("Helvetica", "B", 12)
+        pdf.cell(0, 10, heading, new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", "", 11)
+        pdf.multi_cell(0, 7, body)
+    return bytes(pdf.output())
+
+
+class HashingEncoder:
+    """Stands in for SentenceTransformer: hashed bag-of-words vectors, plus
+    `seconds_per_text` of simulated model time on the embed pool."""
+
+    def __init__(self, seconds_per_text: float = 0.0, dim: int = EMBEDDING_DIM):
+        self.seconds_per_text = seconds_per_text
+        self.dim = dim
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class SimulatedLLM(LLMService):
+    """LLMService whose providers are simulated: `latency` seconds before the
+    first token, then `tokens_per_second`. Routing, breakers, metrics and
+    stream handling are the real ones."""
+
+    def __init__(self, *args, latency: float = 0.3, tokens_per_second: float = 50.0,
+                 completion_tokens: int = 60, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+
+    def _reply(self, max_tokens: int, json_schema=None) -> List[str]:
+        if json_schema:
+            return [json.dumps(SIMULATED_EVALUATION)]
+        words = (SIMULATED_QUESTION * (1 + self.completion_tokens // 10)).split()
+        return [word + " " for word in words[:max(1, min(max_tokens, self.completion_tokens))]]
+
+    def _generation_seconds(self, pieces: List[str]) -> float:
+        tokens = self.token_counter.count("".join(pieces))
+        return self.latency + (tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0)
+
+    async def provider_completion(self, provider, prompt, max_tokens, stop=None, session_id=None, json_schema=None,
+                                  prefix=None):
+        pieces = self._reply(max_tokens, json_schema)
+        await asyncio.sleep(self._generation_seconds(pieces))
+        return "".join(pieces).strip()
+
+    async def _provider_stream(self, provider, prompt, max_tokens, stop, session_id, prefix=None):
+        pieces = self._reply(max_tokens)
+        await asyncio.sleep(self.latency)
+        for piece in pieces:
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(self.token_counter.count(piece) / self.tokens_per_second)
+            yield piece
+
+    async def warm_up(self, provider: str):
+        await self.provider_completion(provider, "Hi", 1)
+
+
+class LoadTestState(AppState):
+    """AppState with the simulated LLM and embedder; Qdrant, the report
+    store and the report job queue are passed in as overrides."""
+
+    def __init__(self, args: argparse.Namespace, **overrides):
+        super().__init__(**overrides)
+        self.args = args
+
+    @lazy
+    def embed_model(self):
+        return HashingEncoder(self.args.embed_ms_per_text / 1000)
+
+    @lazy
+    def llm(self):
+        return SimulatedLLM(self.execution, self.llm_clients, self.llm_router, self.llama_states, self.token_counter,
+                            self.readiness, latency=self.args.llm_latency,
+                            tokens_per_second=self.args.llm_tokens_per_second,
+                            completion_tokens=self.args.completion_tokens)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear interpolation between closest ranks, q in [0, 1]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def latency_summary(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+def histogram_buckets(metric: str) -> Dict[tuple, Dict[float, float]]:
+    """Cumulative bucket counts of a histogram per label set (without `le`)."""
+    buckets: Dict[tuple, Dict[float, float]] = {}
+    for family in REGISTRY.collect():
+        if family.name != metric:
+            continue
+        for sample in family.samples:
+            if sample.name != f"{metric}_bucket":
+                continue
+            labels = tuple(sorted((k, v) for k, v in sample.labels.items() if k != "le"))
+            buckets.setdefault(labels, {})[float(sample.labels["le"])] = sample.value
+    return buckets
+
+
+def bucket_quantile(buckets: Dict[float, float], q: float) -> Optional[float]:
+    """Like PromQL histogram_quantile: linear within the bucket holding the rank."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if not total:
+        return None
+    rank, previous_bound, previous_count = q * total, 0.0, 0.0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if math.isinf(bound):
+                return previous_bound
+            width = buckets[bound] - previous_count
+            return previous_bound + (bound - previous_bound) * ((rank - previous_count) / width if width else 0)
+        previous_bound, previous_count = bound, buckets[bound]
+    return previous_bound
+
+
+def histogram_delta(metric: str, before: Dict[tuple, Dict[float, float]], name_labels: List[str]) -> dict:
+    """Quantiles of what was observed since `before`, keyed by the given labels joined with ':'."""
+    summary = {}
+    for labels, buckets in histogram_buckets(metric).items():
+        old = before.get(labels, {})
+        delta = {bound: count - old.get(bound, 0.0) for bound, count in buckets.items()}
+        count = delta.get(float("inf"), 0.0)
+        if not count:
+            continue
+        label_map = dict(labels)
+        summary[":".join(label_map[name] for name in name_labels)] = {
+            "count": int(count),
+            "p50": bucket_quantile(delta, 0.50),
+            "p95": bucket_quantile(delta, 0.95),
+            "p99": bucket_quantile(delta, 0.99),
+        }
+    return summary
+
+
+def counter_total(metric: str, **labels) -> float:
+    total = 0.0
+    for family in REGISTRY.collect():
+        for sample in family.samples:
+            if sample.name == metric and all(sample.labels.get(k) == v for k, v in labels.items()):
+                total += sample.value
+    return total
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, client: httpx.AsyncClient):
+        self.args = args
+        self.client = client
+        self.rng = random.Random(args.seed)
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.completed = 0
+        self.failed = 0
+
+    async def think(self):
+        if self.args.think_time > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.think_time))
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            key = f"{endpoint}: {type(e).__name__}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+            raise
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            key = f"{endpoint}: {response.status_code}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+            response.raise_for_status()
+        return response
+
+    async def chat(self, endpoint: str, payload: dict) -> dict:
+        if not self.args.stream:
+            return (await self.request(endpoint, "POST", "/v1/chat/generate", json=payload)).json()
+        response = await self.request(endpoint, "POST", "/v1/chat/generate/stream", json=payload)
+        for block in response.text.split("\n\n"):
+            if block.startswith("event: done"):
+                return json.loads(block.split("data: ", 1)[1])
+        key = f"{endpoint}: no done event"
+        self.errors[key] = self.errors.get(key, 0) + 1
+        raise RuntimeError(key)
+
+    async def candidate(self, index: int, cv: bytes):
+        try:
+            parsed = (await self.request("cv_parse", "POST", "/v1/cv/parse",
+                                         files={"file": (f"cv_{index}.pdf", cv, "application/pdf")})).json()
+            session_id = parsed["cv_session_id"]
+            reply = await self.chat("chat_init", {"cv_session_id": session_id, "message": "INIT_INTERVIEW",
+                                                  "is_init": True})
+            for turn in range(self.args.turns):
+                await self.think()
+                reply = await self.chat("chat_turn", {"cv_session_id": session_id, "seq": reply["seq"],
+                                                      "message": ANSWERS[(index + turn) % len(ANSWERS)]})
+            await self.think()
+            await self.request("report", "POST", "/v1/report/generate",
+                               json={"candidate_name": f"Candidate {index}", "cv_session_id": session_id})
+            self.completed += 1
+        except Exception:
+            self.failed += 1
+
+    async def run(self) -> float:
+        cvs = [candidate_cv(index) for index in range(self.args.candidates)]
+        tasks = []
+        start = time.perf_counter()
+        for index in range(self.args.candidates):
+            tasks.append(asyncio.create_task(self.candidate(index, cvs[index])))
+            if self.args.arrival_rate > 0 and index < self.args.candidates - 1:
+                await asyncio.sleep(self.rng.expovariate(self.args.arrival_rate))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+
+async def run_load_test(args: argparse.Namespace) -> dict:
+    from qdrant_client import AsyncQdrantClient
+    from vector_store import VectorStore
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # A private job db: the service's default one may hold real unfinished jobs,
+        # which the queue would re-run against the simulated LLM
+        report_jobs = ReportJobQueue(lambda job: main.run_report_job(state, job),
+                                     db_path=os.path.join(data_dir, "report_jobs.sqlite3"))
+        state = LoadTestState(args, report_runner=main.run_report_job,
+                              vectors=VectorStore(AsyncQdrantClient(location=":memory:")),
+                              report_store=LocalReportStore(os.path.join(data_dir, "reports")),
+                              report_jobs=report_jobs)
+        previous, main.app.state.services = getattr(main.app.state, "services", None), state
+        stages_before = histogram_buckets("intelliview_stage_seconds")
+        llm_before = histogram_buckets("intelliview_llm_generation_seconds")
+        tokens_before = counter_total("intelliview_llm_tokens_total", kind="completion")
+        try:
+            async with main.lifespan(main.app):
+                transport = httpx.ASGITransport(app=main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+                    load = LoadTest(args, client)
+                    duration = await load.run()
+        finally:
+            main.app.state.services = previous
+            if report_jobs.store is not None:
+                report_jobs.store.close()
+
+    requests = sum(len(values) for values in load.latencies.values())
+    stages = histogram_delta("intelliview_stage_seconds", stages_before, ["stage"])
+    for name, summary in histogram_delta("intelliview_llm_generation_seconds", llm_before,
+                                         ["call_type", "mode"]).items():
+        stages[f"llm:{name}"] = summary
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args),
+        "duration_seconds": duration,
+        "candidates": {"started": args.candidates, "completed": load.completed, "failed": load.failed},
+        "throughput": {
+            "requests_per_second": requests / duration if duration else None,
+            "candidates_per_minute": 60 * load.completed / duration if duration else None,
+            "completion_tokens_per_second":
+                (counter_total("intelliview_llm_tokens_total", kind="completion") - tokens_before) / duration
+                if duration else None,
+        },
+        "endpoints": {name: latency_summary(values) for name, values in sorted(load.latencies.items())},
+        # Bucket-interpolated, like histogram_quantile on the live /metrics
+        "stages": dict(sorted(stages.items())),
+        "errors": load.errors,
+    }
+
+
+def print_results(results: dict):
+    def ms(value):
+        return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+    candidates = results["candidates"]
+    throughput = results["throughput"]
+    print(f"{candidates['completed']}/{candidates['started']} candidates completed in "
+          f"{results['duration_seconds']:.1f}s: {throughput['requests_per_second']:.2f} req/s, "
+          f"{throughput['completion_tokens_per_second']:.1f} completion tokens/s")
+    for title, rows in (("endpoint", results["endpoints"]), ("stage", results["stages"])):
+        print(f"\n{title:<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, row in rows.items():
+            print(f"{name:<28}{row['count']:>7}{ms(row['p50'])} {ms(row['p95'])} {ms(row['p99'])}")
+    if results["errors"]:
+        print("\nerrors:", json.dumps(results["errors"], indent=2))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--candidates", type=int, default=20, help="simulated candidates")
+    parser.add_argument("--arrival-rate", type=float, default=2.0,
+                        help="candidates starting per second (Poisson); 0 starts all at once")
+    parser.add_argument("--turns", type=int, default=4, help="answers per interview")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between steps (exponential)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to the first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0, help="0 for instant completions")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="tokens per simulated reply")
+    parser.add_argument("--embed-ms-per-text", type=float, default=2.0, help="simulated embedding cost")
+    parser.add_argument("--stream", action="store_true",
+                        help="use /v1/chat/generate/stream (timed to the last byte; the in-process "
+                             "transport buffers the body)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="load_test_results.json", help="where to save the JSON results")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Local mode ignores payload indexes and says so on every collection setup
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+    results = asyncio.run(run_load_test(args))
+    print_results(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved to {os.path.abspath(args.output)}")
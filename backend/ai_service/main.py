@@ -1,214 +1,441 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import fitz  # PyMuPDF
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from sentence_transformers import SentenceTransformer
+import asyncio
 import uuid
-from typing import List, Optional
-from fpdf import FPDF
+from typing import List, Optional, Tuple
 import json
-import re
-from groq import Groq
 from dotenv import load_dotenv
-
+from app_state import AppState
+from llm_client import LLMError
+from metrics import PDF_RENDER, QUERY_EXPANSION, MetricsMiddleware, latest, stage
+from prompt_builder import PROMPT_BUDGET_CONTEXT, PROMPT_BUDGET_CV_SUMMARY, PROMPT_BUDGET_HISTORY_SUMMARY, \
+    PROMPT_BUDGET_MESSAGE, PROMPT_BUDGET_SYSTEM
+from ingest import UploadRejected, extract_document, spool_upload
+from bulk_ingest import BulkIngestPipeline, discard, spool_bulk_uploads
+from evaluation import (EVALUATION_RETRY_TOKEN_FACTOR, EVALUATION_SCHEMA, EvaluationTruncated, evaluation_truncated,
+                        parse_evaluation, schema_max_tokens)
+from readiness import LAZY, MODEL_WARMUP
+from report_jobs import InvalidCallback, QueueFull, ReportJobQueue
+from transcripts import Transcript, TranscriptConflict
+from streaming import CHAT_STOP_SEQUENCES, StreamCleaner, clean_response, sse_event
+
+# Heavy clients (SentenceTransformer, Qdrant, Groq, llama_cpp, PyMuPDF/FPDF) are
+# imported and created on first use through AppState, so importing this module
+# is cheap and tests can hand the app a state built from fakes.
 load_dotenv()
 
-app = FastAPI(title="IntelliView AI Service")
-
-# LLM Configuration
-LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-# Initialize models and client
-embed_model = SentenceTransformer('all-MiniLM-L6-v2')
-qdrant_host = os.getenv("QDRANT_HOST", "localhost")
-qdrant_client = QdrantClient(host=qdrant_host, port=6333)
-
-llm = None
-
-def get_llm():
-    global llm
-    if llm is not None:
-        return llm
-
-    if LLM_PROVIDER == "local":
-        from llama_cpp import Llama
-        from huggingface_hub import hf_hub_download
-        print("Loading Local LLM (Mistral)...")
-        MODEL_PATH = hf_hub_download(
-            repo_id="TheBloke/Mistral-7B-Instruct-v0.2-GGUF",
-            filename="mistral-7b-instruct-v0.2.Q4_K_M.gguf"
-        )
-        llm = Llama(model_path=MODEL_PATH, n_ctx=4096, n_threads=4)
-        print("Local LLM Loaded.")
-    else:
-        print("Using Groq API.")
-        if not GROQ_API_KEY:
-            print("WARNING: GROQ_API_KEY not set!")
-        llm = Groq(api_key=GROQ_API_KEY)
-    return llm
-
-def call_llm(prompt, max_tokens=500, stop=None):
-    client = get_llm()
-    if LLM_PROVIDER == "local":
-        output = client(prompt, max_tokens=max_tokens, stop=stop, echo=False)
-        return output["choices"][0]["text"].strip()
-    else:
-        try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="llama-3.3-70b-versatile",
-                max_tokens=max_tokens,
-                stop=stop,
-            )
-            return chat_completion.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"DEBUG: Groq call failed: {e}")
-            return f"Error calling Groq: {str(e)}"
-
-COLLECTION_NAME = "cv_chunks"
-REPORTS_DIR = "/home/chems/.gemini/tmp/reports"
-os.makedirs(REPORTS_DIR, exist_ok=True)
+CHUNK_CACHE_MAX_SESSION_POINTS = int(os.getenv("CHUNK_CACHE_MAX_SESSION_POINTS", "512"))
+EVALUATION_SCHEMA_JSON = json.dumps(EVALUATION_SCHEMA["properties"])
+EVALUATION_MAX_TOKENS = schema_max_tokens(EVALUATION_SCHEMA)
+# Background CV summaries a bulk upload runs at once
+BULK_SUMMARY_CONCURRENCY = int(os.getenv("BULK_SUMMARY_CONCURRENCY", "4"))
+# Seconds between attempts to reach Qdrant when it was down at startup
+QDRANT_CONNECT_RETRY_SECONDS = float(os.getenv("QDRANT_CONNECT_RETRY_SECONDS", "5"))
 
 class ChatRequest(BaseModel):
     cv_session_id: str
     message: str
     cv_summary: Optional[str] = None
-    history: List[dict] = []
+    # Full history resyncs the server-side transcript; omit it and send
+    # `seq` (messages already stored) to only carry the new message.
+    history: Optional[List[dict]] = None
+    seq: Optional[int] = None
     is_init: bool = False
+    # Restrict retrieval to one CV section (see chunking.SECTIONS), e.g. "experience"
+    section: Optional[str] = None
+    # Direction for this turn only (e.g. to wrap up); it reaches the prompt but not the transcript
+    instruction: Optional[str] = None
+
+class TranscriptSync(BaseModel):
+    history: List[dict]
 
 class EvaluationRequest(BaseModel):
     candidate_name: str
-    transcript: List[dict]
+    # Falls back to the stored transcript for cv_session_id when omitted
+    transcript: Optional[List[dict]] = None
     cv_session_id: str
 
-# Ensure collection exists
-try:
-    qdrant_client.get_collection(COLLECTION_NAME)
-except Exception:
-    qdrant_client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE),
-    )
+class ReportJobRequest(EvaluationRequest):
+    callback_url: Optional[str] = None
 
-class ReportPDF(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 15)
-        self.cell(0, 10, 'IntelliView AI - Candidate Evaluation Report', 0, 1, 'C')
-        self.ln(5)
+def create_state(**overrides) -> AppState:
+    """App state wired to this module's report runner; keyword arguments
+    replace individual resources (see AppState)."""
+    return AppState(report_runner=run_report_job, **overrides)
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+def get_state(request: Request) -> AppState:
+    return request.app.state.services
+
+async def warm_up(state: AppState):
+    """One dummy embedding and one single-token generation per routed
+    provider, so the first real request does not pay for loading."""
+    try:
+        # The first access loads the model under the "embeddings" load phase
+        await state.execution.run_embed(lambda: state.embed_model)
+        with state.readiness.phase("embeddings", "warmup"):
+            await state.execution.run_embed(state.embedder.warm_up)
+    except Exception as e:
+        print(f"Warm-up of embeddings failed: {e}", flush=True)
+    for provider in state.llm.providers():
+        try:
+            with state.readiness.phase(f"llm:{provider}", "warmup"):
+                await state.llm.warm_up(provider)
+        except Exception as e:
+            print(f"Warm-up of {provider} failed: {e}", flush=True)
+
+async def connect_qdrant(state: AppState) -> bool:
+    """Creates the collection under the "qdrant" readiness phase. A failure
+    is left on the phase (so /ready answers 503) rather than raised."""
+    try:
+        with state.readiness.phase("qdrant"):
+            await state.vectors.ensure_collection()
+        return True
+    except Exception as e:
+        print(f"Qdrant is not reachable: {e}", flush=True)
+        return False
+
+async def retry_qdrant(state: AppState, interval: float = QDRANT_CONNECT_RETRY_SECONDS):
+    while not await connect_qdrant(state):
+        await asyncio.sleep(interval)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    state: AppState = app.state.services
+    # Qdrant being down must not keep the app from starting; /ready reports it until it is back
+    qdrant_task = None if await connect_qdrant(state) else asyncio.create_task(retry_qdrant(state))
+    await state.report_jobs.start()
+    state.report_sweeper.start()
+    state.session_sweeper.start()
+    warmup_task = None
+    if MODEL_WARMUP:
+        for name in ["embeddings"] + [f"llm:{provider}" for provider in state.llm.providers()]:
+            state.readiness.register(name)
+        warmup_task = asyncio.create_task(warm_up(state))
+    else:
+        for name in ["embeddings"] + [f"llm:{provider}" for provider in state.llm.providers()]:
+            state.readiness.register(name, LAZY)
+    yield
+    for task in (warmup_task, qdrant_task):
+        if task is not None:
+            task.cancel()
+    await state.close()
+
+app = FastAPI(title="IntelliView AI Service", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(LLMError)
+async def llm_error_handler(request, exc: LLMError):
+    # Fail fast with a status the gateway can act on; provider text stays in the logs
+    print(f"LLM error on {request.url.path}: {exc}", flush=True)
+    headers = {"Retry-After": str(max(1, round(exc.retry_after)))} if exc.retry_after is not None else None
+    return JSONResponse(status_code=exc.status_code, headers=headers,
+                        content={"detail": "LLM provider unavailable", "error": type(exc).__name__})
 
 @app.get("/health")
 async def health_check():
+    # Liveness only; /ready says whether requests can be served
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/ready")
+async def readiness_check(state: AppState = Depends(get_state)):
+    readiness = state.readiness
+    components = readiness.report()
+    # Every call type needs at least one usable provider on its route
+    llm_ready = all(any(readiness.usable(f"llm:{provider}") for provider in route)
+                    for route in state.llm_router.routes.values())
+    ready = readiness.all_usable(["embeddings", "qdrant"]) and llm_ready
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "components": components})
+
+@app.get("/v1/embeddings/stats")
+async def embedding_stats(state: AppState = Depends(get_state)):
+    return state.embedder.stats()
+
+@app.get("/v1/llm/stats")
+async def llm_stats(state: AppState = Depends(get_state)):
+    return state.llm.stats()
+
+@app.get("/v1/cache/stats")
+async def cache_stats(state: AppState = Depends(get_state)):
+    return {
+        "chunks": state.chunk_cache.stats(),
+        "chunk_embeddings": state.embedder.chunk_cache.stats(),
+        "query_embeddings": state.embedder.query_cache.stats(),
+        "llama_states": state.llama_states.stats(),
+    }
+
+def section_counts(sections: List[Optional[str]]) -> dict:
+    counts = {}
+    for section in sections:
+        counts[section or "unknown"] = counts.get(section or "unknown", 0) + 1
+    return counts
+
+async def summarize_cv(state: AppState, text: str, content_hash: str) -> str:
+    summary_prompt = f"[INST] Summarize this CV in 3-4 bullet points focusing on technical stack and seniority. Limit to 100 words.\n\nCV TEXT:\n{text[:2000]} [/INST]"
+    cv_summary = await state.llm.call(summary_prompt, max_tokens=200, stop=["</s>"], call_type="summary")
+    # Stored on the points so re-uploads of the same file can reuse it
+    await state.vectors.set_content_summary(content_hash, cv_summary)
+    return cv_summary
+
+async def summary_entry(state: AppState, cv_session_id: str) -> Optional[dict]:
+    """The session's summary entry, falling back to the `cv_summary` stored
+    on its points: the in-memory store is empty after a restart. A miss is
+    remembered so later turns skip the Qdrant lookup."""
+    entry = state.summary_store.get(cv_session_id)
+    if entry is not None or state.summary_store.is_missing(cv_session_id):
+        return entry
+    points, _ = await state.vectors.scroll_session(cv_session_id, 1)
+    cv_summary = points[0].payload.get("cv_summary") if points else None
+    if not cv_summary:
+        state.summary_store.mark_missing(cv_session_id)
+        return None
+    return state.summary_store.set(cv_session_id, cv_summary)
+
+async def alias_ingested_cv(state: AppState, filename: str, cv_session_id: str, points: list) -> dict:
+    """Attach a new session to chunks already stored for the same file bytes."""
+    points.sort(key=lambda p: p.payload.get("chunk_index", 0))
+    await state.vectors.add_session(points, cv_session_id)
+    chunks = [p.payload["text"] for p in points]
+    sections = [p.payload.get("section") for p in points]
+    state.chunk_cache.put(cv_session_id, [p.vector for p in points], chunks, sections)
+
+    cv_summary = points[0].payload.get("cv_summary")
+    if cv_summary:
+        summary = state.summary_store.set(cv_session_id, cv_summary)
+    else:
+        text = "\n\n".join(chunks)
+        content_hash = points[0].payload["content_hash"]
+        summary = state.summary_store.start_for_content(cv_session_id, content_hash,
+                                                        lambda: summarize_cv(state, text, content_hash))
+    print(f"DEBUG: Reusing {len(points)} chunks for duplicate upload {filename}", flush=True)
+
+    return {
+        "filename": filename,
+        "cv_session_id": cv_session_id,
+        "chunk_count": len(chunks),
+        "cv_summary": None,
+        "summary_status": summary["status"],
+        "preview": chunks[:3],
+        "sections": section_counts(sections),
+        "deduplicated": True
+    }
+
 @app.post("/v1/cv/parse")
-async def parse_cv(file: UploadFile = File(...)):
+async def parse_cv(file: UploadFile = File(...), state: AppState = Depends(get_state)):
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
-    
+
+    upload = None
     try:
-        content = await file.read()
-        doc = fitz.open(stream=content, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        
-        chunks = [c.strip() for c in text.split("\n\n") if c.strip()]
+        # Spooled to disk with a size cap instead of `await file.read()`
+        upload = await spool_upload(file)
+        content_hash = upload.content_hash
         cv_session_id = str(uuid.uuid4())
-        
-        points = []
-        for i, chunk in enumerate(chunks):
-            vector = embed_model.encode(chunk).tolist()
-            points.append(models.PointStruct(
-                id=str(uuid.uuid4()),
-                vector=vector,
-                payload={
-                    "text": chunk,
-                    "cv_session_id": cv_session_id,
-                    "chunk_index": i
-                }
-            ))
-        
-        qdrant_client.upsert(
-            collection_name=COLLECTION_NAME,
-            points=points
-        )
-        
-        # Generate CV Summary for persistent context
-        summary_prompt = f"[INST] Summarize this CV in 3-4 bullet points focusing on technical stack and seniority. Limit to 100 words.\n\nCV TEXT:\n{text[:2000]} [/INST]"
-        cv_summary = call_llm(summary_prompt, max_tokens=200, stop=["</s>"])
+
+        await state.vectors.ensure_collection()
+        existing = await state.vectors.find_content(content_hash)
+        if existing:
+            return await alias_ingested_cv(state, file.filename, cv_session_id, existing)
+
+        # Section-aware, token-bounded chunks; early pages are embedded while later ones are extracted
+        document = await extract_document(state.execution, upload.path, embed=lambda texts: state.execution.run_embed(
+            state.embedder.encode_batch, texts))
+        chunks = [c.text for c in document.chunks]
+        sections = [c.section for c in document.chunks]
+        vectors = document.vectors
+        print(f"DEBUG: {file.filename}: {upload.size} bytes, {document.pages} pages, {len(chunks)} chunks", flush=True)
+
+        await state.vectors.upsert_chunks(cv_session_id, content_hash, chunks, vectors, sections)
+        state.chunk_cache.put(cv_session_id, vectors, chunks, sections)
+
+        # Generate CV Summary for persistent context in the background;
+        # poll /v1/cv/{cv_session_id}/summary or let generate_response pick it up
+        summary = state.summary_store.start_for_content(cv_session_id, content_hash,
+                                                        lambda: summarize_cv(state, document.text, content_hash))
 
         return {
             "filename": file.filename,
             "cv_session_id": cv_session_id,
             "chunk_count": len(chunks),
-            "cv_summary": cv_summary,
-            "preview": chunks[:3]
+            "cv_summary": None,
+            "summary_status": summary["status"],
+            "preview": chunks[:3],
+            "sections": section_counts(sections),
+            "deduplicated": False
         }
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=f"Error parsing CV: {str(e)}")
+    finally:
+        if upload is not None:
+            os.unlink(upload.path)
+
+def bulk_summarizer(state: AppState):
+    """on_ingested callback for a bulk upload: one summary per distinct
+    document, shared by every session of it, at most
+    BULK_SUMMARY_CONCURRENCY at a time so a large batch doesn't flood the LLM."""
+    slots = asyncio.Semaphore(BULK_SUMMARY_CONCURRENCY)
+
+    async def summarize(text: str, content_hash: str) -> str:
+        async with slots:
+            return await summarize_cv(state, text, content_hash)
+
+    def on_ingested(cv_session_ids: List[str], content_hash: str, text: str, cv_summary: Optional[str]):
+        if cv_summary:
+            for cv_session_id in cv_session_ids:
+                state.summary_store.set(cv_session_id, cv_summary)
+            return
+        for cv_session_id in cv_session_ids:
+            state.summary_store.start_for_content(cv_session_id, content_hash, lambda: summarize(text, content_hash))
+
+    return on_ingested
+
+@app.post("/v1/cv/bulk")
+async def bulk_parse_cv(files: List[UploadFile] = File(...), state: AppState = Depends(get_state)):
+    """Ingests many CVs (PDFs and/or zips of PDFs) in one request.
+
+    The response is NDJSON: one "file" event per PDF with its cv_session_id
+    or error, "progress" events, and a final "done" event. Summaries are
+    generated in the background as for /v1/cv/parse.
+    """
+    items = await spool_bulk_uploads(files)
+    try:
+        await state.vectors.ensure_collection()
+    except BaseException:
+        discard(items)
+        raise
+    pipeline = BulkIngestPipeline(
+        state.execution, state.vectors,
+        embed=lambda texts: state.execution.run_embed(state.embedder.encode_batch, texts),
+        on_ingested=bulk_summarizer(state),
+    )
+    print(f"DEBUG: Bulk upload of {len(items)} files", flush=True)
 
-@app.post("/v1/chat/generate")
-async def generate_response(request: ChatRequest):
+    async def events():
+        try:
+            async for event in pipeline.run(items):
+                yield json.dumps(event) + "\n"
+        finally:
+            discard(items)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/v1/cv/{cv_session_id}/summary")
+async def get_cv_summary(cv_session_id: str, state: AppState = Depends(get_state)):
+    entry = await summary_entry(state, cv_session_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No summary for this session")
+    return {
+        "cv_session_id": cv_session_id,
+        "status": entry["status"],
+        "cv_summary": entry["cv_summary"],
+        "error": entry["error"],
+    }
+
+@app.delete("/v1/cv/{cv_session_id}")
+async def delete_cv_session(cv_session_id: str, state: AppState = Depends(get_state)):
+    """Deletes a session's chunks (those no aliased session still uses) and
+    everything held in memory for it."""
+    held = state.summary_store.get(cv_session_id) is not None or state.transcript_store.get(cv_session_id) is not None
+    result = await state.vectors.delete_session(cv_session_id)
+    state.forget_session(cv_session_id)
+    if not held and not result["deleted_points"] and not result["detached_points"]:
+        raise HTTPException(status_code=404, detail="Unknown session")
+    print(f"DEBUG: Deleted session {cv_session_id}: {result}", flush=True)
+    return {"cv_session_id": cv_session_id, **result}
+
+@app.get("/v1/cv/sessions/stats")
+async def session_sweeper_stats(state: AppState = Depends(get_state)):
+    return state.session_sweeper.stats()
+
+async def retrieve_chunks(state: AppState, cv_session_id: str, query_vector: List[float], limit: int = 5,
+                          section: Optional[str] = None) -> List[str]:
+    hits = state.chunk_cache.search(cv_session_id, query_vector, limit, section)
+    if hits is not None:
+        return hits
+
+    # Cache miss (restart or eviction): reload the whole session in one scroll
+    # when it is small enough, otherwise let Qdrant do the filtered search.
+    points, next_offset = await state.vectors.scroll_session(cv_session_id, CHUNK_CACHE_MAX_SESSION_POINTS)
+    if not points:
+        return []
+    if next_offset is None:
+        points.sort(key=lambda p: p.payload.get("chunk_index", 0))
+        state.chunk_cache.put(cv_session_id, [p.vector for p in points], [p.payload["text"] for p in points],
+                              [p.payload.get("section") for p in points])
+        return state.chunk_cache.search(cv_session_id, query_vector, limit, section) or []
+
+    search_result = await state.vectors.search_session(cv_session_id, query_vector, limit, section)
+    return [hit.payload['text'] for hit in search_result]
+
+def resolve_transcript(state: AppState, request: ChatRequest) -> Transcript:
+    if request.history is not None:
+        return state.transcript_store.sync(request.cv_session_id, request.history)
     try:
-        # 1. Determine Interview Phase based on history length
-        history_len = len(request.history)
-        if history_len < 2:
-            phase = "VERIFICATION (Confirming CV facts)"
-        elif history_len < 6:
-            phase = "BREADTH (Scanning technical skills)"
-        elif history_len < 12:
-            phase = "DEPTH (Deep dive into complex projects)"
-        else:
-            phase = "SCENARIO (Problem solving & architecture)"
-
-        # 2. Context Retrieval Strategy (Query Expansion)
-        search_query = request.message
-        if request.history:
-            # Ask LLM to generate a search query for the vector DB based on history
-            expansion_prompt = f"""[INST] Based on the following conversation, generate a short (3-5 words) search query to find relevant technical details in the candidate's CV.
-History:
-{request.history[-2:]}
-Latest: {request.message}
-Query: [/INST]"""
-            search_query = call_llm(expansion_prompt, max_tokens=20, stop=["\n"]).strip().strip('"')
-            print(f"DEBUG: Expanded Search Query: {search_query}", flush=True)
-
-        query_vector = embed_model.encode(search_query).tolist()
-        search_result = qdrant_client.query_points(
-            collection_name=COLLECTION_NAME,
-            query=query_vector,
-            query_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="cv_session_id",
-                        match=models.MatchValue(value=request.cv_session_id),
-                    )
-                ]
-            ),
-            limit=5  # Increased from 3 to 5 for better context
-        ).points
-        
-        context = "\n".join([f"- {hit.payload['text']}" for hit in search_result])
-        
-        # 3. System Prompt Construction
-        cv_summary_text = f"\nCV SUMMARY (Holistic View):\n{request.cv_summary}" if request.cv_summary else ""
-        system_prompt = f"""You are a Senior Principal Engineer conducting a professional but rigorous technical interview.
-Current Phase: {phase}
+        return state.transcript_store.check(request.cv_session_id, request.seq)
+    except TranscriptConflict as e:
+        raise HTTPException(status_code=409, detail={"error": "transcript_out_of_sync", "expected_seq": e.expected_seq})
+
+def record_turn(state: AppState, request: ChatRequest, seq: int, response_text: str) -> int:
+    messages = [] if request.is_init else [{"role": "user", "content": request.message}]
+    messages.append({"role": "assistant", "content": response_text})
+    try:
+        return state.transcript_store.append(request.cv_session_id, seq, messages)
+    except TranscriptConflict as e:
+        # Another turn for this session landed while we were generating
+        raise HTTPException(status_code=409, detail={"error": "transcript_out_of_sync", "expected_seq": e.expected_seq})
+
+async def build_chat_prompt(state: AppState, request: ChatRequest, transcript: Transcript) -> Tuple[str, str]:
+    """The chat prompt and its stable prefix (system prompt with the CV and
+    interview summaries), which the local model caches separately."""
+    token_counter = state.token_counter
+    history = transcript.messages
+    # 1. Determine Interview Phase based on history length
+    history_len = len(history)
+    if history_len < 2:
+        phase = "VERIFICATION (Confirming CV facts)"
+    elif history_len < 6:
+        phase = "BREADTH (Scanning technical skills)"
+    elif history_len < 12:
+        phase = "DEPTH (Deep dive into complex projects)"
+    else:
+        phase = "SCENARIO (Problem solving & architecture)"
+
+    # 2. Context Retrieval Strategy (Query Expansion, see QUERY_EXPANSION_MODE)
+    with stage(QUERY_EXPANSION):
+        query_vector = await state.query_expander.query_vector(request.message, history)
+    hits = await retrieve_chunks(state, request.cv_session_id, query_vector, limit=5,  # Increased from 3 to 5 for better context
+                                 section=request.section)
+    if request.section and not hits:
+        # This CV has no such section (or predates section tagging)
+        hits = await retrieve_chunks(state, request.cv_session_id, query_vector, limit=5)
+
+    context = "\n".join(token_counter.fit([f"- {text}" for text in hits], PROMPT_BUDGET_CONTEXT))
+
+    # 3. System Prompt Construction (each section capped by its token budget)
+    cv_summary = request.cv_summary
+    if not cv_summary:
+        entry = await summary_entry(state, request.cv_session_id)
+        cv_summary = entry["cv_summary"] if entry and entry["status"] == "ready" else None
+    cv_summary_text = ""
+    if cv_summary:
+        cv_summary_text = f"\nCV SUMMARY (Holistic View):\n{token_counter.truncate(cv_summary, PROMPT_BUDGET_CV_SUMMARY)}"
+    rolling_summary, recent_history = await state.history_compressor.compress(request.cv_session_id, history)
+    if rolling_summary:
+        cv_summary_text += f"\n\nEARLIER IN THIS INTERVIEW (Summary of older turns):\n{rolling_summary}"
+    # Only stable text goes in the system prompt; phase and retrieved context
+    # ride on the latest turn so the prompt prefix (and llama_cpp KV cache)
+    # carries over from one turn to the next.
+    system_prompt = f"""You are a Senior Principal Engineer conducting a professional but rigorous technical interview.
 
 CORE RULES:
 1. LEAD THE INTERVIEW. Ask exactly ONE sharp, technical question per turn.
@@ -217,49 +444,137 @@ CORE RULES:
 4. REDIRECT: If the candidate is off-topic or evasive, firmly but professionally bring them back to the technical core.
 5. NEVER reveal you are an AI. Never include meta-commentary.
 {cv_summary_text}
+"""
+    system_prompt = token_counter.truncate(system_prompt, PROMPT_BUDGET_SYSTEM + PROMPT_BUDGET_CV_SUMMARY + PROMPT_BUDGET_HISTORY_SUMMARY)
+    message = token_counter.truncate(request.message, PROMPT_BUDGET_MESSAGE)
+    if request.instruction:
+        message += f" ({request.instruction})"
+    turn_context = f"""Current Phase: {phase}
 
 CV CONTEXT (Specific details for current turn):
 {context}
 """
 
-        # 4. Mistral-7B History Formatting ([INST] Instruction [/INST] Model answer</s>[INST] Follow-up [/INST])
-        if request.is_init:
-            full_prompt = f"[INST] {system_prompt}\n\nGreet the candidate and start the {phase} phase with one question. [/INST]"
-        else:
-            # Reconstruct history in Mistral format
-            formatted_history = ""
-            for i, msg in enumerate(request.history):
-                role = msg.get("role")
-                content = msg.get("content")
-                if role == "user":
-                    formatted_history += f"[INST] {content} [/INST] "
-                else:
-                    formatted_history += f"{content} </s>"
-            
-            full_prompt = f"[INST] {system_prompt} [/INST] {formatted_history} [INST] {request.message} [/INST]"
-
-        print(f"DEBUG: Full Prompt Length: {len(full_prompt)}", flush=True)
-        response_text = call_llm(full_prompt, max_tokens=150, stop=["[INST]", "</s>", "Note:", "Interviewer:"])
-        
+    # 4. Mistral-7B History Formatting ([INST] Instruction [/INST] Model answer</s>[INST] Follow-up [/INST])
+    if request.is_init:
+        full_prompt = f"[INST] {system_prompt}\n{turn_context}\nGreet the candidate and start the {phase} phase with one question. [/INST]"
+    else:
+        # Reconstruct the turns that fit the history budget in Mistral format
+        formatted_history = transcript.formatted_since(len(history) - len(recent_history))
+
+        full_prompt = f"[INST] {system_prompt} [/INST] {formatted_history} [INST] {turn_context}\nCANDIDATE: {message} [/INST]"
+
+    print(f"DEBUG: Prompt tokens: {token_counter.count(full_prompt)} "
+          f"(history {len(recent_history)}/{len(history)} turns verbatim)", flush=True)
+    return full_prompt, f"[INST] {system_prompt}"
+
+@app.post("/v1/chat/generate")
+async def generate_response(request: ChatRequest, state: AppState = Depends(get_state)):
+    transcript = resolve_transcript(state, request)
+    seq = transcript.seq
+    try:
+        full_prompt, prefix = await build_chat_prompt(state, request, transcript)
+        completion = await state.llm.complete("chat", full_prompt, max_tokens=150, stop=CHAT_STOP_SEQUENCES,
+                                              session_id=request.cv_session_id, prefix=prefix)
+
         # Final cleanup
-        response_text = re.sub(r"\(?Note:.*", "", response_text, flags=re.IGNORECASE).strip()
-        response_text = response_text.replace("Assistant:", "").replace("Interviewer:", "").strip()
-        
-        return {"response": response_text}
+        response_text = clean_response(completion.value)
+
+        return {"response": response_text, "seq": record_turn(state, request, seq, response_text),
+                "provider": completion.provider}
+    except (HTTPException, LLMError):
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"Error in generate_response: {e}", flush=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/v1/report/generate")
-async def generate_report(request: EvaluationRequest):
+@app.post("/v1/chat/generate/stream")
+async def generate_response_stream(request: ChatRequest, state: AppState = Depends(get_state)):
+    # Prompt errors still surface as a plain 500 before the stream starts
+    transcript = resolve_transcript(state, request)
+    seq = transcript.seq
     try:
-        # 1. Prepare Transcript for LLM
-        transcript_text = "\n".join([f"{m['role'].upper()}: {m['content']}" for m in request.transcript])
-        
-        # 2. Ask LLM to evaluate with Chain-of-Thought (CoT)
-        eval_prompt = f"""[INST] You are an Expert Technical Bar-Raiser. Evaluate this technical interview transcript to determine if the candidate meets the high standards for a Senior Engineer.
+        full_prompt, prefix = await build_chat_prompt(state, request, transcript)
+    except LLMError:
+        raise
+    except Exception as e:
+        print(f"Error in generate_response_stream: {e}", flush=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        cleaner = StreamCleaner(CHAT_STOP_SEQUENCES)
+        try:
+            routed = await state.llm.open_stream("chat", full_prompt, max_tokens=150, stop=CHAT_STOP_SEQUENCES,
+                                                 session_id=request.cv_session_id, prefix=prefix)
+            tokens = routed.value
+            try:
+                async for token in tokens:
+                    delta = cleaner.feed(token)
+                    if delta:
+                        yield sse_event("token", {"delta": delta})
+                    if cleaner.done:
+                        break
+            finally:
+                await tokens.aclose()
+            response_text = cleaner.final()
+            yield sse_event("done", {"response": response_text, "seq": record_turn(state, request, seq, response_text),
+                                     "provider": routed.provider})
+        except HTTPException as e:
+            yield sse_event("error", e.detail)
+        except LLMError as e:
+            print(f"LLM error in generate_response_stream: {e}", flush=True)
+            yield sse_event("error", {"detail": "LLM provider unavailable", "error": type(e).__name__,
+                                      "status": e.status_code})
+        except Exception as e:
+            print(f"Error in generate_response_stream: {e}", flush=True)
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/v1/chat/{cv_session_id}/transcript")
+async def get_transcript(cv_session_id: str, state: AppState = Depends(get_state)):
+    transcript = state.transcript_store.get(cv_session_id)
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="No transcript for this session")
+    return {"cv_session_id": cv_session_id, "seq": transcript.seq, "history": transcript.messages}
+
+@app.put("/v1/chat/{cv_session_id}/transcript")
+async def sync_transcript(cv_session_id: str, request: TranscriptSync, state: AppState = Depends(get_state)):
+    transcript = state.transcript_store.sync(cv_session_id, request.history)
+    return {"cv_session_id": cv_session_id, "seq": transcript.seq}
+
+def resolve_report_transcript(state: AppState, request: EvaluationRequest) -> List[dict]:
+    if request.transcript:
+        return request.transcript
+    stored = state.transcript_store.get(request.cv_session_id)
+    if stored is None or not stored.messages:
+        raise HTTPException(status_code=404, detail="No transcript for this session")
+    return list(stored.messages)
+
+async def complete_evaluation(state: AppState, eval_prompt: str):
+    """Evaluation completion, retried once with a larger budget when the
+    answer was cut off: string lengths are not enforced while decoding, so
+    defaulting a truncated object would discard a real evaluation."""
+    budgets = (EVALUATION_MAX_TOKENS, int(EVALUATION_MAX_TOKENS * EVALUATION_RETRY_TOKEN_FACTOR))
+    for max_tokens in budgets:
+        completion = await state.llm.complete("evaluation", eval_prompt, max_tokens=max_tokens, stop=["</s>"],
+                                              json_schema=EVALUATION_SCHEMA)
+        print(f"DEBUG: Raw LLM Output ({completion.provider}): {completion.value}", flush=True)
+        if not evaluation_truncated(completion.value):
+            return completion
+        print(f"DEBUG: Evaluation cut off at max_tokens={max_tokens}", flush=True)
+    raise EvaluationTruncated(f"Evaluation output was still incomplete at max_tokens={budgets[-1]}")
+
+async def run_report(state: AppState, candidate_name: str, transcript: List[dict]) -> dict:
+    from documents import render_report
+    # 1. Prepare Transcript for LLM
+    transcript_text = "\n".join([f"{m['role'].upper()}: {m['content']}" for m in transcript])
+
+    # 2. Ask LLM to evaluate with Chain-of-Thought (CoT)
+    eval_prompt = f"""[INST] You are an Expert Technical Bar-Raiser. Evaluate this technical interview transcript to determine if the candidate meets the high standards for a Senior Engineer.
 
 **SCORING CRITERIA:**
 - PERFECT (9-10/10): Deep technical expertise, provides specific implementation details (tools, metrics, trade-offs), and handles advanced follow-ups with ease.
@@ -271,7 +586,7 @@ async def generate_report(request: EvaluationRequest):
 1. ANALYZE FIRST: Write a short "Auditor Note" evaluating the technical depth.
 2. REWARD EXPERTISE: Candidates who mention specific tools (pg_stat_statements, asyncpg, Envoy, gRPC, Pydantic), specific configs (work_mem, pool_size), or specific metrics are EXPERTS. These are not "buzzwords" when used to explain a solution—they are evidence of mastery.
 3. BE FAIR TO DEPTH: If a candidate provides a highly technical answer, they should be scored 8-10. Even if they pivot slightly to provide broader context (Technical Chaining), this is a sign of SENIORITY and should be REWARDED, not penalized.
-4. HIRE RECOMMENDATION: 
+4. HIRE RECOMMENDATION:
    - HIRE: Required for any candidate with Technical Score >= 7.
    - NO HIRE: Reserved for Vague, Off-topic, or Minimalist candidates.
 5. FINAL RECOMMENDATION: Clear "HIRE" for Perfect/Strong; "NO HIRE" for others.
@@ -279,117 +594,84 @@ async def generate_report(request: EvaluationRequest):
 TRANSCRIPT:
 {transcript_text}
 
-Output ONLY a valid JSON object in this format:
-{{
-    "auditor_notes": "Critique of depth, honesty, and technical accuracy...",
-    "technical_score": int,
-    "communication_score": int,
-    "problem_solving_score": int,
-    "experience_match_score": int,
-    "strengths": ["Strength [Quote]"],
-    "weaknesses": ["Weakness [Quote]"],
-    "proven_skills": ["Skill - Evidence Level (Low/Med/High)"],
-    "summary": "Clear HIRE or NO HIRE recommendation with justification."
-}}
+Output ONLY a JSON object matching this JSON schema, writing "auditor_notes" first:
+{EVALUATION_SCHEMA_JSON}
+Put quoted evidence in "strengths" and "weaknesses", an evidence level (Low/Med/High) in "proven_skills", and a clear HIRE or NO HIRE recommendation with justification in "summary".
 [/INST]"""
 
-        eval_json_str = call_llm(eval_prompt, max_tokens=2048, stop=["</s>"])
-        print(f"DEBUG: Raw LLM Output: {eval_json_str}", flush=True)
-        
-        # Robust JSON extraction
-        try:
-            start_idx = eval_json_str.find('{')
-            end_idx = eval_json_str.rfind('}')
-            
-            if start_idx != -1:
-                json_str = eval_json_str[start_idx:end_idx+1]
-                evaluation = json.loads(json_str)
-            else:
-                 raise ValueError("Could not find { in LLM output")
-        except Exception as e:
-            print(f"JSON Extraction Error: {e}. Raw: {eval_json_str}")
-            evaluation = {}
-
-        # Enforce defaults and realistic overrides
-        evaluation.setdefault('technical_score', 1)
-        evaluation.setdefault('communication_score', 1)
-        evaluation.setdefault('problem_solving_score', 1)
-        evaluation.setdefault('experience_match_score', 1)
-        evaluation.setdefault('auditor_notes', 'N/A')
-        evaluation.setdefault('summary', 'The evaluation failed due to insufficient data or LLM error.')
-        evaluation.setdefault('strengths', ['N/A'])
-        evaluation.setdefault('weaknesses', ['Analysis failed: Transcript likely too short or incoherent.'])
-        evaluation.setdefault('proven_skills', ['None detected'])
-
-        if len(request.transcript) < 4:
-            evaluation["summary"] = "NO HIRE: Interview was too short to establish any technical signal."
-            evaluation["technical_score"] = min(evaluation.get("technical_score", 1), 2)
-
-        # 3. Generate PDF
-        pdf = ReportPDF()
-        pdf.add_page()
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(pdf.epw, 10, f"Candidate: {request.candidate_name}", 0, 1)
-        
-        # Score Grid
-        pdf.set_font('Arial', 'B', 10)
-        col_width = pdf.epw / 4
-        pdf.cell(col_width, 10, f"Technical: {evaluation['technical_score']}/10", 1, 0)
-        pdf.cell(col_width, 10, f"Comm: {evaluation['communication_score']}/10", 1, 0)
-        pdf.cell(col_width, 10, f"Problem: {evaluation['problem_solving_score']}/10", 1, 0)
-        pdf.cell(col_width, 10, f"Match: {evaluation['experience_match_score']}/10", 1, 1)
-        
-        pdf.ln(5)
-        pdf.set_font('Arial', 'B', 11)
-        pdf.cell(pdf.epw, 10, "Auditor Review Notes:", 0, 1)
-        pdf.set_font('Arial', 'I', 10)
-        pdf.multi_cell(pdf.epw, 6, evaluation['auditor_notes'])
-
-        pdf.ln(5)
-        pdf.set_font('Arial', 'B', 11)
-        pdf.cell(pdf.epw, 10, "Executive Summary & Recommendation:", 0, 1)
-        pdf.set_font('Arial', '', 11)
-        pdf.multi_cell(pdf.epw, 7, evaluation['summary'])
-        
-        pdf.ln(5)
-        pdf.set_font('Arial', 'B', 11)
-        pdf.cell(pdf.epw, 10, "Proven Technical Skills (Evidence-Based):", 0, 1)
-        pdf.set_font('Arial', '', 10)
-        for skill in evaluation['proven_skills']:
-            pdf.cell(pdf.epw, 7, f"* {skill}", 0, 1)
-
-        pdf.ln(5)
-        pdf.set_font('Arial', 'B', 11)
-        pdf.cell(pdf.epw, 10, "Key Strengths:", 0, 1)
-        pdf.set_font('Arial', '', 10)
-        for s in evaluation['strengths']:
-            pdf.multi_cell(pdf.epw, 6, f"+ {s}")
-            
-        pdf.ln(5)
-        pdf.set_font('Arial', 'B', 11)
-        pdf.cell(pdf.epw, 10, "Critical Weaknesses:", 0, 1)
-        pdf.set_font('Arial', '', 10)
-        for w in evaluation['weaknesses']:
-            pdf.multi_cell(pdf.epw, 6, f"- {w}")
-
-        report_filename = f"report_{uuid.uuid4()}.pdf"
-        report_path = os.path.join(REPORTS_DIR, report_filename)
-        pdf.output(report_path)
+    completion = await complete_evaluation(state, eval_prompt)
+    evaluation = parse_evaluation(completion.value)
 
-        return {
-            "evaluation": evaluation,
-            "report_filename": report_filename
-        }
+    if len(transcript) < 4:
+        evaluation["summary"] = "NO HIRE: Interview was too short to establish any technical signal."
+        evaluation["technical_score"] = min(evaluation.get("technical_score", 1), 2)
+
+    # 3. Generate PDF
+    report_filename = f"report_{uuid.uuid4()}.pdf"
+    with stage(PDF_RENDER):
+        pdf_bytes = await state.execution.run_cpu(render_report, candidate_name, evaluation)
+    await asyncio.to_thread(state.report_store.put, report_filename, pdf_bytes)
+
+    return {
+        "evaluation": evaluation,
+        "report_filename": report_filename,
+        "provider": completion.provider
+    }
+
+async def run_report_job(state: AppState, job: dict) -> dict:
+    return await run_report(state, job["candidate_name"], job["transcript"])
+
+app.state.services = create_state()
+
+@app.post("/v1/report/generate")
+async def generate_report(request: EvaluationRequest, state: AppState = Depends(get_state)):
+    transcript = resolve_report_transcript(state, request)
+    try:
+        return await run_report(state, request.candidate_name, transcript)
+    except LLMError:
+        raise
     except Exception as e:
         print(f"Error generating report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/v1/report/jobs", status_code=202)
+async def submit_report_job(request: ReportJobRequest, state: AppState = Depends(get_state)):
+    # Snapshot the transcript so the persisted job does not depend on in-memory state
+    job_request = {"candidate_name": request.candidate_name, "cv_session_id": request.cv_session_id,
+                   "transcript": resolve_report_transcript(state, request)}
+    try:
+        job = await state.report_jobs.submit(job_request, request.callback_url)
+    except InvalidCallback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job["id"], "status": job["status"]}
+
+@app.get("/v1/report/queue/stats")
+async def report_queue_stats(state: AppState = Depends(get_state)):
+    return state.report_jobs.stats()
+
+@app.get("/v1/report/jobs/{job_id}")
+async def get_report_job(job_id: str, state: AppState = Depends(get_state)):
+    job = await state.report_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return ReportJobQueue.public_view(job)
+
 @app.get("/v1/report/download/{filename}")
-async def download_report(filename: str):
-    file_path = os.path.join(REPORTS_DIR, filename)
-    if not os.path.exists(file_path):
+async def download_report(filename: str, state: AppState = Depends(get_state)):
+    try:
+        pdf_bytes = await asyncio.to_thread(state.report_store.get, filename)
+    except ValueError:
+        pdf_bytes = None
+    if pdf_bytes is None:
         raise HTTPException(status_code=404, detail="Report not found")
-    return FileResponse(file_path, filename=filename, media_type='application/pdf')
+    return Response(pdf_bytes, media_type='application/pdf',
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/v1/report/store/stats")
+async def report_store_stats(state: AppState = Depends(get_state)):
+    return state.report_sweeper.stats()
 
 if __name__ == "__main__":
     import uvicorn
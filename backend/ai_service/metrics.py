@@ -0,0 +1,111 @@
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Stage names used with `stage()`; one label value each
+PDF_EXTRACTION = "pdf_extraction"
+CHUNKING = "chunking"
+EMBEDDING = "embedding"
+QUERY_EMBEDDING = "query_embedding"
+QDRANT_UPSERT = "qdrant_upsert"
+QDRANT_QUERY = "qdrant_query"
+QUERY_EXPANSION = "query_expansion"
+PDF_RENDER = "pdf_render"
+
+# From a cached chunk lookup (ms) to a long local generation (minutes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+STAGE_SECONDS = Histogram(
+    "intelliview_stage_seconds", "Time spent in each pipeline stage.", ["stage"], buckets=LATENCY_BUCKETS)
+LLM_GENERATION_SECONDS = Histogram(
+    "intelliview_llm_generation_seconds", "LLM generation time per attempt, including client retries.",
+    ["provider", "call_type", "mode"], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter(
+    "intelliview_llm_tokens", "Prompt and completion tokens, as counted by the service's TokenCounter.",
+    ["provider", "call_type", "kind"])
+LLM_TOKENS_PER_SECOND = Histogram(
+    "intelliview_llm_completion_tokens_per_second", "Completion tokens per second of generation.",
+    ["provider"], buckets=TOKEN_RATE_BUCKETS)
+ERRORS = Counter("intelliview_errors", "Errors by stage and exception type.", ["stage", "type"])
+REQUESTS_IN_FLIGHT = Gauge(
+    "intelliview_requests_in_flight", "Requests being handled, streamed responses until their last byte.",
+    ["endpoint"])
+REQUEST_SECONDS = Histogram(
+    "intelliview_request_seconds", "Request duration, streamed responses until their last byte.",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS)
+
+
+def record_error(stage_name: str, error: BaseException):
+    ERRORS.labels(stage_name, type(error).__name__).inc()
+
+
+@contextmanager
+def stage(name: str):
+    """Times the block into STAGE_SECONDS; exceptions are counted in ERRORS
+    and re-raised. Works across awaits."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(name, e)
+        raise
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def record_generation(provider: str, call_type: str, mode: str, seconds: float, prompt_tokens: int,
+                      completion_tokens: int):
+    LLM_GENERATION_SECONDS.labels(provider, call_type, mode).observe(seconds)
+    LLM_TOKENS.labels(provider, call_type, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(provider, call_type, "completion").inc(completion_tokens)
+    if seconds > 0 and completion_tokens:
+        LLM_TOKENS_PER_SECOND.labels(provider).observe(completion_tokens / seconds)
+
+
+def latest() -> tuple:
+    """(body, content type) of the /metrics exposition."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware keeping REQUESTS_IN_FLIGHT and REQUEST_SECONDS per
+    route template (`/v1/cv/{cv_session_id}/summary`), so ids don't become
+    label values. Unlike an `@app.middleware("http")` function it sees the
+    end of streamed responses."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _endpoint(self, scope) -> Optional[str]:
+        from starlette.routing import Match
+
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", None)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        endpoint = self._endpoint(scope) or "unmatched"
+        status = {"code": 500}
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.labels(endpoint).inc()
+        try:
+            await self.app(scope, receive, send_status)
+        except Exception as e:
+            record_error("request", e)
+            raise
+        finally:
+            REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+            REQUEST_SECONDS.labels(endpoint, scope["method"], str(status["code"])).observe(time.perf_counter() - start)
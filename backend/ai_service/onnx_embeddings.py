@@ -0,0 +1,114 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Directory written by export_onnx_embeddings.py: model.onnx, model_int8.onnx, tokenizer.json
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", os.path.join(os.path.dirname(__file__), "models", "all-MiniLM-L6-v2-onnx"))
+# Dynamic int8 weights: roughly half the latency and a quarter of the weights on CPU
+EMBED_ONNX_QUANTIZED = os.getenv("EMBED_ONNX_QUANTIZED", "true").lower() in ("1", "true", "yes")
+# 0 leaves the choice to onnxruntime (one thread per physical core)
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+# all-MiniLM-L6-v2 was trained on 256 word pieces; SentenceTransformer truncates there too
+EMBED_ONNX_MAX_LENGTH = int(os.getenv("EMBED_ONNX_MAX_LENGTH", "256"))
+# Minimum cosine similarity to the PyTorch embeddings for the parity check
+EMBED_ONNX_MIN_COSINE = float(os.getenv("EMBED_ONNX_MIN_COSINE", "0.98"))
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+# Representative CV and interview text for the parity check
+PARITY_TEXTS = [
+    "Senior Engineer at CloudTech (2020-Present): Led the migration of a legacy monolith to FastAPI microservices.",
+    "Optimized PostgreSQL queries reducing latency by 40% using pg_stat_statements and better indexes.",
+    "Python, FastAPI, Node.js, NestJS, PostgreSQL, Redis, Docker, Kubernetes, AWS, CI/CD, Git.",
+    "How did you size the connection pool when the service scaled out?",
+    "I tuned work_mem and pool_size after profiling the slow report queries.",
+    "Built RESTful APIs using Node.js and Express. Implemented Redis caching.",
+    "warm-up",
+]
+
+
+class OnnxSentenceEncoder:
+    """all-MiniLM-L6-v2 in onnxruntime, as a drop-in for the SentenceTransformer
+    `encode` used by EmbeddingService.
+
+    The ONNX graph stops at the transformer's token embeddings; mean pooling
+    over the attention mask and L2 normalisation are done here, exactly as
+    the model's SentenceTransformer pipeline does, so vectors stay 384-dim,
+    unit length and comparable with points already in Qdrant.
+    """
+
+    def __init__(self, session, tokenizer, normalize: bool = True):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.normalize = normalize
+        self.input_names = {i.name for i in session.get_inputs()}
+
+    @classmethod
+    def load(cls, model_dir: str = EMBED_ONNX_DIR, quantized: bool = EMBED_ONNX_QUANTIZED,
+             threads: int = EMBED_ONNX_THREADS, max_length: int = EMBED_ONNX_MAX_LENGTH) -> "OnnxSentenceEncoder":
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        # Batches are already parallel inside each op; the embed pool supplies concurrency
+        options.inter_op_num_threads = 1
+        path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+        tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        tokenizer.enable_truncation(max_length=max_length)
+        tokenizer.enable_padding(pad_id=tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+        print(f"Loaded ONNX embeddings from {path} (threads={threads or 'auto'})", flush=True)
+        return cls(session, tokenizer)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.session.get_outputs()[0].shape[-1]
+
+    def _feeds(self, encodings) -> Dict[str, np.ndarray]:
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        return {name: value for name, value in feeds.items() if name in self.input_names}
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = self._feeds(encodings)
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.float32)[:, :, None]
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Length-sorted batches pad less, as SentenceTransformer does
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            for i, vector in zip(indices, self._encode_batch([texts[i] for i in indices])):
+                out[i] = vector
+        vectors = np.stack(out)
+        return vectors[0] if single else vectors
+
+
+def cosine_parity(reference, candidate, texts: Sequence[str] = PARITY_TEXTS) -> dict:
+    """Cosine similarity between two encoders' embeddings of the same texts."""
+    a = np.asarray(reference.encode(list(texts), convert_to_numpy=True), dtype=np.float32)
+    b = np.asarray(candidate.encode(list(texts), convert_to_numpy=True), dtype=np.float32)
+    if a.shape != b.shape:
+        raise ValueError(f"Embedding shapes differ: {a.shape} vs {b.shape}")
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {"dim": a.shape[1], "min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
@@ -0,0 +1,150 @@
+import hashlib
+import math
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+# Token budgets per prompt section. Defaults leave room for the 150-token
+# answer inside the local model's n_ctx=4096.
+PROMPT_BUDGET_SYSTEM = int(os.getenv("PROMPT_BUDGET_SYSTEM", "600"))
+PROMPT_BUDGET_CV_SUMMARY = int(os.getenv("PROMPT_BUDGET_CV_SUMMARY", "300"))
+PROMPT_BUDGET_CONTEXT = int(os.getenv("PROMPT_BUDGET_CONTEXT", "600"))
+PROMPT_BUDGET_HISTORY = int(os.getenv("PROMPT_BUDGET_HISTORY", "1800"))
+PROMPT_BUDGET_HISTORY_SUMMARY = int(os.getenv("PROMPT_BUDGET_HISTORY_SUMMARY", "250"))
+PROMPT_BUDGET_MESSAGE = int(os.getenv("PROMPT_BUDGET_MESSAGE", "400"))
+# When history overflows, fold until it is down to this share of its budget,
+# so the summary LLM call happens every few turns instead of every turn.
+PROMPT_HISTORY_FOLD_TARGET = float(os.getenv("PROMPT_HISTORY_FOLD_TARGET", "0.6"))
+HISTORY_DIGEST_MAX_SESSIONS = int(os.getenv("HISTORY_DIGEST_MAX_SESSIONS", "10000"))
+
+
+class TokenCounter:
+    """Counts tokens with the model tokenizer when one is attached.
+
+    Hosted models have no local tokenizer, so until `tokenize` is set the
+    count is a conservative characters-per-token estimate.
+    """
+
+    def __init__(self, tokenize: Optional[Callable[[str], list]] = None, chars_per_token: float = 3.5):
+        self.tokenize = tokenize
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenize is not None:
+            return len(self.tokenize(text))
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text: str, budget: int) -> str:
+        if self.count(text) <= budget:
+            return text
+        # Longest character prefix that fits alongside the " ..." marker
+        budget -= self.count(" ...")
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count(text[:mid]) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low].rstrip() + " ..."
+
+    def fit(self, items: List[str], budget: int) -> List[str]:
+        """Leading items whose total token count fits in `budget`."""
+        kept, used = [], 0
+        for item in items:
+            cost = self.count(item)
+            if used + cost > budget:
+                break
+            kept.append(item)
+            used += cost
+        return kept
+
+
+def format_turn(msg: dict) -> str:
+    if msg.get("role") == "user":
+        return f"[INST] {msg.get('content')} [/INST] "
+    return f"{msg.get('content')} </s>"
+
+
+def history_summary_prompt(previous_summary: str, turns: List[dict]) -> str:
+    new_turns = "\n".join([f"{m.get('role', '').upper()}: {m.get('content')}" for m in turns])
+    return f"""[INST] You are keeping running notes on a technical interview. Update the notes with the new turns below. Keep every concrete technology, claim and gap the candidate showed, and the topics already covered. Limit to 120 words.
+
+CURRENT NOTES:
+{previous_summary or "None yet."}
+
+NEW TURNS:
+{new_turns} [/INST]"""
+
+
+def _fingerprint(messages: List[dict]) -> str:
+    digest = hashlib.sha256()
+    for msg in messages:
+        digest.update(f"{msg.get('role')}\0{msg.get('content')}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class HistoryCompressor:
+    """Keeps recent turns within the history budget and folds older turns
+    into a rolling per-session summary.
+
+    Only the turns evicted since the last fold are sent to `summarize`
+    together with the previous summary, so the summary grows incrementally
+    instead of being regenerated from the full history each turn.
+    """
+
+    def __init__(self, counter: TokenCounter, summarize: Callable[[str, List[dict]], Awaitable[str]],
+                 history_budget: int = PROMPT_BUDGET_HISTORY, summary_budget: int = PROMPT_BUDGET_HISTORY_SUMMARY,
+                 fold_target: float = PROMPT_HISTORY_FOLD_TARGET, max_sessions: int = HISTORY_DIGEST_MAX_SESSIONS):
+        self.counter = counter
+        self.summarize = summarize
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self.fold_target = fold_target
+        self.max_sessions = max_sessions
+        # session -> {"covered": n messages folded, "fingerprint": hash of them, "summary": str}
+        self._digests: "OrderedDict[str, dict]" = OrderedDict()
+
+    def _digest(self, session_id: str, history: List[dict]) -> dict:
+        digest = self._digests.get(session_id)
+        if digest is None or digest["covered"] > len(history) or \
+                digest["fingerprint"] != _fingerprint(history[:digest["covered"]]):
+            # New session, or the caller's history no longer matches what we folded
+            digest = {"covered": 0, "fingerprint": _fingerprint([]), "summary": ""}
+        self._digests[session_id] = digest
+        self._digests.move_to_end(session_id)
+        while len(self._digests) > self.max_sessions:
+            self._digests.popitem(last=False)
+        return digest
+
+    def _split(self, history: List[dict], start: int, budget: int) -> int:
+        """First index from which history[index:] fits in `budget`, not before `start`."""
+        used = 0
+        for index in range(len(history) - 1, start - 1, -1):
+            used += self.counter.count(format_turn(history[index]))
+            if used > budget:
+                return index + 1
+        return start
+
+    async def compress(self, session_id: str, history: List[dict]) -> Tuple[str, List[dict]]:
+        """Returns (rolling summary of folded turns, recent turns to send verbatim)."""
+        digest = self._digest(session_id, history)
+        recent_budget = self.history_budget - self.summary_budget
+        keep_from = self._split(history, digest["covered"], recent_budget)
+        if keep_from > digest["covered"]:
+            keep_from = self._split(history, digest["covered"], int(recent_budget * self.fold_target))
+            evicted = history[digest["covered"]:keep_from]
+            try:
+                summary = await self.summarize(digest["summary"], evicted)
+                digest["summary"] = self.counter.truncate(summary.strip(), self.summary_budget)
+            except Exception as e:
+                # Keep the old summary; the evicted turns are simply dropped
+                print(f"Error folding interview history: {e}", flush=True)
+            digest["covered"] = keep_from
+            digest["fingerprint"] = _fingerprint(history[:keep_from])
+        return digest["summary"], history[digest["covered"]:]
+
+    def evict(self, session_id: str):
+        self._digests.pop(session_id, None)
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import re
+from collections import Counter
+from typing import Awaitable, Callable, List
+
+import numpy as np
+
+# llm | weighted | keywords | none
+QUERY_EXPANSION_MODE = os.getenv("QUERY_EXPANSION_MODE", "weighted").lower()
+# Share of the candidate's answer in the "weighted" mix; the rest goes to the last question
+QUERY_EXPANSION_ANSWER_WEIGHT = float(os.getenv("QUERY_EXPANSION_ANSWER_WEIGHT", "0.6"))
+QUERY_EXPANSION_MAX_KEYWORDS = int(os.getenv("QUERY_EXPANSION_MAX_KEYWORDS", "6"))
+
+_STOPWORDS = set("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing done down during each even ever every few for from
+further get got had has have having he her here hers him his how i if in into is it its itself just
+know let like made make many me might more most much must my myself no nor not now of off on once
+only or other our ours out over own please really right said same say see she should so some such
+sure tell than that the their them then there these they thing things think this those through to
+too under until up us use used using very want was way we well were what when where which while who
+whom why will with work worked working would yes you your yours yourself
+""".split())
+_TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9+#.\-/]*[A-Za-z0-9+#]|[A-Za-z]")
+
+
+def extract_keywords(texts: List[str], limit: int = QUERY_EXPANSION_MAX_KEYWORDS) -> List[str]:
+    """Ranks content words by frequency, weighting later texts higher.
+
+    Tokens that look technical (capitalised, digits, symbols like C++ or
+    CI/CD) get a boost since those are what the CV chunks actually contain.
+    """
+    scores = Counter()
+    surface = {}
+    for position, text in enumerate(texts, start=1):
+        for token in _TOKEN_RE.findall(text or ""):
+            key = token.lower()
+            if key in _STOPWORDS or len(key) < 2:
+                continue
+            boost = 2.0 if (token[0].isupper() or any(c in token for c in "0123456789+#./-")) else 1.0
+            scores[key] += position * boost
+            surface.setdefault(key, token)
+    return [surface[key] for key, _ in scores.most_common(limit)]
+
+
+class QueryExpander:
+    """Turns the latest turn into a retrieval vector.
+
+    - llm: ask the LLM for a 3-5 word search query (extra round-trip)
+    - weighted: mix embeddings of the last interviewer question and the answer
+    - keywords: embed keywords extracted from the recent history
+    - none: embed the latest message as-is
+    """
+
+    MODES = ("llm", "weighted", "keywords", "none")
+
+    def __init__(self, embed_query: Callable[[str], Awaitable[List[float]]],
+                 call_llm: Callable[..., Awaitable[str]], mode: str = QUERY_EXPANSION_MODE,
+                 answer_weight: float = QUERY_EXPANSION_ANSWER_WEIGHT):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown query expansion mode '{mode}', expected one of {self.MODES}")
+        self.embed_query = embed_query
+        self.call_llm = call_llm
+        self.mode = mode
+        self.answer_weight = min(max(answer_weight, 0.0), 1.0)
+
+    async def query_vector(self, message: str, history: List[dict]) -> List[float]:
+        if not history or self.mode == "none":
+            return await self.embed_query(message)
+        if self.mode == "llm":
+            return await self.embed_query(await self._llm_query(message, history))
+        if self.mode == "keywords":
+            recent = [m.get("content", "") for m in history[-4:]] + [message]
+            search_query = " ".join(extract_keywords(recent)) or message
+            print(f"DEBUG: Keyword Search Query: {search_query}", flush=True)
+            return await self.embed_query(search_query)
+        return await self._weighted_vector(message, history)
+
+    async def _llm_query(self, message: str, history: List[dict]) -> str:
+        expansion_prompt = f"""[INST] Based on the following conversation, generate a short (3-5 words) search query to find relevant technical details in the candidate's CV.
+History:
+{history[-2:]}
+Latest: {message}
+Query: [/INST]"""
+        search_query = (await self.call_llm(expansion_prompt, max_tokens=20, stop=["\n"])).strip().strip('"')
+        print(f"DEBUG: Expanded Search Query: {search_query}", flush=True)
+        return search_query
+
+    async def _weighted_vector(self, message: str, history: List[dict]) -> List[float]:
+        question = next((m.get("content") for m in reversed(history) if m.get("role") == "assistant"), None)
+        if not question:
+            return await self.embed_query(message)
+        # Both land in the same micro-batch
+        answer_vec, question_vec = await asyncio.gather(self.embed_query(message), self.embed_query(question))
+        mixed = self.answer_weight * np.asarray(answer_vec) + (1 - self.answer_weight) * np.asarray(question_vec)
+        norm = np.linalg.norm(mixed)
+        return (mixed / norm if norm else mixed).tolist()
@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+# Load and warm up models in the background at startup instead of on the first request
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() in ("1", "true", "yes")
+
+PENDING, LOADING, READY, FAILED, LAZY = "pending", "loading", "ready", "failed", "lazy"
+
+
+class Readiness:
+    """Per-component load state and timings, shared by startup warm-up and
+    lazy loaders (which may run on worker threads)."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._components: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _component(self, name: str) -> dict:
+        if name not in self._components:
+            self._components[name] = {"status": PENDING, "error": None}
+        return self._components[name]
+
+    def register(self, name: str, status: str = PENDING):
+        with self._lock:
+            self._component(name)["status"] = status
+
+    @contextmanager
+    def phase(self, name: str, phase: str = "load"):
+        """Times a block as `<phase>_seconds`; the component is ready when it
+        exits cleanly and failed (with the error) when it raises."""
+        with self._lock:
+            component = self._component(name)
+            component["status"] = LOADING
+        start = self.clock()
+        try:
+            yield
+        except BaseException as e:
+            with self._lock:
+                component.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+                component[f"{phase}_seconds"] = round(self.clock() - start, 3)
+            raise
+        with self._lock:
+            component.update(status=READY, error=None)
+            component[f"{phase}_seconds"] = round(self.clock() - start, 3)
+
+    def status(self, name: str) -> Optional[str]:
+        with self._lock:
+            component = self._components.get(name)
+            return component["status"] if component else None
+
+    def usable(self, name: str) -> bool:
+        """Ready now, or deliberately left to load on first use."""
+        return self.status(name) in (READY, LAZY)
+
+    def all_usable(self, names: Iterable[str]) -> bool:
+        return all(self.usable(name) for name in names)
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: dict(component) for name, component in self._components.items()}
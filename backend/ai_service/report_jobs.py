@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Collection, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from report_store import REPORT_RETENTION_SECONDS, REPORTS_DIR
+
+# Next to the reports directory, so it does not depend on the working directory
+REPORT_JOBS_DB = os.getenv("REPORT_JOBS_DB",
+                           os.path.join(os.path.dirname(os.path.abspath(REPORTS_DIR)), "report_jobs.sqlite3"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_MAX = int(os.getenv("REPORT_QUEUE_MAX", "1000"))
+# Starts of one job before it is failed instead of resumed after a restart
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "3"))
+REPORT_CALLBACK_TIMEOUT = float(os.getenv("REPORT_CALLBACK_TIMEOUT", "10"))
+# Hosts a job's callback_url may point at (comma-separated); empty disables callbacks
+REPORT_CALLBACK_HOSTS = {h.strip().lower() for h in os.getenv("REPORT_CALLBACK_HOSTS", "").split(",") if h.strip()}
+# Finished jobs are kept as long as the reports they point to
+REPORT_JOB_RETENTION_SECONDS = int(os.getenv("REPORT_JOB_RETENTION_SECONDS", str(REPORT_RETENTION_SECONDS)))
+REPORT_JOB_PURGE_INTERVAL_SECONDS = 3600
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class InvalidCallback(ValueError):
+    pass
+
+
+def check_callback_url(url: str, allowed_hosts: Collection[str] = REPORT_CALLBACK_HOSTS) -> str:
+    """`url` if it is http(s) to an allow-listed host; the service would
+    otherwise POST job results to wherever a client asks."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise InvalidCallback(f"callback_url must be an http(s) URL, got {url!r}")
+    if parts.hostname.lower() not in allowed_hosts:
+        raise InvalidCallback(f"callback_url host {parts.hostname!r} is not in REPORT_CALLBACK_HOSTS")
+    return url
+
+
+class ReportJobStore:
+    """SQLite-backed job records so queued and running jobs survive a restart."""
+
+    def __init__(self, path: str = REPORT_JOBS_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS report_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    callback_url TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS report_jobs_status ON report_jobs (status)")
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, request: dict, callback_url: Optional[str]) -> dict:
+        job_id = str(uuid.uuid4())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO report_jobs (id, status, request, callback_url, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(request), callback_url, time.time()))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def mark_running(self, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE report_jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, time.time(), job_id))
+
+    def finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE report_jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED if error else SUCCEEDED, json.dumps(result) if result is not None else None,
+                 error, time.time(), job_id))
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM report_jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def purge(self, finished_before: float) -> int:
+        """Deletes succeeded and failed jobs that finished before `finished_before`."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM report_jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, finished_before)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ReportJobQueue:
+    """Bounded pool of asyncio workers running report jobs from a queue.
+
+    Jobs left queued or running by a previous process run again, up to
+    `max_attempts` starts in all. Finished jobs are purged
+    `retention_seconds` after they finish. SQLite calls run on worker
+    threads so they never block the event loop.
+    """
+
+    def __init__(self, run_job: Callable[[dict], Awaitable[dict]], db_path: str = REPORT_JOBS_DB,
+                 workers: int = REPORT_WORKERS, max_queued: int = REPORT_QUEUE_MAX,
+                 max_attempts: int = REPORT_JOB_MAX_ATTEMPTS,
+                 retention_seconds: int = REPORT_JOB_RETENTION_SECONDS,
+                 callback_hosts: Collection[str] = REPORT_CALLBACK_HOSTS):
+        self.run_job = run_job
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self.callback_hosts = callback_hosts
+        self._next_purge = 0.0
+        self.purged = 0
+        self.store: Optional[ReportJobStore] = None
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._started = False
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self._durations = deque(maxlen=500)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._start_lock, self._started = loop, asyncio.Lock(), False
+        async with self._start_lock:
+            if self._started:
+                return
+            if self.store is None:
+                self.store = await asyncio.to_thread(ReportJobStore, self.db_path)
+            await self.purge()
+            self._queue = asyncio.Queue()
+            # Anything queued or mid-flight when the process stopped runs again
+            for job in await asyncio.to_thread(self.store.unfinished):
+                self._queue.put_nowait(job["id"])
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._started = True
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._started = False
+
+    async def submit(self, request: dict, callback_url: Optional[str] = None) -> dict:
+        if callback_url is not None:
+            check_callback_url(callback_url, self.callback_hosts)
+        await self.start()
+        if self._queue.qsize() >= self.max_queued:
+            raise QueueFull(f"Report queue is full ({self.max_queued} jobs)")
+        job = await asyncio.to_thread(self.store.create, request, callback_url)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None or job["status"] not in (QUEUED, RUNNING):
+                continue
+            if job["attempts"] >= self.max_attempts:
+                # Started that often without finishing: it most likely takes the process down with it
+                print(f"Giving up on report job {job_id} after {job['attempts']} attempts", flush=True)
+                await asyncio.to_thread(self.store.finish, job_id, None,
+                                        f"Gave up after {job['attempts']} attempts that did not finish")
+                self.failed += 1
+            else:
+                await self._run(job)
+            if job["callback_url"]:
+                await self._notify(await asyncio.to_thread(self.store.get, job_id))
+            if time.time() >= self._next_purge:
+                await self.purge()
+
+    async def _run(self, job: dict):
+        job_id = job["id"]
+        await asyncio.to_thread(self.store.mark_running, job_id)
+        self.running += 1
+        start = time.perf_counter()
+        try:
+            result = await self.run_job(job["request"])
+            await asyncio.to_thread(self.store.finish, job_id, result)
+            self.succeeded += 1
+        except Exception as e:
+            print(f"Error in report job {job_id}: {e}", flush=True)
+            await asyncio.to_thread(self.store.finish, job_id, None, str(e))
+            self.failed += 1
+        finally:
+            self.running -= 1
+            self._durations.append(time.perf_counter() - start)
+
+    async def purge(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        self._next_purge = now + REPORT_JOB_PURGE_INTERVAL_SECONDS
+        if self.retention_seconds <= 0:
+            return 0
+        removed = await asyncio.to_thread(self.store.purge, now - self.retention_seconds)
+        self.purged += removed
+        return removed
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        await self.start()
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    @staticmethod
+    def public_view(job: dict) -> dict:
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "result": job["result"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+
+    async def _notify(self, job: dict):
+        try:
+            # Checked again: the job may predate the current allow-list
+            check_callback_url(job["callback_url"], self.callback_hosts)
+            async with httpx.AsyncClient(timeout=REPORT_CALLBACK_TIMEOUT) as client:
+                await client.post(job["callback_url"], json=self.public_view(job))
+        except Exception as e:
+            print(f"Report job callback to {job['callback_url']} failed: {e}", flush=True)
+
+    def stats(self) -> dict:
+        durations = sorted(self._durations)
+
+        def percentile(p):
+            return round(durations[min(len(durations) - 1, int(p * len(durations)))], 3) if durations else 0.0
+
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "purged": self.purged,
+            "duration_seconds": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(durations[-1], 3) if durations else 0.0,
+            },
+        }
@@ -0,0 +1,219 @@
+import abc
+import asyncio
+import os
+import time
+from typing import List, NamedTuple, Optional
+
+REPORT_STORE_BACKEND = os.getenv("REPORT_STORE_BACKEND", "local")
+REPORTS_DIR = os.getenv("REPORTS_DIR", "/home/chems/.gemini/tmp/reports")
+REPORT_S3_BUCKET = os.getenv("REPORT_S3_BUCKET", "intelliview-reports")
+REPORT_S3_PREFIX = os.getenv("REPORT_S3_PREFIX", "reports/")
+REPORT_S3_ENDPOINT_URL = os.getenv("REPORT_S3_ENDPOINT_URL")
+REPORT_RETENTION_SECONDS = int(os.getenv("REPORT_RETENTION_SECONDS", str(7 * 24 * 3600)))
+REPORT_STORE_MAX_BYTES = int(os.getenv("REPORT_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+REPORT_SWEEP_INTERVAL_SECONDS = float(os.getenv("REPORT_SWEEP_INTERVAL_SECONDS", "600"))
+
+
+class StoredReport(NamedTuple):
+    name: str
+    size: int
+    modified_at: float
+
+
+class ReportStore(abc.ABC):
+    """Where rendered report PDFs live. Subclasses provide put/get/delete/list;
+    retention (`sweep`) is shared."""
+
+    def __init__(self, retention_seconds: int = REPORT_RETENTION_SECONDS, max_bytes: int = REPORT_STORE_MAX_BYTES):
+        self.retention_seconds = retention_seconds
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def _check_name(name: str) -> str:
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Invalid report name: {name!r}")
+        return name
+
+    @abc.abstractmethod
+    def put(self, name: str, data: bytes):
+        ...
+
+    @abc.abstractmethod
+    def get(self, name: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, name: str) -> int:
+        """Removes a report, returning the bytes freed (0 if it was missing)."""
+
+    @abc.abstractmethod
+    def list(self) -> List[StoredReport]:
+        ...
+
+    def sweep(self, now: Optional[float] = None) -> dict:
+        """Drops reports older than the retention window, then the oldest ones
+        until the total size is back under `max_bytes`."""
+        now = time.time() if now is None else now
+        reports = sorted(self.list(), key=lambda r: r.modified_at)
+        total = sum(r.size for r in reports)
+        removed, reclaimed = 0, 0
+        for report in reports:
+            expired = self.retention_seconds > 0 and now - report.modified_at > self.retention_seconds
+            if not expired and total - reclaimed <= self.max_bytes:
+                break
+            reclaimed += self.delete(report.name)
+            removed += 1
+        return {"removed": removed, "reclaimed_bytes": reclaimed, "remaining_bytes": total - reclaimed}
+
+
+class LocalReportStore(ReportStore):
+    def __init__(self, directory: str = REPORTS_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, self._check_name(name))
+
+    def put(self, name: str, data: bytes):
+        path = self._path(name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        # Readers never see a half-written PDF
+        os.replace(tmp_path, path)
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, name: str) -> int:
+        path = self._path(name)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
+
+    def list(self) -> List[StoredReport]:
+        reports = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    reports.append(StoredReport(entry.name, stat.st_size, stat.st_mtime))
+        return reports
+
+
+class S3ReportStore(ReportStore):
+    """Reports in an S3-compatible bucket. `client` follows the boto3 S3 client
+    API (put_object, get_object, head_object, delete_object, list_objects_v2)."""
+
+    def __init__(self, client, bucket: str = REPORT_S3_BUCKET, prefix: str = REPORT_S3_PREFIX, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}{self._check_name(name)}"
+
+    def put(self, name: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=data, ContentType="application/pdf")
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))["Body"].read()
+        except Exception as e:
+            if type(e).__name__ == "NoSuchKey" or "NoSuchKey" in str(e):
+                return None
+            raise
+
+    def delete(self, name: str) -> int:
+        key = self._key(name)
+        try:
+            size = self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except Exception:
+            return 0
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return size
+
+    def list(self) -> List[StoredReport]:
+        reports, token = [], None
+        while True:
+            kwargs = {"Bucket": self.bucket, "Prefix": self.prefix}
+            if token:
+                kwargs["ContinuationToken"] = token
+            page = self.client.list_objects_v2(**kwargs)
+            for obj in page.get("Contents", []):
+                modified = obj["LastModified"]
+                reports.append(StoredReport(obj["Key"][len(self.prefix):], obj["Size"],
+                                            modified.timestamp() if hasattr(modified, "timestamp") else float(modified)))
+            if not page.get("IsTruncated"):
+                return reports
+            token = page.get("NextContinuationToken")
+
+
+def create_report_store(backend: str = REPORT_STORE_BACKEND) -> ReportStore:
+    if backend == "s3":
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("REPORT_STORE_BACKEND=s3 requires boto3 (pip install boto3)") from e
+        return S3ReportStore(boto3.client("s3", endpoint_url=REPORT_S3_ENDPOINT_URL))
+    if backend != "local":
+        raise ValueError(f"Unknown REPORT_STORE_BACKEND '{backend}', expected 'local' or 's3'")
+    return LocalReportStore()
+
+
+class ReportSweeper:
+    """Background task applying the store's retention every `interval` seconds."""
+
+    def __init__(self, store: ReportStore, interval: float = REPORT_SWEEP_INTERVAL_SECONDS):
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.removed = 0
+        self.reclaimed_bytes = 0
+        self.last_sweep: Optional[dict] = None
+
+    async def sweep_once(self) -> dict:
+        result = await asyncio.to_thread(self.store.sweep)
+        self.sweeps += 1
+        self.removed += result["removed"]
+        self.reclaimed_bytes += result["reclaimed_bytes"]
+        self.last_sweep = {**result, "at": time.time()}
+        if result["removed"]:
+            print(f"Report sweep removed {result['removed']} reports, reclaimed {result['reclaimed_bytes']} bytes", flush=True)
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                print(f"Error sweeping reports: {e}", flush=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "sweeps": self.sweeps,
+            "removed": self.removed,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "last_sweep": self.last_sweep,
+        }
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+from typing import Callable, Optional
+
+# How long a CV session's chunks are kept after its upload; 0 keeps them forever
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "900"))
+
+
+class SessionSweeper:
+    """Background task deleting CV chunks older than `ttl_seconds` every
+    `interval` seconds. `forget(cv_session_id)` is called for each session
+    whose points were removed, to drop what is held in memory for it."""
+
+    def __init__(self, vectors, forget: Optional[Callable[[str], None]] = None,
+                 ttl_seconds: int = SESSION_TTL_SECONDS, interval: float = SESSION_SWEEP_INTERVAL_SECONDS,
+                 batch_size: Optional[int] = None):
+        self.vectors = vectors
+        self.forget = forget
+        self.ttl_seconds = ttl_seconds
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.removed_points = 0
+        self.expired_sessions = 0
+        self.last_sweep: Optional[dict] = None
+
+    async def sweep_once(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        cutoff = now - self.ttl_seconds
+        # Batch size defaults to the store's QDRANT_DELETE_BATCH_SIZE
+        removed, session_ids = await (self.vectors.delete_expired(cutoff, self.batch_size) if self.batch_size
+                                      else self.vectors.delete_expired(cutoff))
+        if self.forget is not None:
+            for cv_session_id in session_ids:
+                self.forget(cv_session_id)
+        result = {"removed_points": removed, "expired_sessions": len(session_ids)}
+        self.sweeps += 1
+        self.removed_points += removed
+        self.expired_sessions += len(session_ids)
+        self.last_sweep = {**result, "at": time.time()}
+        if removed:
+            print(f"Session sweep removed {removed} points of {len(session_ids)} expired sessions", flush=True)
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                print(f"Error sweeping sessions: {e}", flush=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.interval > 0 and self.ttl_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "sweeps": self.sweeps,
+            "removed_points": self.removed_points,
+            "expired_sessions": self.expired_sessions,
+            "last_sweep": self.last_sweep,
+        }
@@ -0,0 +1,68 @@
+import json
+import re
+from typing import List, Optional
+
+CHAT_STOP_SEQUENCES = ["[INST]", "</s>", "Note:", "Interviewer:"]
+# Anything the cleanup below removes; a partial match at the end of the
+# stream must be held back until the next token decides it.
+_CLEANUP_MARKERS = ["(note:", "note:", "assistant:", "interviewer:"]
+
+
+def clean_response(text: str) -> str:
+    text = re.sub(r"\(?Note:.*", "", text, flags=re.IGNORECASE).strip()
+    # A "Note:" stop sequence leaves its opening parenthesis behind
+    text = text.rstrip("(").strip()
+    return text.replace("Assistant:", "").replace("Interviewer:", "").strip()
+
+
+def truncate_at_stop(text: str, stop: List[str]):
+    """Cut `text` at the earliest stop sequence. Returns (text, stopped)."""
+    cut = min((i for i in (text.find(s) for s in stop) if i != -1), default=-1)
+    if cut == -1:
+        return text, False
+    return text[:cut], True
+
+
+class StreamCleaner:
+    """Applies stop sequences and `clean_response` to a token stream.
+
+    `feed` returns the newly safe-to-send suffix of the cleaned text, holding
+    back trailing whitespace and any tail that could still grow into a stop
+    sequence or cleanup marker. The concatenated deltas are always a prefix
+    of `final()`.
+    """
+
+    def __init__(self, stop: Optional[List[str]] = None):
+        self.stop = stop if stop is not None else CHAT_STOP_SEQUENCES
+        self._held_markers = [m.lower() for m in self.stop] + _CLEANUP_MARKERS
+        self.raw = ""
+        self.emitted = ""
+        self.done = False
+
+    def _holdback(self, text: str) -> int:
+        lowered = text.lower()
+        for k in range(min(len(text), max(len(m) for m in self._held_markers)), 0, -1):
+            tail = lowered[-k:]
+            if any(m.startswith(tail) for m in self._held_markers):
+                return k
+        return 0
+
+    def feed(self, delta: str) -> str:
+        if self.done or not delta:
+            return ""
+        self.raw, self.done = truncate_at_stop(self.raw + delta, self.stop)
+        cleaned = clean_response(self.raw)
+        if not self.done:
+            cleaned = cleaned[:len(cleaned) - self._holdback(cleaned)].rstrip()
+        if not cleaned.startswith(self.emitted):
+            return ""
+        out = cleaned[len(self.emitted):]
+        self.emitted = cleaned
+        return out
+
+    def final(self) -> str:
+        return clean_response(self.raw)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
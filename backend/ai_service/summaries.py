@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+SUMMARY_STORE_MAX_ENTRIES = int(os.getenv("SUMMARY_STORE_MAX_ENTRIES", "10000"))
+
+
+class SummaryStore:
+    """Background CV summaries keyed by cv_session_id.
+
+    Each entry is pending -> ready | failed. The oldest entries are dropped
+    once the store holds more than `max_entries` sessions. Sessions found
+    to have no summary anywhere are remembered (`mark_missing`) until one
+    is started or set for them.
+    """
+
+    def __init__(self, max_entries: int = SUMMARY_STORE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._tasks = set()
+        # In-flight summary per content hash, shared by every session of that file
+        self._by_content: Dict[str, asyncio.Future] = {}
+        self._missing: "OrderedDict[str, None]" = OrderedDict()
+
+    def start(self, cv_session_id: str, summary: Awaitable[str]) -> dict:
+        entry = {"status": "pending", "cv_summary": None, "error": None,
+                 "started_at": time.time(), "finished_at": None}
+        self._missing.pop(cv_session_id, None)
+        self._entries[cv_session_id] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        task = asyncio.ensure_future(self._run(entry, summary))
+        # Hold a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return entry
+
+    def start_for_content(self, cv_session_id: str, content_hash: str,
+                          summarize: Callable[[], Awaitable[str]]) -> dict:
+        """Like `start`, but a file whose summary is already being generated
+        (e.g. a duplicate upload arriving meanwhile) waits for that one
+        instead of calling `summarize` again."""
+        task = self._by_content.get(content_hash)
+        if task is None:
+            task = asyncio.ensure_future(summarize())
+            self._by_content[content_hash] = task
+            task.add_done_callback(lambda done: self._by_content.pop(content_hash, None)
+                                   if self._by_content.get(content_hash) is done else None)
+        return self.start(cv_session_id, task)
+
+    async def _run(self, entry: dict, summary: Awaitable[str]):
+        try:
+            entry["cv_summary"] = await summary
+            entry["status"] = "ready"
+        except Exception as e:
+            print(f"Error generating CV summary: {e}", flush=True)
+            entry["error"] = str(e)
+            entry["status"] = "failed"
+        finally:
+            entry["finished_at"] = time.time()
+
+    def set(self, cv_session_id: str, cv_summary: str) -> dict:
+        now = time.time()
+        entry = {"status": "ready", "cv_summary": cv_summary, "error": None,
+                 "started_at": now, "finished_at": now}
+        self._missing.pop(cv_session_id, None)
+        self._entries[cv_session_id] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def delete(self, cv_session_id: str):
+        # A summary still running finishes into the dropped entry
+        self._entries.pop(cv_session_id, None)
+        self._missing.pop(cv_session_id, None)
+
+    def get(self, cv_session_id: str) -> Optional[dict]:
+        return self._entries.get(cv_session_id)
+
+    def mark_missing(self, cv_session_id: str):
+        self._missing[cv_session_id] = None
+        self._missing.move_to_end(cv_session_id)
+        while len(self._missing) > self.max_entries:
+            self._missing.popitem(last=False)
+
+    def is_missing(self, cv_session_id: str) -> bool:
+        return cv_session_id in self._missing
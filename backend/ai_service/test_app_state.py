@@ -0,0 +1,116 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app_state import AppState, lazy
+from llm_router import Routed
+
+
+class FakeEmbedder:
+    async def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+class FakeVectors:
+    def __init__(self, texts):
+        self.points = [SimpleNamespace(payload={"text": text, "chunk_index": i}, vector=[1.0, float(i)])
+                       for i, text in enumerate(texts)]
+        self.closed = False
+
+    async def scroll_session(self, cv_session_id, limit):
+        return list(self.points), None
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+
+    async def complete(self, call_type, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return Routed(self.reply, "fake")
+
+    async def call(self, prompt, **kwargs):
+        return (await self.complete(kwargs.get("call_type", "chat"), prompt)).value
+
+
+def test_importing_main_skips_heavy_clients():
+    code = ("import sys, main; heavy = ('sentence_transformers', 'qdrant_client', 'groq', 'llama_cpp', 'fitz'); "
+            "print(','.join(m for m in heavy if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+def test_lazy_resource_is_built_once_across_threads():
+    calls = []
+
+    class State(AppState):
+        @lazy
+        def slow(self):
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+
+    state = State()
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(state.slow)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len({id(value) for value in seen}) == 1
+
+def test_overrides_replace_resources_and_reject_unknown_names():
+    vectors = FakeVectors([])
+    state = AppState(vectors=vectors)
+    assert state.vectors is vectors
+    assert not state.created("embedder")
+    with pytest.raises(TypeError):
+        AppState(qdrant_client=object())
+
+def test_close_only_touches_created_resources():
+    vectors = FakeVectors([])
+    state = AppState(vectors=vectors)
+    asyncio.run(state.close())
+    assert vectors.closed
+    assert not state.created("execution")
+    assert not state.created("report_jobs")
+
+def test_chat_endpoint_runs_against_injected_state():
+    llm = FakeLLM("How did you size the connection pool?")
+    state = main.create_state(embedder=FakeEmbedder(), vectors=FakeVectors(["Built a FastAPI service"]), llm=llm)
+    previous, main.app.state.services = main.app.state.services, state
+    try:
+        response = TestClient(main.app).post("/v1/chat/generate", json={
+            "cv_session_id": "s1", "message": "INIT_INTERVIEW", "is_init": True})
+    finally:
+        main.app.state.services = previous
+    assert response.status_code == 200
+    assert response.json() == {"response": "How did you size the connection pool?", "seq": 1, "provider": "fake"}
+    assert "Built a FastAPI service" in llm.prompts[0]
+    assert state.transcript_store.get("s1").seq == 1
+
+def test_turn_instruction_reaches_the_prompt_but_not_the_transcript():
+    llm = FakeLLM("Thanks for your time, goodbye.")
+    state = main.create_state(embedder=FakeEmbedder(), vectors=FakeVectors(["Built a FastAPI service"]), llm=llm)
+    history = [{"role": "assistant", "content": "How did you size the pool?"}]
+    previous, main.app.state.services = main.app.state.services, state
+    try:
+        response = TestClient(main.app).post("/v1/chat/generate", json={
+            "cv_session_id": "s1", "message": "By load testing.", "history": history,
+            "instruction": "Conclude the interview and say goodbye."})
+    finally:
+        main.app.state.services = previous
+    assert response.status_code == 200
+    assert "CANDIDATE: By load testing. (Conclude the interview and say goodbye.)" in llm.prompts[0]
+    assert state.transcript_store.get("s1").messages[1] == {"role": "user", "content": "By load testing."}
@@ -0,0 +1,156 @@
+import asyncio
+import functools
+import io
+import os
+import zipfile
+
+from qdrant_client import AsyncQdrantClient
+
+from bulk_ingest import BulkIngestPipeline, discard, spool_bulk_uploads
+from executor import ExecutionLayer
+from test_ingest import FakeUpload, make_pdf
+from vector_store import VectorStore
+
+
+class NamedUpload(FakeUpload):
+    def __init__(self, filename: str, data: bytes):
+        super().__init__(data)
+        self.filename = filename
+
+
+@functools.lru_cache(maxsize=None)
+def cv(name: str) -> bytes:
+    # Cached: fpdf stamps the creation time, so a second render may differ
+    return make_pdf([[("Experience", f"{name} built data pipelines in Python for five years."),
+                      ("Skills", "Python, SQL, Airflow")]])
+
+
+def zipped(members: dict, compression: int = zipfile.ZIP_STORED) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_spool_bulk_uploads_unpacks_zips_and_reports_rejects(tmp_path):
+    files = [
+        NamedUpload("a.pdf", cv("Ada")),
+        NamedUpload("notes.txt", b"hello"),
+        NamedUpload("batch.zip", zipped({"b.pdf": cv("Bob"), "__MACOSX/._b.pdf": b"x", "big.pdf": b"x" * 100,
+                                         "readme.md": b"skip"})),
+        NamedUpload("broken.zip", b"not a zip"),
+    ]
+    items = asyncio.run(spool_bulk_uploads(files, max_bytes=50_000, directory=str(tmp_path)))
+    by_name = {item.filename: item for item in items}
+    assert sorted(by_name) == ["a.pdf", "b.pdf", "big.pdf", "broken.zip", "notes.txt"]
+    assert by_name["big.pdf"].path is not None and by_name["big.pdf"].error is None
+    assert by_name["notes.txt"].error and by_name["broken.zip"].error
+    assert len({item.cv_session_id for item in items}) == len(items)
+
+    discard(items)
+    assert os.listdir(tmp_path) == []
+
+
+def test_pipeline_batches_across_documents_and_isolates_failures(tmp_path):
+    uploads = [NamedUpload(f"cv{i}.pdf", cv(f"Candidate {i}")) for i in range(4)]
+    uploads.append(NamedUpload("copy.pdf", cv("Candidate 0")))
+    uploads.append(NamedUpload("bad.pdf", b"%PDF-1.4 garbage"))
+    embed_batches, upserts, ingested = [], [], []
+
+    async def embed(texts):
+        embed_batches.append(len(texts))
+        return [[1.0] + [0.0] * 383 for _ in texts]
+
+    async def run():
+        store = VectorStore(AsyncQdrantClient(location=":memory:"))
+        await store.ensure_collection()
+        original = store.upsert_points
+
+        async def upsert_points(points, wait=True):
+            upserts.append((len(points), wait))
+            await original(points, wait)
+
+        store.upsert_points = upsert_points
+        execution = ExecutionLayer(cpu_workers=2, embed_workers=1)
+        try:
+            items = await spool_bulk_uploads(uploads, directory=str(tmp_path))
+            pipeline = BulkIngestPipeline(execution, store, embed, on_ingested=lambda *args: ingested.append(args),
+                                          embed_batch_size=3, upsert_batch_size=2)
+            events = [event async for event in pipeline.run(items)]
+            discard(items)
+
+            # A second upload of a stored file only gains a session id
+            again = await spool_bulk_uploads([NamedUpload("again.pdf", cv("Candidate 1"))], directory=str(tmp_path))
+            again_events = [event async for event in BulkIngestPipeline(execution, store, embed).run(again)]
+            discard(again)
+            shared, _ = await store.scroll_session(again[0].cv_session_id, 100)
+            return events, again_events, shared
+        finally:
+            execution.shutdown()
+
+    events, again_events, shared = asyncio.run(run())
+    files = {e["filename"]: e for e in events if e["event"] == "file"}
+    assert files["bad.pdf"]["status"] == "failed" and files["bad.pdf"]["error"]
+    assert all(files[f"cv{i}.pdf"]["status"] == "ingested" for i in range(4))
+    assert files["copy.pdf"]["status"] == "deduplicated"
+    assert events[-1]["event"] == "done"
+    assert events[-1]["ingested"] == 4 and events[-1]["deduplicated"] == 1 and events[-1]["failed"] == 1
+    # Chunks of different CVs share embedding and upsert batches
+    assert embed_batches == [3, 1] and sum(embed_batches) == events[-1]["embedded_chunks"]
+    assert all(size <= 2 and wait is False for size, wait in upserts)
+    assert sum(size for size, _ in upserts) == events[-1]["upserted_points"]
+    # The in-upload copy is summarized together with its original
+    sessions = [ids for ids, *_ in ingested]
+    assert [files["cv0.pdf"]["cv_session_id"], files["copy.pdf"]["cv_session_id"]] in sessions
+
+    assert [e["status"] for e in again_events if e["event"] == "file"] == ["deduplicated"]
+    assert shared and all(p.payload["content_hash"] == shared[0].payload["content_hash"] for p in shared)
+
+
+def test_total_unpacked_size_is_capped(tmp_path):
+    # Compresses to almost nothing, as a zip bomb would
+    member = b"x" * 10_000
+    files = [NamedUpload("batch.zip", zipped({f"{i}.pdf": member for i in range(4)}, zipfile.ZIP_DEFLATED)),
+             NamedUpload("late.pdf", member)]
+    items = asyncio.run(spool_bulk_uploads(files, max_bytes=50_000, max_total_bytes=25_000, directory=str(tmp_path)))
+    assert [item.error is None for item in items] == [True, True, False, False, False]
+    assert all("more than 25000 bytes" in item.error for item in items[2:])
+    discard(items)
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_upsert_removes_points_stored_by_earlier_batches(tmp_path):
+    uploads = [NamedUpload("long.pdf", make_pdf([[("Experience", f"Paragraph {i} " + "word " * 200)
+                                                  for i in range(6)]]))]
+
+    async def embed(texts):
+        return [[1.0] + [0.0] * 383 for _ in texts]
+
+    async def run():
+        store = VectorStore(AsyncQdrantClient(location=":memory:"))
+        await store.ensure_collection()
+        original, calls = store.upsert_points, []
+
+        async def upsert_points(points, wait=True):
+            calls.append(len(points))
+            if len(calls) == 2:
+                raise RuntimeError("qdrant went away")
+            await original(points, wait)
+
+        store.upsert_points = upsert_points
+        execution = ExecutionLayer(cpu_workers=1, embed_workers=1)
+        try:
+            items = await spool_bulk_uploads(uploads, directory=str(tmp_path))
+            events = [e async for e in BulkIngestPipeline(execution, store, embed, upsert_batch_size=1).run(items)]
+            discard(items)
+            left = await store.find_contents([items[0].content_hash])
+            return events, calls, left
+        finally:
+            execution.shutdown()
+
+    events, calls, left = asyncio.run(run())
+    assert [e["status"] for e in events if e["event"] == "file"] == ["failed"]
+    # The first batch was stored, the rest of the file was not sent after the failure
+    assert calls == [1, 1]
+    assert left == {}
@@ -0,0 +1,54 @@
+from chunk_cache import SessionChunkCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_search_returns_top_k_by_cosine():
+    cache = SessionChunkCache()
+    cache.put("s1", [[1, 0, 0], [0, 1, 0], [0.7, 0.7, 0]], ["python", "docker", "both"])
+    assert cache.search("s1", [1, 0.1, 0], limit=2) == ["python", "both"]
+    assert cache.stats()["hits"] == 1
+
+def test_miss_is_counted():
+    cache = SessionChunkCache()
+    assert cache.search("unknown", [1, 0], limit=5) is None
+    assert cache.stats()["misses"] == 1
+
+def test_limit_larger_than_session():
+    cache = SessionChunkCache()
+    cache.put("s1", [[1, 0], [0, 1]], ["a", "b"])
+    assert cache.search("s1", [0, 1], limit=5) == ["b", "a"]
+
+def test_evicts_least_recently_used_when_over_budget():
+    cache = SessionChunkCache(max_bytes=70)
+    cache.put("s1", [[1.0] * 8], ["a"])   # 32 + 1 bytes
+    cache.put("s2", [[1.0] * 8], ["b"])
+    cache.search("s1", [1.0] * 8)
+    cache.put("s3", [[1.0] * 8], ["c"])
+    assert cache.search("s2", [1.0] * 8) is None
+    assert cache.search("s1", [1.0] * 8) == ["a"]
+    assert cache.stats()["bytes"] <= 70
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = SessionChunkCache(ttl_seconds=10, clock=clock)
+    cache.put("s1", [[1, 0]], ["a"])
+    clock.now = 5
+    assert cache.search("s1", [1, 0]) == ["a"]
+    clock.now = 14
+    assert cache.search("s1", [1, 0]) == ["a"]
+    clock.now = 30
+    assert cache.search("s1", [1, 0]) is None
+
+def test_search_within_section():
+    cache = SessionChunkCache()
+    cache.put("s1", [[1, 0], [0.9, 0.1], [0, 1]], ["python", "pytest", "degree"], ["skills", "projects", "education"])
+    assert cache.search("s1", [1, 0], limit=2, section="education") == ["degree"]
+    assert cache.search("s1", [1, 0], limit=2, section="awards") == []
+    assert cache.search("s1", [1, 0], limit=2) == ["python", "pytest"]
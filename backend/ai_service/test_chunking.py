@@ -0,0 +1,54 @@
+from chunking import HEADER_SECTION, chunk_lines, heading_section, pack_section
+from prompt_builder import TokenCounter
+
+
+def line(text, block, size=11.0, bold=False):
+    return {"text": text, "size": size, "bold": bold, "block": (0, block), "page": 0}
+
+
+# One token per word (plus spaces), so budgets are easy to reason about
+counter = TokenCounter(tokenize=lambda text: text.split())
+
+
+def test_headings_need_a_known_phrase():
+    assert heading_section(line("EXPERIENCE", 0), 11.0) == "experience"
+    assert heading_section(line("Technical Skills:", 0), 11.0) == "skills"
+    # Styled lines may carry extra words around the phrase
+    assert heading_section(line("Work Experience & Internships", 0, bold=True), 11.0) == "experience"
+    assert heading_section(line("Work Experience & Internships", 0), 11.0) is None
+    # A bold job title is not a section
+    assert heading_section(line("Senior Engineer at CloudTech", 0, bold=True), 11.0) is None
+    assert heading_section(line("Experience building scalable microservices with Python", 0), 11.0) is None
+
+def test_fragments_are_merged_within_sections():
+    lines = [
+        line("Jane Doe", 0, size=16, bold=True),
+        line("Experience", 1, size=12, bold=True),
+        line("Backend engineer at Acme building payment APIs", 2),
+        line("and AWS.", 3),
+        line("3", 4),
+        line("Skills", 5, size=12, bold=True),
+        line("Python, FastAPI, PostgreSQL", 6),
+    ]
+    chunks = chunk_lines(lines, counter, max_tokens=50, min_tokens=5, overlap=2)
+    assert [(c.section, c.text) for c in chunks] == [
+        (HEADER_SECTION, "Jane Doe"),
+        ("experience", "Backend engineer at Acme building payment APIs\nand AWS."),
+        ("skills", "Python, FastAPI, PostgreSQL"),
+    ]
+
+def test_oversize_blocks_split_with_overlap():
+    words = [f"w{i}" for i in range(25)]
+    chunks = pack_section([" ".join(words)], counter, max_tokens=10, min_tokens=3, overlap=2)
+    assert all(len(c.split()) <= 10 for c in chunks)
+    assert chunks[0].split()[-2:] == chunks[1].split()[:2]
+    covered = []
+    for chunk in chunks:
+        covered.extend(w for w in chunk.split() if w not in covered)
+    assert covered == words
+
+def test_small_tail_joins_previous_chunk():
+    chunks = pack_section(["a b c d e f g h", "i j k l m n o", "p"], counter, max_tokens=8, min_tokens=3, overlap=1)
+    assert chunks == ["a b c d e f g h", "i j k l m n o\np"]
+    chunks = pack_section(["a b c d e f g h", "i"], counter, max_tokens=8, min_tokens=3, overlap=1)
+    assert chunks == ["a b c d e f g h\ni"]
@@ -0,0 +1,99 @@
+import asyncio
+import numpy as np
+from embeddings import EmbeddingCache, EmbeddingService
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0] for t in texts])
+
+
+def test_encode_batch_single_call():
+    model = FakeModel()
+    service = EmbeddingService(model)
+    vectors = service.encode_batch(["a", "bb", "ccc"])
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert len(model.calls) == 1
+    assert service.stats()["ingest"]["items"] == 3
+
+def test_encode_batch_empty():
+    model = FakeModel()
+    service = EmbeddingService(model)
+    assert service.encode_batch([]) == []
+    assert model.calls == []
+
+def test_encode_batch_reuses_cached_chunks():
+    model = FakeModel()
+    service = EmbeddingService(model)
+    service.encode_batch(["python", "docker"])
+    vectors = service.encode_batch(["docker", "kubernetes", "python"])
+    assert vectors == [[6.0, 1.0], [10.0, 1.0], [6.0, 1.0]]
+    assert model.calls == [["python", "docker"], ["kubernetes"]]
+    assert service.stats()["chunk_cache"]["hits"] == 2
+
+def test_embed_query_micro_batches_concurrent_calls():
+    model = FakeModel()
+    service = EmbeddingService(model, max_batch_size=8, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*[service.embed_query("x" * i) for i in range(1, 6)])
+
+    vectors = asyncio.run(run())
+    assert [v[0] for v in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert len(model.calls) == 1
+    assert service.stats()["query"]["max_batch_size"] == 5
+
+def test_embed_query_respects_max_batch_size():
+    model = FakeModel()
+    service = EmbeddingService(model, max_batch_size=2, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*[service.embed_query(f"q{i}") for i in range(5)])
+
+    asyncio.run(run())
+    assert all(len(call) <= 2 for call in model.calls)
+    assert service.stats()["query"]["items"] == 5
+
+def test_embed_query_served_from_cache():
+    model = FakeModel()
+    service = EmbeddingService(model)
+
+    async def run():
+        first = await service.embed_query("Python  FastAPI experience")
+        second = await service.embed_query("python fastapi experience ")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(model.calls) == 1
+    assert service.stats()["query_cache"]["hits"] == 1
+
+def test_identical_concurrent_queries_encoded_once():
+    model = FakeModel()
+    service = EmbeddingService(model, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*[service.embed_query("Docker Kubernetes") for _ in range(4)])
+
+    vectors = asyncio.run(run())
+    assert all(v == vectors[0] for v in vectors)
+    assert model.calls == [["Docker Kubernetes"]]
+
+def test_cache_key_includes_model_name():
+    assert EmbeddingCache("a", 10).key("x") != EmbeddingCache("b", 10).key("x")
+
+def test_cache_ttl_and_size_eviction():
+    now = [0.0]
+    cache = EmbeddingCache("m", max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.put("c", [3.0])
+    assert cache.get("a") is None
+    assert cache.get("c") == [3.0]
+    now[0] = 11
+    assert cache.get("c") is None
+    assert cache.stats()["evictions"] == 2
@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from evaluation import (EVALUATION_SCHEMA, EvaluationTruncated, evaluation_truncated, grammar_schema, max_json_chars,
+                        parse_evaluation, schema_max_tokens)
+from llm_router import Routed
+
+VALID = {
+    "auditor_notes": "Explained pool sizing with numbers.",
+    "technical_score": 8,
+    "communication_score": 7,
+    "problem_solving_score": 8,
+    "experience_match_score": 9,
+    "strengths": ["Used pg_stat_statements [\"we profiled with pg_stat_statements\"]"],
+    "weaknesses": [],
+    "proven_skills": ["PostgreSQL - High"],
+    "summary": "HIRE: strong database depth.",
+}
+
+
+def test_schema_output_parses_directly():
+    assert parse_evaluation(json.dumps(VALID)) == VALID
+
+def test_scores_are_clamped():
+    evaluation = parse_evaluation(json.dumps({**VALID, "technical_score": 14}))
+    assert evaluation["technical_score"] == 10
+
+def test_unconstrained_output_falls_back_to_defaults():
+    evaluation = parse_evaluation('Sure! {"technical_score": 6} Hope this helps')
+    assert evaluation["technical_score"] == 6
+    assert evaluation["proven_skills"] == ["None detected"]
+    assert parse_evaluation("no json here")["technical_score"] == 1
+
+def test_max_tokens_covers_largest_valid_document():
+    props = EVALUATION_SCHEMA["properties"]
+    largest = {}
+    for name, prop in props.items():
+        if prop["type"] == "integer":
+            largest[name] = prop["maximum"]
+        elif prop["type"] == "string":
+            largest[name] = "x" * prop["maxLength"]
+        else:
+            largest[name] = ["x" * prop["items"]["maxLength"]] * prop["maxItems"]
+    assert len(json.dumps(largest, separators=(",", ":"))) <= max_json_chars(EVALUATION_SCHEMA)
+    assert schema_max_tokens() < 2048
+
+def test_overlong_fields_are_clipped_not_rejected():
+    evaluation = parse_evaluation(json.dumps({**VALID, "summary": "y" * 5000, "strengths": ["z" * 500] * 9}))
+    assert len(evaluation["summary"]) <= EVALUATION_SCHEMA["properties"]["summary"]["maxLength"]
+    assert len(evaluation["strengths"]) == EVALUATION_SCHEMA["properties"]["strengths"]["maxItems"]
+
+
+class ScriptedLLM:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.budgets = []
+
+    async def complete(self, call_type, prompt, max_tokens=None, **kwargs):
+        self.budgets.append(max_tokens)
+        return Routed(self.replies.pop(0), "fake")
+
+
+def test_truncation_is_told_apart_from_ignored_format():
+    cut = json.dumps(VALID)[:-40]
+    assert evaluation_truncated(cut)
+    assert evaluation_truncated('{"auditor_notes": "ends on an escaped quote \\"')
+    assert not evaluation_truncated(json.dumps(VALID))
+    assert not evaluation_truncated('Sure! {"technical_score": 6} Hope this helps')
+    assert not evaluation_truncated("no json here")
+
+def test_grammar_keeps_item_and_score_bounds():
+    props = grammar_schema(EVALUATION_SCHEMA)["properties"]
+    assert props["strengths"]["maxItems"] == EVALUATION_SCHEMA["properties"]["strengths"]["maxItems"]
+    assert props["technical_score"]["maximum"] == 10
+    assert "maxLength" not in props["summary"]
+
+def test_truncated_evaluation_is_retried_with_a_larger_budget():
+    llm = ScriptedLLM([json.dumps(VALID)[:-40], json.dumps(VALID)])
+    completion = asyncio.run(main.complete_evaluation(main.create_state(llm=llm), "prompt"))
+    assert parse_evaluation(completion.value) == VALID
+    assert llm.budgets[0] == main.EVALUATION_MAX_TOKENS and llm.budgets[1] > llm.budgets[0]
+
+def test_evaluation_still_truncated_after_retry_is_an_error():
+    llm = ScriptedLLM([json.dumps(VALID)[:-40]] * 2)
+    with pytest.raises(EvaluationTruncated):
+        asyncio.run(main.complete_evaluation(main.create_state(llm=llm), "prompt"))
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from executor import ExecutionLayer
+
+
+class Concurrency:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.threads = set()
+
+    def __call__(self, seconds: float = 0.05):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(seconds)
+        with self.lock:
+            self.running -= 1
+
+
+def test_pools_are_bounded_by_their_worker_counts():
+    cpu, embed, llm = Concurrency(), Concurrency(), Concurrency()
+
+    async def run(execution):
+        await asyncio.gather(*[execution.run_cpu(cpu) for _ in range(6)],
+                             *[execution.run_embed(embed) for _ in range(6)],
+                             *[execution.run_llm(llm, seconds=0.01) for _ in range(3)])
+
+    execution = ExecutionLayer(cpu_kind="thread", cpu_workers=3, embed_workers=2)
+    try:
+        asyncio.run(run(execution))
+    finally:
+        execution.shutdown()
+    assert (cpu.peak, embed.peak, llm.peak) == (3, 2, 1)
+    assert all(name.startswith("cpu") for name in cpu.threads)
+    assert all(name.startswith("embed") for name in embed.threads)
+    assert all(name.startswith("llm") for name in llm.threads)
+
+
+def test_process_kind_runs_cpu_work_in_other_processes():
+    execution = ExecutionLayer(cpu_kind="process", cpu_workers=2, embed_workers=1)
+
+    async def run():
+        return (await execution.run_cpu(os.getpid), await execution.run_cpu(pow, 2, exp=10),
+                await execution.run_embed(os.getpid))
+
+    try:
+        cpu_pid, power, embed_pid = asyncio.run(run())
+    finally:
+        execution.shutdown()
+    assert cpu_pid != os.getpid() and power == 1024
+    # Only the cpu pool leaves the process
+    assert embed_pid == os.getpid()
+
+
+def test_shutdown_finishes_running_work_and_drops_queued_work():
+    execution = ExecutionLayer(cpu_kind="thread", cpu_workers=1, embed_workers=1)
+    started, done = threading.Event(), []
+
+    def slow(n):
+        started.set()
+        time.sleep(0.05)
+        done.append(n)
+
+    running = execution.cpu_pool.submit(slow, 1)
+    queued = execution.cpu_pool.submit(slow, 2)
+    started.wait(1)
+    execution.shutdown(wait=True)
+    assert running.done() and done == [1]
+    assert queued.cancelled()
+    with pytest.raises(RuntimeError):
+        asyncio.run(execution.run_cpu(slow, 3))
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fpdf import FPDF
+
+from chunking import chunk_lines
+from documents import extract_pdf_lines
+from executor import ExecutionLayer
+from ingest import UploadRejected, extract_document, page_ranges, spool_upload
+
+
+class FakeUpload:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.reads = 0
+
+    async def read(self, n: int) -> bytes:
+        chunk, self.data = self.data[:n], self.data[n:]
+        self.reads += 1
+        return chunk
+
+
+def make_pdf(pages):
+    pdf = FPDF()
+    for page in pages:
+        pdf.add_page()
+        for heading, body in page:
+            pdf.set_font("Helvetica", "B", 14)
+            pdf.cell(0, 10, heading, new_x="LMARGIN", new_y="NEXT")
+            pdf.set_font("Helvetica", "", 11)
+            pdf.multi_cell(0, 8, body)
+    return bytes(pdf.output())
+
+
+def test_spool_upload_hashes_and_enforces_limit(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    upload = asyncio.run(spool_upload(FakeUpload(data), max_bytes=len(data), directory=str(tmp_path)))
+    assert upload.size == len(data)
+    assert upload.content_hash == hashlib.sha256(data).hexdigest()
+    with open(upload.path, "rb") as f:
+        assert f.read() == data
+
+    os.unlink(upload.path)
+    with pytest.raises(UploadRejected):
+        asyncio.run(spool_upload(FakeUpload(data), max_bytes=len(data) - 1, directory=str(tmp_path)))
+    assert os.listdir(tmp_path) == []
+
+def test_page_ranges():
+    assert page_ranges(0, 4) == []
+    assert page_ranges(9, 4) == [(0, 4), (4, 8), (8, 9)]
+
+def test_extract_document_pipelines_page_ranges(tmp_path):
+    pages = [[("Experience", f"Role {i}: built services in Python and Go for team {i}.")] for i in range(5)]
+    pages[3] = [("Skills", "Python, Go, PostgreSQL, Kafka")]
+    pages[4] = [("Education", "BSc Computer Science")]
+    path = tmp_path / "cv.pdf"
+    path.write_bytes(make_pdf(pages))
+    batches = []
+
+    async def embed(texts):
+        batches.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    async def run():
+        execution = ExecutionLayer(cpu_workers=2, embed_workers=1)
+        try:
+            return await extract_document(execution, str(path), embed=embed, pages_per_task=2)
+        finally:
+            execution.shutdown()
+
+    document = asyncio.run(run())
+    expected = chunk_lines(extract_pdf_lines(str(path)))
+    assert document.chunks == expected
+    assert [c.section for c in document.chunks] == ["experience", "skills", "education"]
+    assert document.vectors == [[float(len(c.text))] for c in expected]
+    assert document.pages == 5
+    # Each section went to embedding as soon as the range holding the next heading arrived
+    assert batches == [[c.text] for c in expected]
+    assert "BSc Computer Science" in document.text
+
+def test_extract_document_rejects_long_pdfs(tmp_path):
+    path = tmp_path / "long.pdf"
+    path.write_bytes(make_pdf([[("Projects", "x")]] * 3))
+
+    async def run():
+        execution = ExecutionLayer(cpu_workers=1, embed_workers=1)
+        try:
+            await extract_document(execution, str(path), max_pages=2)
+        finally:
+            execution.shutdown()
+
+    with pytest.raises(UploadRejected):
+        asyncio.run(run())
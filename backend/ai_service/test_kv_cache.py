@@ -0,0 +1,89 @@
+import os
+from types import SimpleNamespace
+
+from kv_cache import SessionStateCache
+from llm_service import LLMService
+
+
+def state(size):
+    return SimpleNamespace(llama_state_size=size)
+
+def test_get_returns_stored_state():
+    cache = SessionStateCache(max_bytes=100)
+    s1 = state(10)
+    cache.put("s1", s1)
+    assert cache.get("s1") is s1
+    assert cache.get("s2") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_lru_eviction_by_bytes():
+    cache = SessionStateCache(max_bytes=100)
+    cache.put("s1", state(40))
+    cache.put("s2", state(40))
+    cache.get("s1")
+    cache.put("s3", state(40))
+    assert cache.get("s2") is None
+    assert cache.get("s1") is not None
+    assert cache.stats()["bytes"] == 80
+
+def test_replacing_a_session_updates_size():
+    cache = SessionStateCache(max_bytes=100)
+    cache.put("s1", state(40))
+    cache.put("s1", state(60))
+    assert cache.stats()["bytes"] == 60
+
+def test_oversized_state_not_stored():
+    cache = SessionStateCache(max_bytes=100)
+    cache.put("s1", state(500))
+    assert cache.get("s1") is None
+    assert cache.stats()["bytes"] == 0
+
+
+class FakeLlama:
+    """Records what is evaluated; a saved state remembers the text it holds."""
+
+    def __init__(self):
+        self.text = ""
+        self.evaluated = []
+        self.loaded = []
+
+    def __call__(self, prompt, max_tokens=16, **kwargs):
+        # Like llama_cpp, only the part after the longest common prefix is evaluated
+        shared = len(os.path.commonprefix([self.text, prompt]))
+        self.evaluated.append(prompt[shared:])
+        self.text = prompt + " reply"
+        return {"choices": [{"text": " reply"}]}
+
+    def save_state(self):
+        return SimpleNamespace(llama_state_size=10, text=self.text)
+
+    def load_state(self, state):
+        self.loaded.append(state.text)
+        self.text = state.text
+
+
+def test_stable_prefix_is_reused_after_history_is_folded():
+    model = FakeLlama()
+    service = LLMService(None, None, None, SessionStateCache(), None, None)
+    service.get_llm = lambda provider: model
+
+    def turn(prefix, tail):
+        # Another session's call in between leaves unrelated tokens in the model
+        model.text = "[INST] other session"
+        service._local_completion(prefix + tail, 16, None, session_id="s1", prefix=prefix)
+        return model.evaluated[-1]
+
+    system = "[INST] Interviewer rules. CV: data engineer. NOTES: "
+    turn(system + "none", " [/INST] q1 [INST] context 1\nCANDIDATE: a1 [/INST]")
+    assert sum("Interviewer rules" in text for text in model.evaluated) == 1
+    # History folded: the notes at the end of the system prompt changed
+    folded = system + "knows Kafka"
+    turn(folded, " [/INST] q2 </s> [INST] context 2\nCANDIDATE: a2 [/INST]")
+    # The previous tail is re-rendered with the reply; only the new tail is evaluated
+    turn(folded, " [/INST] q2 </s> [INST] a2 [/INST] q3 </s> [INST] context 3\nCANDIDATE: a3 [/INST]")
+    assert sum("Interviewer rules" in text for text in model.evaluated) == 1
+    assert sum("knows Kafka" in text for text in model.evaluated) == 1
+    cache = service.llama_states
+    assert cache.get(cache.prefix_key("s1")).prompt == folded
+    cache.evict("s1")
+    assert cache.stats()["states"] == 0
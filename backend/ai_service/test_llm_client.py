@@ -0,0 +1,161 @@
+import asyncio
+
+import httpx
+import pytest
+
+from llm_client import (CircuitBreaker, LLMBadRequest, LLMCircuitOpen, LLMClientLayer, LLMRateLimited, LLMTimeout,
+                        retry_after_of)
+
+
+class StatusError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = httpx.Response(status, headers=headers or {})
+
+
+def make_layer(**kwargs):
+    sleeps = []
+
+    async def sleep(delay):
+        sleeps.append(delay)
+
+    return LLMClientLayer(base_delay=0.01, sleep=sleep, **kwargs), sleeps
+
+
+def flaky(*errors, result="ok"):
+    remaining = list(errors)
+
+    async def request():
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    return request
+
+
+def test_retries_transient_errors_then_succeeds():
+    layer, sleeps = make_layer(max_retries=3)
+    result = asyncio.run(layer.call("groq", "m", flaky(StatusError(503), StatusError(502))))
+    assert result == "ok"
+    assert len(sleeps) == 2
+    assert layer.stats()["retries"] == 2
+
+def test_retry_after_is_respected():
+    layer, sleeps = make_layer(max_retries=1)
+    asyncio.run(layer.call("groq", "m", flaky(StatusError(429, {"Retry-After": "2"}))))
+    assert sleeps == [2.0]
+
+def test_rate_limit_surfaces_typed_error_after_retries():
+    layer, _ = make_layer(max_retries=1)
+    with pytest.raises(LLMRateLimited) as info:
+        asyncio.run(layer.call("groq", "m", flaky(StatusError(429, {"Retry-After": "1"}), StatusError(429))))
+    assert info.value.status_code == 503
+
+def test_bad_request_is_not_retried():
+    layer, sleeps = make_layer()
+    with pytest.raises(LLMBadRequest):
+        asyncio.run(layer.call("groq", "m", flaky(StatusError(400))))
+    assert sleeps == []
+    assert layer.breaker("groq", "m").state == "closed"
+
+def test_timeout_maps_to_504():
+    layer, _ = make_layer(max_retries=0)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(LLMTimeout) as info:
+        asyncio.run(layer.call("local", "m", slow, timeout=0.01))
+    assert info.value.status_code == 504
+
+def test_breaker_opens_and_half_opens():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 11
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_open_breaker_fails_fast_per_model():
+    layer, _ = make_layer(max_retries=0, breaker_factory=lambda: CircuitBreaker(failure_threshold=1))
+    with pytest.raises(Exception):
+        asyncio.run(layer.call("groq", "a", flaky(StatusError(500))))
+    calls = []
+
+    async def request():
+        calls.append(1)
+        return "ok"
+
+    with pytest.raises(LLMCircuitOpen):
+        asyncio.run(layer.call("groq", "a", request))
+    assert calls == []
+    assert asyncio.run(layer.call("groq", "b", request)) == "ok"
+
+def test_retry_after_http_date():
+    exc = StatusError(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:10 GMT"})
+    assert retry_after_of(exc, now=1445412480.0) == 10.0
+
+def half_open_layer(model="m"):
+    now = [0.0]
+    layer, _ = make_layer(max_retries=0, breaker_factory=lambda: CircuitBreaker(
+        failure_threshold=1, reset_seconds=10, clock=lambda: now[0]))
+    with pytest.raises(Exception):
+        asyncio.run(layer.call("local", model, flaky(StatusError(500))))
+    now[0] = 11
+    return layer
+
+def test_cancelled_half_open_trial_frees_the_breaker():
+    layer = half_open_layer()
+
+    async def run():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.create_task(layer.call("local", "m", hang))
+        await started.wait()
+        assert layer.breaker("local", "m").trial_in_flight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The next call becomes the trial instead of failing fast forever
+        return await layer.call("local", "m", flaky())
+
+    assert asyncio.run(run()) == "ok"
+    assert layer.breaker("local", "m").state == "closed"
+
+def test_abandoned_local_stream_frees_the_half_open_trial():
+    from executor import ExecutionLayer
+    from kv_cache import SessionStateCache
+    from llm_router import LLMRouter, parse_routes
+    from llm_service import LOCAL_MODEL_FILE, LLMService
+    from prompt_builder import TokenCounter
+    from readiness import Readiness
+
+    layer = half_open_layer(LOCAL_MODEL_FILE)
+    breaker = layer.breaker("local", LOCAL_MODEL_FILE)
+    execution = ExecutionLayer(cpu_workers=1, embed_workers=1)
+    service = LLMService(execution, layer, LLMRouter(parse_routes("", "local")), SessionStateCache(),
+                         TokenCounter(), Readiness())
+    service.local = lambda prompt, **kwargs: iter([{"choices": [{"text": "Hello"}]}] * 50)
+
+    async def run():
+        tokens = service._provider_stream("local", "prompt", 50, None, None)
+        assert await tokens.__anext__() == "Hello"
+        assert breaker.trial_in_flight
+        # The client disconnected after the first token
+        await tokens.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        execution.shutdown()
+    assert not breaker.trial_in_flight
+    assert breaker.allow()
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from llm_client import LLMTimeout, LLMUnavailable
+from llm_router import LLMRouter, parse_routes, parse_slos
+
+
+def test_parse_routes_defaults_and_overrides():
+    routes = parse_routes("summary=local, groq;expansion=local", "groq", "local")
+    assert routes["chat"] == ["groq", "local"]
+    assert routes["summary"] == ["local", "groq"]
+    assert routes["expansion"] == ["local"]
+    assert parse_routes("", "local")["evaluation"] == ["local"]
+    with pytest.raises(ValueError):
+        parse_routes("chat=openai", "groq")
+
+def test_fails_over_and_reports_provider():
+    router = LLMRouter(parse_routes("", "groq", "local"))
+
+    async def attempt(provider):
+        if provider == "groq":
+            raise LLMUnavailable("down", provider)
+        return "hello"
+
+    routed = asyncio.run(router.run("chat", attempt))
+    assert routed == ("hello", "local")
+    assert router.stats()["failovers"] == 1
+    assert router.stats()["providers"]["chat/groq"]["failures"] == 1
+
+def test_all_providers_failing_raises_last_error():
+    router = LLMRouter(parse_routes("", "groq", "local"))
+
+    async def attempt(provider):
+        raise LLMTimeout(provider, provider)
+
+    with pytest.raises(LLMTimeout) as info:
+        asyncio.run(router.run("summary", attempt))
+    assert str(info.value) == "local"
+
+def test_unavailable_provider_goes_last():
+    router = LLMRouter(parse_routes("", "groq", "local"), is_available=lambda p: p != "groq")
+    assert router.order("chat") == ["local", "groq"]
+
+def test_slow_provider_yields_within_slo():
+    now = [0.0]
+    router = LLMRouter(parse_routes("", "groq", "local"), parse_slos("chat=1000"), clock=lambda: now[0])
+
+    async def attempt(provider):
+        now[0] += 3.0 if provider == "groq" else 0.2
+        return provider
+
+    assert asyncio.run(router.run("chat", attempt)).provider == "groq"
+    assert router.order("chat") == ["local", "groq"]
+    assert asyncio.run(router.run("chat", attempt)).provider == "local"
+    # Stream latency is tracked separately and does not affect plain calls
+    assert router.order("chat", "chat_stream") == ["groq", "local"]
+
+def test_demoted_provider_is_probed_once_its_stats_go_stale():
+    now = [0.0]
+    slow = {"groq": True}
+    router = LLMRouter(parse_routes("", "groq", "local"), parse_slos("chat=1000"), stats_ttl_s=60,
+                       clock=lambda: now[0])
+
+    async def attempt(provider):
+        now[0] += 3.0 if provider == "groq" and slow["groq"] else 0.2
+        return provider
+
+    asyncio.run(router.run("chat", attempt))
+    for _ in range(5):
+        assert asyncio.run(router.run("chat", attempt)).provider == "local"
+    slow["groq"] = False
+    now[0] += 61
+    # The probe replaces the old average instead of nudging it
+    assert asyncio.run(router.run("chat", attempt)).provider == "groq"
+    assert router.order("chat") == ["groq", "local"]
+    assert router.stats()["providers"]["chat/groq"]["ewma_latency_ms"] == pytest.approx(200)
+
+def test_error_prone_provider_yields_until_it_recovers():
+    now = [0.0]
+    router = LLMRouter(parse_routes("", "groq", "local"), max_error_rate=0.5, stats_ttl_s=60, clock=lambda: now[0])
+    failing = {"groq": True}
+
+    async def attempt(provider):
+        if provider == "groq" and failing["groq"]:
+            raise LLMUnavailable("flaky", provider)
+        return provider
+
+    for _ in range(4):
+        asyncio.run(router.run("chat", attempt))
+    assert router.stats()["providers"]["chat/groq"]["ewma_error_rate"] > 0.5
+    assert router.order("chat") == ["local", "groq"]
+    failing["groq"] = False
+    now[0] += 61
+    assert asyncio.run(router.run("chat", attempt)).provider == "groq"
+    assert router.stats()["providers"]["chat/groq"]["ewma_error_rate"] == 0.0
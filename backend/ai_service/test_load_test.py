@@ -0,0 +1,36 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from load_test import bucket_quantile, parse_args, percentile, run_load_test
+
+
+def test_percentile_and_bucket_quantile():
+    assert percentile([], 0.5) is None
+    assert percentile([3.0, 1.0, 2.0], 0.5) == 2.0
+    assert percentile([0.0, 10.0], 0.95) == pytest.approx(9.5)
+    # 10 observations in (0, 0.1], 10 in (0.1, 0.2]
+    buckets = {0.1: 10.0, 0.2: 20.0, float("inf"): 20.0}
+    assert bucket_quantile(buckets, 0.5) == pytest.approx(0.1)
+    assert bucket_quantile(buckets, 0.75) == pytest.approx(0.15)
+    assert bucket_quantile({float("inf"): 0.0}, 0.5) is None
+
+
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+def test_small_run_covers_every_endpoint(tmp_path, monkeypatch):
+    # Anything written to the working directory would be left behind
+    monkeypatch.chdir(tmp_path)
+    args = parse_args(["--candidates", "2", "--arrival-rate", "0", "--turns", "1", "--think-time", "0",
+                       "--llm-latency", "0", "--llm-tokens-per-second", "0", "--embed-ms-per-text", "0",
+                       "--output", str(tmp_path / "results.json")])
+    results = asyncio.run(run_load_test(args))
+    assert results["candidates"] == {"started": 2, "completed": 2, "failed": 0}
+    assert results["errors"] == {}
+    assert {name: row["count"] for name, row in results["endpoints"].items()} == {
+        "chat_init": 2, "chat_turn": 2, "cv_parse": 2, "report": 2}
+    for stage in ("pdf_extraction", "chunking", "embedding", "qdrant_upsert", "pdf_render", "llm:chat:complete"):
+        assert results["stages"][stage]["count"] >= 2
+    json.dumps(results)
+    assert os.listdir(tmp_path) == []
@@ -25,8 +25,16 @@ def test_parse_cv_mock_pdf(mocker):
     # Use MagicMock for objects that need magic method support like __iter__
     mock_doc = MagicMock()
     mock_page = MagicMock()
-    mock_page.get_text.return_value = "Experience\n\nSoftware Engineer"
+    mock_page.number = 0
+    mock_page.get_text.return_value = {"blocks": [
+        {"type": 0, "number": 0, "lines": [{"spans": [{"text": "Experience", "size": 12, "flags": 16, "font": "Helvetica-Bold"}]}]},
+        {"type": 0, "number": 1, "lines": [{"spans": [{"text": "Software Engineer", "size": 11, "flags": 0, "font": "Helvetica"}]}]},
+    ]}
     mock_doc.__iter__.return_value = [mock_page]
+    # documents.py opens PDFs with `with fitz.open(...) as doc` and indexes pages
+    mock_doc.__enter__.return_value = mock_doc
+    mock_doc.page_count = 1
+    mock_doc.__getitem__.side_effect = lambda number: mock_page
     
     mocker.patch("fitz.open", return_value=mock_doc)
 
@@ -0,0 +1,59 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import main
+from app_state import AppState
+from metrics import stage
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_times_block_and_counts_errors():
+    before = sample("intelliview_stage_seconds_count", stage="unit_test")
+    errors = sample("intelliview_errors_total", stage="unit_test", type="ValueError")
+    with stage("unit_test"):
+        pass
+    with pytest.raises(ValueError):
+        with stage("unit_test"):
+            raise ValueError("boom")
+    assert sample("intelliview_stage_seconds_count", stage="unit_test") == before + 2
+    assert sample("intelliview_errors_total", stage="unit_test", type="ValueError") == errors + 1
+
+
+def test_completion_records_tokens_and_rate(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "groq")
+    monkeypatch.delenv("LLM_ROUTES", raising=False)
+    state = AppState()
+    labels = {"provider": "groq", "call_type": "expansion"}
+    prompt_before = sample("intelliview_llm_tokens_total", kind="prompt", **labels)
+    completion_before = sample("intelliview_llm_tokens_total", kind="completion", **labels)
+    rate_before = sample("intelliview_llm_completion_tokens_per_second_count", provider="groq")
+    with patch.object(state.llm, "provider_completion", new=AsyncMock(return_value="x" * 35)):
+        assert asyncio.run(state.llm.call("y" * 70, call_type="expansion")) == "x" * 35
+    # TokenCounter's estimate without a tokenizer: 3.5 characters per token
+    assert sample("intelliview_llm_tokens_total", kind="prompt", **labels) == prompt_before + 20
+    assert sample("intelliview_llm_tokens_total", kind="completion", **labels) == completion_before + 10
+    assert sample("intelliview_llm_completion_tokens_per_second_count", provider="groq") == rate_before + 1
+    assert sample("intelliview_llm_generation_seconds_count", mode="complete", **labels) >= 1
+
+
+def test_requests_are_labelled_by_route_template():
+    state = main.create_state()
+    previous, main.app.state.services = main.app.state.services, state
+    endpoint = "/v1/chat/{cv_session_id}/transcript"
+    before = sample("intelliview_request_seconds_count", endpoint=endpoint, method="GET", status="404")
+    try:
+        client = TestClient(main.app)
+        assert client.get("/v1/chat/unknown-session/transcript").status_code == 404
+        body = client.get("/metrics").text
+    finally:
+        main.app.state.services = previous
+    assert sample("intelliview_request_seconds_count", endpoint=endpoint, method="GET", status="404") == before + 1
+    assert sample("intelliview_requests_in_flight", endpoint=endpoint) == 0
+    assert "intelliview_stage_seconds" in body and "intelliview_llm_tokens_total" in body
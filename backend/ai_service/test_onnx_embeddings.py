@@ -0,0 +1,79 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from onnx_embeddings import EMBED_ONNX_DIR, EMBED_ONNX_MIN_COSINE, OnnxSentenceEncoder, cosine_parity
+
+
+class FakeTokenizer:
+    """One token per word, id = word length, padded to the longest text."""
+
+    def encode_batch(self, texts):
+        ids = [[len(word) for word in text.split()] for text in texts]
+        width = max(len(row) for row in ids)
+        return [SimpleNamespace(ids=row + [0] * (width - len(row)),
+                                attention_mask=[1] * len(row) + [0] * (width - len(row)),
+                                type_ids=[0] * width) for row in ids]
+
+
+class FakeSession:
+    def __init__(self):
+        self.batches = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def get_outputs(self):
+        return [SimpleNamespace(shape=["batch", "sequence", 2])]
+
+    def run(self, output_names, feeds):
+        assert set(feeds) == {"input_ids", "attention_mask"}
+        self.batches.append(feeds["input_ids"].shape)
+        ids = feeds["input_ids"].astype(np.float32)
+        # Padding positions get a large value, which pooling must ignore
+        first = np.where(feeds["attention_mask"] == 1, ids, 100.0)
+        return [np.stack([first, np.ones_like(ids)], axis=-1)]
+
+
+def test_mean_pools_over_mask_and_normalises():
+    encoder = OnnxSentenceEncoder(FakeSession(), FakeTokenizer(), normalize=False)
+    vectors = encoder.encode(["ab abcd", "abc"])
+    assert vectors.shape == (2, 2)
+    assert vectors.tolist() == [[3.0, 1.0], [3.0, 1.0]]
+
+    normalised = OnnxSentenceEncoder(FakeSession(), FakeTokenizer()).encode("ab abcd")
+    assert normalised.shape == (2,)
+    assert np.isclose(np.linalg.norm(normalised), 1.0)
+
+def test_length_sorted_batches_keep_input_order():
+    session = FakeSession()
+    encoder = OnnxSentenceEncoder(session, FakeTokenizer(), normalize=False)
+    vectors = encoder.encode(["a", "a bb ccc dddd", "ab", "a bb ccc"], batch_size=2)
+    assert [v[0] for v in vectors] == [1.0, 2.5, 2.0, 2.0]
+    # The two long texts share a batch, so the short ones are not padded to their length
+    assert session.batches == [(2, 4), (2, 1)]
+
+def test_cosine_parity_reports_drift():
+    class Scaled:
+        def __init__(self, noise):
+            self.noise = noise
+
+        def encode(self, texts, convert_to_numpy=True):
+            return np.array([[1.0, float(len(t)) + self.noise] for t in texts])
+
+    result = cosine_parity(Scaled(0.0), Scaled(0.0), ["a", "bb"])
+    assert result["dim"] == 2 and result["min_cosine"] == pytest.approx(1.0)
+    assert cosine_parity(Scaled(0.0), Scaled(5.0), ["a", "bb"])["min_cosine"] < 0.99
+
+@pytest.mark.parametrize("quantized", [False, True])
+def test_onnx_export_matches_pytorch(quantized):
+    pytest.importorskip("onnxruntime")
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    if not os.path.isdir(EMBED_ONNX_DIR):
+        pytest.skip(f"No ONNX export in {EMBED_ONNX_DIR}; run export_onnx_embeddings.py")
+    reference = sentence_transformers.SentenceTransformer("all-MiniLM-L6-v2")
+    result = cosine_parity(reference, OnnxSentenceEncoder.load(EMBED_ONNX_DIR, quantized=quantized))
+    assert result["dim"] == 384
+    assert result["min_cosine"] >= EMBED_ONNX_MIN_COSINE
@@ -0,0 +1,76 @@
+import asyncio
+from prompt_builder import HistoryCompressor, TokenCounter, format_turn
+
+
+def word_counter():
+    return TokenCounter(tokenize=lambda text: text.split())
+
+def make_history(n):
+    return [{"role": "assistant" if i % 2 == 0 else "user", "content": f"turn {i} " + "word " * 8}
+            for i in range(n)]
+
+
+class RecordingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, previous, turns):
+        self.calls.append((previous, [t["content"].split()[1] for t in turns]))
+        return f"{previous} +{len(turns)}".strip()
+
+def test_truncate_fits_budget():
+    counter = word_counter()
+    text = "one two three four five six"
+    truncated = counter.truncate(text, 3)
+    assert counter.count(truncated) <= 3
+    assert counter.truncate(text, 10) == text
+
+def test_fit_keeps_leading_items():
+    counter = word_counter()
+    assert counter.fit(["a b", "c d", "e f"], 5) == ["a b", "c d"]
+
+def test_heuristic_count_without_tokenizer():
+    assert TokenCounter(chars_per_token=4).count("x" * 10) == 3
+
+def test_short_history_is_kept_verbatim():
+    summarizer = RecordingSummarizer()
+    compressor = HistoryCompressor(word_counter(), summarizer, history_budget=500, summary_budget=50)
+    history = make_history(4)
+    summary, recent = asyncio.run(compressor.compress("s1", history))
+    assert summary == "" and recent == history
+    assert summarizer.calls == []
+
+def test_old_turns_fold_incrementally():
+    counter = word_counter()
+    turn_cost = counter.count(format_turn(make_history(1)[0]))
+    summarizer = RecordingSummarizer()
+    compressor = HistoryCompressor(counter, summarizer, history_budget=turn_cost * 6 + 10,
+                                   summary_budget=10, fold_target=0.5)
+    history = make_history(8)
+    summary, recent = asyncio.run(compressor.compress("s1", history))
+    assert len(summarizer.calls) == 1
+    folded = summarizer.calls[0][1]
+    assert recent == history[len(folded):]
+    assert counter.count("".join(format_turn(m) for m in recent)) <= turn_cost * 6
+
+    # Next turn: no new overflow, no new summary call
+    history += make_history(10)[8:9]
+    asyncio.run(compressor.compress("s1", history))
+    assert len(summarizer.calls) == 1
+
+    # Eventually only the newly evicted turns are sent, with the previous summary
+    history = make_history(14)
+    asyncio.run(compressor.compress("s1", history))
+    assert len(summarizer.calls) == 2
+    previous, turns = summarizer.calls[1]
+    assert previous == summary
+    assert turns[0] == str(len(folded))
+
+def test_mismatched_history_resets_digest():
+    counter = word_counter()
+    turn_cost = counter.count(format_turn(make_history(1)[0]))
+    summarizer = RecordingSummarizer()
+    compressor = HistoryCompressor(counter, summarizer, history_budget=turn_cost * 4 + 10, summary_budget=10)
+    asyncio.run(compressor.compress("s1", make_history(8)))
+    summary, recent = asyncio.run(compressor.compress("s1", make_history(2)))
+    assert summary == "" and len(recent) == 2
@@ -0,0 +1,64 @@
+import asyncio
+import numpy as np
+import pytest
+from query_expansion import QueryExpander, extract_keywords
+
+HISTORY = [
+    {"role": "assistant", "content": "How did you deploy your FastAPI services?"},
+    {"role": "user", "content": "We used Docker and Kubernetes on GKE."},
+    {"role": "assistant", "content": "How did you handle zero-downtime migrations in PostgreSQL?"},
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.embedded = []
+        self.prompts = []
+
+    async def embed_query(self, text):
+        self.embedded.append(text)
+        return [1.0, 0.0] if "PostgreSQL" in text else [0.0, 1.0]
+
+    async def call_llm(self, prompt, max_tokens=500, stop=None):
+        self.prompts.append(prompt)
+        return '"PostgreSQL migrations"'
+
+
+def make(mode):
+    recorder = Recorder()
+    return recorder, QueryExpander(recorder.embed_query, recorder.call_llm, mode=mode)
+
+def test_extract_keywords_prefers_technical_terms():
+    keywords = extract_keywords(["I think we used Redis and C++ for the matching engine with CI/CD"])
+    assert "Redis" in keywords and "C++" in keywords and "CI/CD" in keywords
+    assert "think" not in keywords and "the" not in keywords
+
+def test_weighted_mode_needs_no_llm():
+    recorder, expander = make("weighted")
+    vector = asyncio.run(expander.query_vector("I used pg_repack and expand/contract.", HISTORY))
+    assert recorder.prompts == []
+    assert recorder.embedded[1] == HISTORY[-1]["content"]
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert vector[0] > 0 and vector[1] > 0
+
+def test_keywords_mode_needs_no_llm():
+    recorder, expander = make("keywords")
+    asyncio.run(expander.query_vector("Blue/green with Alembic.", HISTORY))
+    assert recorder.prompts == []
+    assert "Alembic" in recorder.embedded[0]
+
+def test_llm_mode_still_available():
+    recorder, expander = make("llm")
+    asyncio.run(expander.query_vector("answer", HISTORY))
+    assert len(recorder.prompts) == 1
+    assert recorder.embedded == ["PostgreSQL migrations"]
+
+def test_no_history_embeds_message():
+    recorder, expander = make("llm")
+    asyncio.run(expander.query_vector("INIT_INTERVIEW", []))
+    assert recorder.prompts == []
+    assert recorder.embedded == ["INIT_INTERVIEW"]
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        QueryExpander(None, None, mode="magic")
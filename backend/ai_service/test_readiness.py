@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from readiness import FAILED, LAZY, READY, Readiness
+
+
+def test_phase_records_status_and_timing():
+    now = [0.0]
+    readiness = Readiness(clock=lambda: now[0])
+    with readiness.phase("embeddings"):
+        now[0] = 2.5
+    report = readiness.report()["embeddings"]
+    assert report["status"] == READY
+    assert report["load_seconds"] == 2.5
+
+def test_failed_phase_keeps_error():
+    readiness = Readiness()
+    with pytest.raises(RuntimeError):
+        with readiness.phase("llm:local", "warmup"):
+            raise RuntimeError("no model file")
+    assert readiness.status("llm:local") == FAILED
+    assert "no model file" in readiness.report()["llm:local"]["error"]
+    assert not readiness.usable("llm:local")
+
+def test_lazy_components_count_as_usable():
+    readiness = Readiness()
+    readiness.register("llm:groq", LAZY)
+    readiness.register("qdrant")
+    assert readiness.usable("llm:groq")
+    assert not readiness.all_usable(["llm:groq", "qdrant"])
+
+
+class FlakyVectors:
+    def __init__(self, failures):
+        self.failures = failures
+
+    async def ensure_collection(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("qdrant down")
+
+
+def test_qdrant_down_at_startup_is_reported_then_recovers():
+    state = main.create_state(vectors=FlakyVectors(2))
+    for name in ("embeddings", "llm:groq", "llm:local"):
+        state.readiness.register(name, LAZY)
+    previous, main.app.state.services = main.app.state.services, state
+    try:
+        assert not asyncio.run(main.connect_qdrant(state))
+        down = TestClient(main.app).get("/ready")
+        asyncio.run(main.retry_qdrant(state, interval=0))
+        up = TestClient(main.app).get("/ready")
+    finally:
+        main.app.state.services = previous
+    assert down.status_code == 503 and down.json()["components"]["qdrant"]["status"] == FAILED
+    assert up.status_code == 200 and state.readiness.status("qdrant") == READY
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from report_jobs import InvalidCallback, QueueFull, ReportJobQueue, ReportJobStore, check_callback_url
+
+
+async def wait_for(queue, job_id, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await queue.get(job_id)
+        if job["status"] in ("succeeded", "failed") or asyncio.get_running_loop().time() > deadline:
+            return job
+        await asyncio.sleep(0.01)
+
+
+def test_job_runs_and_result_is_persisted(tmp_path):
+    async def run_job(request):
+        return {"report_filename": f"{request['candidate_name']}.pdf"}
+
+    async def run():
+        queue = ReportJobQueue(run_job, db_path=str(tmp_path / "jobs.db"))
+        job = await queue.submit({"candidate_name": "ada"})
+        done = await wait_for(queue, job["id"])
+        await queue.stop()
+        return queue, done
+
+    queue, done = asyncio.run(run())
+    assert done["status"] == "succeeded"
+    assert done["result"] == {"report_filename": "ada.pdf"}
+    assert queue.stats()["succeeded"] == 1
+
+def test_failed_job_records_error(tmp_path):
+    async def run_job(request):
+        raise RuntimeError("llm down")
+
+    async def run():
+        queue = ReportJobQueue(run_job, db_path=str(tmp_path / "jobs.db"))
+        job = await queue.submit({})
+        done = await wait_for(queue, job["id"])
+        await queue.stop()
+        return done
+
+    done = asyncio.run(run())
+    assert done["status"] == "failed"
+    assert done["error"] == "llm down"
+
+def test_submit_rejects_when_queue_full(tmp_path):
+    async def run():
+        gate = asyncio.Event()
+
+        async def run_job(request):
+            await gate.wait()
+            return {}
+
+        queue = ReportJobQueue(run_job, db_path=str(tmp_path / "jobs.db"), workers=1, max_queued=1)
+        await queue.submit({})
+        await asyncio.sleep(0.01)
+        await queue.submit({})
+        try:
+            await queue.submit({})
+            return False
+        except QueueFull:
+            return True
+        finally:
+            gate.set()
+            await queue.stop()
+
+    assert asyncio.run(run())
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+
+    async def never(request):
+        await asyncio.Event().wait()
+
+    async def first():
+        queue = ReportJobQueue(never, db_path=db_path, workers=0)
+        job = await queue.submit({"n": 1})
+        return job["id"]
+
+    job_id = asyncio.run(first())
+
+    async def second():
+        async def run_job(request):
+            return {"n": request["n"]}
+        queue = ReportJobQueue(run_job, db_path=db_path)
+        await queue.start()
+        done = await wait_for(queue, job_id)
+        await queue.stop()
+        return done
+
+    assert asyncio.run(second())["result"] == {"n": 1}
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    async def run_job(request):
+        return {}
+
+    async def run():
+        queue = ReportJobQueue(run_job, db_path=str(tmp_path / "jobs.db"), retention_seconds=60)
+        job = await queue.submit({})
+        await wait_for(queue, job["id"])
+        await queue.stop()
+        assert await queue.purge(now=time.time() + 30) == 0
+        assert await queue.purge(now=time.time() + 120) == 1
+        return await queue.get(job["id"])
+
+    assert asyncio.run(run()) is None
+
+def test_callback_url_must_be_allow_listed(tmp_path):
+    assert check_callback_url("https://hooks.example.com/report", {"hooks.example.com"})
+    for url in ("https://evil.example.net/x", "file:///etc/passwd", "http://169.254.169.254/latest", "not a url"):
+        with pytest.raises(InvalidCallback):
+            check_callback_url(url, {"hooks.example.com"})
+
+    async def run():
+        queue = ReportJobQueue(lambda request: None, db_path=str(tmp_path / "jobs.db"), workers=0, callback_hosts=set())
+        with pytest.raises(InvalidCallback):
+            await queue.submit({}, "https://hooks.example.com/report")
+        return queue.store
+
+    # Rejected before anything is stored
+    assert asyncio.run(run()) is None
+
+def test_job_that_keeps_crashing_the_process_is_given_up(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    store = ReportJobStore(db_path)
+    job = store.create({}, None)
+    # Each start that never finished, as when the process died mid-job
+    for _ in range(3):
+        store.mark_running(job["id"])
+    store.close()
+    ran = []
+
+    async def run_job(request):
+        ran.append(request)
+        return {}
+
+    async def run():
+        queue = ReportJobQueue(run_job, db_path=db_path, max_attempts=3)
+        await queue.start()
+        done = await wait_for(queue, job["id"])
+        await queue.stop()
+        return done
+
+    done = asyncio.run(run())
+    assert ran == []
+    assert done["status"] == "failed" and "3 attempts" in done["error"]
+
+def test_sqlite_calls_stay_off_the_event_loop_thread(tmp_path):
+    threads = set()
+
+    class RecordingStore(ReportJobStore):
+        def get(self, job_id):
+            threads.add(threading.get_ident())
+            return super().get(job_id)
+
+        def create(self, request, callback_url):
+            threads.add(threading.get_ident())
+            return super().create(request, callback_url)
+
+    async def run_job(request):
+        return {}
+
+    async def run():
+        queue = ReportJobQueue(run_job, db_path=str(tmp_path / "jobs.db"))
+        queue.store = RecordingStore(queue.db_path)
+        job = await queue.submit({})
+        await wait_for(queue, job["id"])
+        await queue.stop()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and loop_thread not in threads
@@ -0,0 +1,92 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+from report_store import LocalReportStore, ReportStore, ReportSweeper, S3ReportStore, create_report_store
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class FakeS3Client:
+    """In-memory stand-in for the subset of the boto3 S3 client the store uses."""
+
+    def __init__(self, page_size=2):
+        self.objects = {}
+        self.page_size = page_size
+        self.now = 0.0
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[(Bucket, Key)] = (bytes(Body), self.now)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey(Key)
+        body = self.objects[(Bucket, Key)][0]
+        return {"Body": type("Body", (), {"read": lambda self: body})()}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey(Key)
+        return {"ContentLength": len(self.objects[(Bucket, Key)][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + self.page_size]
+        contents = [{"Key": k, "Size": len(self.objects[(Bucket, k)][0]),
+                     "LastModified": datetime.fromtimestamp(self.objects[(Bucket, k)][1], tz=timezone.utc)}
+                    for k in page]
+        truncated = start + self.page_size < len(keys)
+        return {"Contents": contents, "IsTruncated": truncated,
+                "NextContinuationToken": str(start + self.page_size) if truncated else None}
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalReportStore(str(tmp_path))
+    store.put("report_a.pdf", b"%PDF-a")
+    assert store.get("report_a.pdf") == b"%PDF-a"
+    assert store.get("missing.pdf") is None
+    assert [r.name for r in store.list()] == ["report_a.pdf"]
+    assert store.delete("report_a.pdf") == 6
+
+def test_store_rejects_path_traversal(tmp_path):
+    store = LocalReportStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.get("../secrets.pdf")
+
+def test_sweep_by_age_then_size():
+    client = FakeS3Client()
+    store = S3ReportStore(client, bucket="b", prefix="r/", retention_seconds=100, max_bytes=20)
+    for i, at in enumerate([0, 150, 160, 170]):
+        client.now = at
+        store.put(f"{i}.pdf", b"x" * 10)
+    result = store.sweep(now=200)
+    # 0.pdf is past retention; 1.pdf is the oldest left while 30 bytes exceed the cap
+    assert result == {"removed": 2, "reclaimed_bytes": 20, "remaining_bytes": 20}
+    assert sorted(r.name for r in store.list()) == ["2.pdf", "3.pdf"]
+    assert store.get("0.pdf") is None
+
+def test_sweeper_reports_reclaimed_bytes(tmp_path):
+    store = LocalReportStore(str(tmp_path), retention_seconds=0, max_bytes=5)
+    store.put("old.pdf", b"x" * 10)
+    sweeper = ReportSweeper(store)
+    result = asyncio.run(sweeper.sweep_once())
+    assert result["reclaimed_bytes"] == 10
+    assert sweeper.stats()["reclaimed_bytes"] == 10
+
+def test_store_backends_are_checked_up_front(monkeypatch):
+    with pytest.raises(TypeError):
+        ReportStore()
+    with pytest.raises(ValueError):
+        create_report_store("gcs")
+    # boto3 is only imported for the s3 backend; a missing install names itself
+    monkeypatch.setitem(sys.modules, "boto3", None)
+    with pytest.raises(RuntimeError, match="boto3"):
+        create_report_store("s3")
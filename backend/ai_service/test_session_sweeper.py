@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+from qdrant_client import AsyncQdrantClient
+
+from app_state import AppState
+from session_sweeper import SessionSweeper
+from vector_store import VectorStore
+
+VECTOR = [1.0] + [0.0] * 383
+
+
+async def store_with_cvs():
+    store = VectorStore(AsyncQdrantClient(location=":memory:"))
+    await store.ensure_collection()
+    await store.upsert_chunks("a", "hash-1", ["one", "two"], [VECTOR, VECTOR])
+    await store.upsert_chunks("c", "hash-2", ["three"], [VECTOR])
+    return store
+
+
+def test_delete_session_only_deletes_unshared_points():
+    async def run():
+        store = await store_with_cvs()
+        await store.add_session(await store.find_content("hash-1"), "b")
+        first = await store.delete_session("a")
+        left = await store.find_content("hash-1")
+        second = await store.delete_session("b")
+        return first, left, second, await store.find_content("hash-1"), await store.find_content("hash-2")
+
+    first, left, second, gone, other = asyncio.run(run())
+    assert first == {"deleted_points": 0, "detached_points": 2}
+    assert all(p.payload["cv_session_id"] == ["b"] for p in left)
+    assert second == {"deleted_points": 2, "detached_points": 0}
+    assert gone == [] and len(other) == 1
+
+
+def test_sweeper_removes_expired_points_and_forgets_sessions():
+    forgotten = []
+
+    async def run():
+        store = await store_with_cvs()
+        sweeper = SessionSweeper(store, forget=forgotten.append, ttl_seconds=60, batch_size=1)
+        fresh = await sweeper.sweep_once()
+        expired = await sweeper.sweep_once(now=time.time() + 61)
+        return fresh, expired, sweeper.stats(), await store.find_content("hash-1")
+
+    fresh, expired, stats, left = asyncio.run(run())
+    assert fresh == {"removed_points": 0, "expired_sessions": 0}
+    assert expired == {"removed_points": 3, "expired_sessions": 2}
+    assert sorted(forgotten) == ["a", "c"]
+    assert stats["sweeps"] == 2 and stats["removed_points"] == 3
+    assert left == []
+
+
+def test_aliasing_restarts_the_ttl():
+    async def run():
+        store = await store_with_cvs()
+        sweeper = SessionSweeper(store, ttl_seconds=60)
+        points = await store.find_content("hash-1")
+        await store.client.set_payload(store.collection, {"created_at": time.time() - 120}, [p.id for p in points])
+        await store.add_session(points, "b")
+        return await sweeper.sweep_once(now=time.time() + 30)
+
+    assert asyncio.run(run()) == {"removed_points": 0, "expired_sessions": 0}
+
+
+def test_forget_session_clears_only_created_caches():
+    state = AppState()
+    state.summary_store.set("a", "summary")
+    state.transcript_store.sync("a", [{"role": "user", "content": "hi"}])
+    state.chunk_cache.put("a", [VECTOR], ["text"])
+    state.forget_session("a")
+    assert state.summary_store.get("a") is None
+    assert state.transcript_store.get("a") is None
+    assert state.chunk_cache.search("a", VECTOR) is None
+    assert not state.created("llm") and not state.created("llama_states")
+
+
+def test_concurrent_aliases_of_one_file_keep_every_session():
+    async def run():
+        store = await store_with_cvs()
+        # Every upload looked the file up before any alias was written
+        points = await store.find_content("hash-1")
+        await asyncio.gather(*(store.add_session(points, session) for session in ("b", "d", "e")))
+        return await store.find_content("hash-1")
+
+    points = asyncio.run(run())
+    assert all(sorted(p.payload["cv_session_id"]) == ["a", "b", "d", "e"] for p in points)
+
+
+def slow_writes(store):
+    # Widens the window between reading a session list and writing it back
+    original = store.client.set_payload
+
+    async def set_payload(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return await original(*args, **kwargs)
+
+    store.client.set_payload = set_payload
+
+
+def test_delete_racing_an_alias_keeps_the_new_session():
+    async def run():
+        store = await store_with_cvs()
+        await store.add_session(await store.find_content("hash-1"), "b")
+        slow_writes(store)
+        points = await store.find_content("hash-1")
+        await asyncio.gather(store.delete_session("a"), store.add_session(points, "d"))
+        return await store.find_content("hash-1")
+
+    points = asyncio.run(run())
+    assert all(sorted(p.payload["cv_session_id"]) == ["b", "d"] for p in points)
+
+
+def test_sweep_racing_an_alias_keeps_the_refreshed_points():
+    async def run():
+        store = await store_with_cvs()
+        points = await store.find_content("hash-1")
+        await store.client.set_payload(store.collection, {"created_at": time.time() - 120}, [p.id for p in points])
+        slow_writes(store)
+        sweeper = SessionSweeper(store, ttl_seconds=60)
+        await asyncio.gather(store.add_session(points, "b"), sweeper.sweep_once())
+        return await store.find_content("hash-1")
+
+    assert len(asyncio.run(run())) == 2
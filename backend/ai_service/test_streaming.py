@@ -0,0 +1,41 @@
+from streaming import CHAT_STOP_SEQUENCES, StreamCleaner, clean_response, sse_event
+
+
+def feed_all(tokens):
+    cleaner = StreamCleaner(CHAT_STOP_SEQUENCES)
+    deltas = []
+    for token in tokens:
+        deltas.append(cleaner.feed(token))
+        if cleaner.done:
+            break
+    return cleaner, "".join(deltas)
+
+def test_deltas_match_final_text():
+    cleaner, streamed = feed_all([" How ", "do you ", "scale ", "Postgres?"])
+    assert streamed == "How do you scale Postgres?"
+    assert cleaner.final() == "How do you scale Postgres?"
+
+def test_stop_sequence_split_across_tokens():
+    cleaner, streamed = feed_all(["Why Redis?", " [IN", "ST] ignored"])
+    assert cleaner.done
+    assert streamed == "Why Redis?"
+    assert cleaner.final() == "Why Redis?"
+
+def test_note_is_never_streamed():
+    cleaner, streamed = feed_all(["Explain gRPC. (", "no", "te: this is meta", " commentary)"])
+    assert "note" not in streamed.lower()
+    assert cleaner.final() == "Explain gRPC."
+    assert cleaner.final().startswith(streamed)
+
+def test_stop_sequence_leaves_no_dangling_parenthesis():
+    cleaner, streamed = feed_all(["What is Docker?", " (No", "te: x)"])
+    assert streamed == "What is Docker?"
+    assert cleaner.final() == "What is Docker?"
+
+def test_role_prefix_removed():
+    cleaner, streamed = feed_all(["Assis", "tant: What is ", "a mutex?"])
+    assert streamed == "What is a mutex?"
+    assert cleaner.final() == clean_response("Assistant: What is a mutex?")
+
+def test_sse_event_format():
+    assert sse_event("token", {"delta": "hi"}) == 'event: token\ndata: {"delta": "hi"}\n\n'
@@ -0,0 +1,114 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from summaries import SummaryStore
+from test_app_state import FakeEmbedder, FakeLLM, FakeVectors
+
+
+def test_entries_go_from_pending_to_ready_or_failed():
+    async def run():
+        store = SummaryStore()
+        gate = asyncio.Event()
+
+        async def summary():
+            await gate.wait()
+            return "Senior Python engineer"
+
+        async def broken():
+            raise RuntimeError("llm down")
+
+        ready, failed = store.start("a", summary()), store.start("b", broken())
+        assert ready["status"] == "pending" and ready["cv_summary"] is None
+        gate.set()
+        await asyncio.sleep(0.01)
+        return ready, failed
+
+    ready, failed = asyncio.run(run())
+    assert ready["status"] == "ready" and ready["cv_summary"] == "Senior Python engineer"
+    assert ready["finished_at"] is not None
+    assert failed["status"] == "failed" and failed["error"] == "llm down" and failed["cv_summary"] is None
+
+def test_oldest_entries_are_dropped_and_delete_forgets():
+    store = SummaryStore(max_entries=2)
+    for session in ("a", "b", "c"):
+        store.set(session, f"summary {session}")
+    assert store.get("a") is None and store.get("c")["cv_summary"] == "summary c"
+    store.delete("c")
+    assert store.get("c") is None
+
+def test_sessions_of_one_file_share_the_in_flight_summary():
+    calls = []
+
+    async def run():
+        store = SummaryStore()
+        gate = asyncio.Event()
+
+        async def summarize():
+            calls.append(1)
+            await gate.wait()
+            return "Data engineer"
+
+        first = store.start_for_content("a", "hash-1", summarize)
+        # A duplicate upload while the first summary is still pending
+        second = store.start_for_content("b", "hash-1", summarize)
+        gate.set()
+        await asyncio.sleep(0.01)
+        # Once finished, a later file with the same hash is summarized afresh
+        store.start_for_content("c", "hash-1", summarize)
+        await asyncio.sleep(0.01)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["cv_summary"] == second["cv_summary"] == "Data engineer"
+    assert len(calls) == 2
+
+
+def call(state, method, path, **kwargs):
+    previous, main.app.state.services = main.app.state.services, state
+    try:
+        return TestClient(main.app).request(method, path, **kwargs)
+    finally:
+        main.app.state.services = previous
+
+def test_summary_endpoint_reports_each_status():
+    state = main.create_state(vectors=FakeVectors([]))
+    state.summary_store.set("ready", "Seasoned SRE")
+    state.summary_store._entries["failed"] = {"status": "failed", "cv_summary": None, "error": "llm down",
+                                              "started_at": 0.0, "finished_at": 1.0}
+    body = call(state, "GET", "/v1/cv/ready/summary").json()
+    assert body == {"cv_session_id": "ready", "status": "ready", "cv_summary": "Seasoned SRE", "error": None}
+    assert call(state, "GET", "/v1/cv/failed/summary").json()["error"] == "llm down"
+    assert call(state, "GET", "/v1/cv/unknown/summary").status_code == 404
+
+def test_summary_stored_on_points_survives_a_restart():
+    vectors = FakeVectors(["Built a FastAPI service"])
+    vectors.points[0].payload["cv_summary"] = "Backend engineer, 6 years of Python"
+    llm = FakeLLM("Tell me about that service.")
+    # A fresh state has an empty summary store, as after a restart
+    state = main.create_state(embedder=FakeEmbedder(), vectors=vectors, llm=llm)
+    response = call(state, "POST", "/v1/chat/generate", json={
+        "cv_session_id": "s1", "message": "INIT_INTERVIEW", "is_init": True})
+    assert response.status_code == 200
+    assert "Backend engineer, 6 years of Python" in llm.prompts[0]
+    assert call(state, "GET", "/v1/cv/s1/summary").json()["status"] == "ready"
+
+def test_session_without_a_summary_is_looked_up_once():
+    scrolls = []
+
+    class CountingVectors(FakeVectors):
+        async def scroll_session(self, cv_session_id, limit):
+            scrolls.append(cv_session_id)
+            return await super().scroll_session(cv_session_id, limit)
+
+    state = main.create_state(vectors=CountingVectors(["Built a FastAPI service"]))
+
+    async def run():
+        return [await main.summary_entry(state, "s1") for _ in range(3)]
+
+    assert asyncio.run(run()) == [None, None, None]
+    assert scrolls == ["s1"]
+    # A summary started later replaces the remembered miss
+    state.summary_store.set("s1", "Backend engineer")
+    assert asyncio.run(main.summary_entry(state, "s1"))["cv_summary"] == "Backend engineer"
@@ -0,0 +1,43 @@
+import pytest
+from transcripts import TranscriptConflict, TranscriptStore
+
+HISTORY = [
+    {"role": "assistant", "content": "What is your experience with Kafka?"},
+    {"role": "user", "content": "Three years running consumers in Go."},
+]
+
+def test_append_and_formatted_prefix():
+    store = TranscriptStore()
+    assert store.append("s1", 0, HISTORY) == 2
+    transcript = store.get("s1")
+    assert transcript.messages == HISTORY
+    assert transcript.formatted_since(1) == "[INST] Three years running consumers in Go. [/INST] "
+
+def test_check_rejects_stale_seq():
+    store = TranscriptStore()
+    store.append("s1", 0, HISTORY)
+    assert store.check("s1", 2).seq == 2
+    with pytest.raises(TranscriptConflict) as exc:
+        store.check("s1", 1)
+    assert exc.value.expected_seq == 2
+
+def test_append_is_compare_and_set():
+    store = TranscriptStore()
+    store.append("s1", 0, HISTORY[:1])
+    with pytest.raises(TranscriptConflict):
+        store.append("s1", 0, HISTORY[1:])
+
+def test_sync_keeps_common_prefix_and_replaces_rest():
+    store = TranscriptStore()
+    store.append("s1", 0, HISTORY)
+    formatted = store.get("s1").formatted[0]
+    edited = [HISTORY[0], {"role": "user", "content": "Edited answer"}]
+    transcript = store.sync("s1", edited)
+    assert transcript.messages == edited
+    assert transcript.formatted[0] is formatted
+
+def test_lru_bound():
+    store = TranscriptStore(max_sessions=2)
+    for session in ("a", "b", "c"):
+        store.append(session, 0, HISTORY)
+    assert store.get("a") is None and store.get("c") is not None
@@ -0,0 +1,95 @@
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from prompt_builder import format_turn
+
+TRANSCRIPT_STORE_MAX_SESSIONS = int(os.getenv("TRANSCRIPT_STORE_MAX_SESSIONS", "10000"))
+
+
+class TranscriptConflict(Exception):
+    """The caller's sequence number does not match the stored transcript."""
+
+    def __init__(self, expected_seq: int):
+        super().__init__(f"Transcript out of sync, expected seq {expected_seq}")
+        self.expected_seq = expected_seq
+
+
+class Transcript:
+    __slots__ = ("messages", "formatted", "updated_at")
+
+    def __init__(self):
+        self.messages: List[dict] = []
+        # Mistral-formatted turns, parallel to `messages`, built once on append
+        self.formatted: List[str] = []
+        self.updated_at = time.time()
+
+    @property
+    def seq(self) -> int:
+        return len(self.messages)
+
+    def extend(self, messages: List[dict]):
+        for msg in messages:
+            msg = {"role": msg.get("role"), "content": msg.get("content")}
+            self.messages.append(msg)
+            self.formatted.append(format_turn(msg))
+        self.updated_at = time.time()
+
+    def formatted_since(self, index: int) -> str:
+        return "".join(self.formatted[index:])
+
+
+class TranscriptStore:
+    """Append-only interview transcripts keyed by cv_session_id.
+
+    Callers send only the new candidate message plus `seq`, the number of
+    messages they believe are stored; a mismatch raises TranscriptConflict
+    and the caller resyncs by sending the full history once.
+    """
+
+    def __init__(self, max_sessions: int = TRANSCRIPT_STORE_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._transcripts: "OrderedDict[str, Transcript]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[Transcript]:
+        return self._transcripts.get(session_id)
+
+    def _touch(self, session_id: str) -> Transcript:
+        transcript = self._transcripts.get(session_id)
+        if transcript is None:
+            transcript = self._transcripts[session_id] = Transcript()
+        self._transcripts.move_to_end(session_id)
+        while len(self._transcripts) > self.max_sessions:
+            self._transcripts.popitem(last=False)
+        return transcript
+
+    def sync(self, session_id: str, history: List[dict]) -> Transcript:
+        """Makes the stored transcript equal `history`, keeping the common prefix."""
+        transcript = self._touch(session_id)
+        common = 0
+        for stored, msg in zip(transcript.messages, history):
+            if stored["role"] != msg.get("role") or stored["content"] != msg.get("content"):
+                break
+            common += 1
+        del transcript.messages[common:]
+        del transcript.formatted[common:]
+        transcript.extend(history[common:])
+        return transcript
+
+    def check(self, session_id: str, seq: Optional[int]) -> Transcript:
+        transcript = self._touch(session_id)
+        if seq is not None and seq != transcript.seq:
+            raise TranscriptConflict(transcript.seq)
+        return transcript
+
+    def append(self, session_id: str, expected_seq: int, messages: List[dict]) -> int:
+        """Compare-and-append: fails if another turn landed since `expected_seq`."""
+        transcript = self._touch(session_id)
+        if transcript.seq != expected_seq:
+            raise TranscriptConflict(transcript.seq)
+        transcript.extend(messages)
+        return transcript.seq
+
+    def delete(self, session_id: str):
+        self._transcripts.pop(session_id, None)
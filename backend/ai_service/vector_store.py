@@ -0,0 +1,281 @@
+import asyncio
+import os
+import time
+import uuid
+import weakref
+from typing import Dict, List, Optional, Set, Tuple
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+from metrics import QDRANT_QUERY, QDRANT_UPSERT, stage
+
+COLLECTION_NAME = "cv_chunks"
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
+EMBEDDING_DIM = 384
+# Points deleted per request by the session sweeper
+QDRANT_DELETE_BATCH_SIZE = int(os.getenv("QDRANT_DELETE_BATCH_SIZE", "1000"))
+
+# Every filter the service runs; without an index Qdrant scans payloads.
+# Creating an index that already exists is a no-op.
+PAYLOAD_INDEXES = {
+    "cv_session_id": models.PayloadSchemaType.KEYWORD,
+    "content_hash": models.PayloadSchemaType.KEYWORD,
+    "section": models.PayloadSchemaType.KEYWORD,
+    "created_at": models.PayloadSchemaType.FLOAT,
+}
+
+
+def session_filter(cv_session_id: str, section: Optional[str] = None) -> models.Filter:
+    must = [
+        models.FieldCondition(
+            key="cv_session_id",
+            match=models.MatchValue(value=cv_session_id),
+        )
+    ]
+    if section is not None:
+        must.append(models.FieldCondition(key="section", match=models.MatchValue(value=section)))
+    return models.Filter(must=must)
+
+
+def expired_filter(cutoff: float) -> models.Filter:
+    return models.Filter(must=[models.FieldCondition(key="created_at", range=models.Range(lt=cutoff))])
+
+
+def payload_sessions(point) -> List[str]:
+    session_ids = point.payload.get("cv_session_id", [])
+    return [session_ids] if isinstance(session_ids, str) else list(session_ids)
+
+
+def content_filter(content_hash: str) -> models.Filter:
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="content_hash",
+                match=models.MatchValue(value=content_hash),
+            )
+        ]
+    )
+
+
+class VectorStore:
+    """The CV chunk collection in Qdrant. Chunk payloads carry `text`,
+    `chunk_index`, `section` (see chunking.py), `content_hash` and
+    `cv_session_id`, a list so re-uploads of the same file can alias
+    existing points, and `created_at`, when the newest of those sessions
+    was created (so a point only expires once all of its sessions have)."""
+
+    def __init__(self, client: AsyncQdrantClient, collection: str = COLLECTION_NAME, dim: int = EMBEDDING_DIM):
+        self.client = client
+        self.collection = collection
+        self.dim = dim
+        self._ready = False
+        # One lock per content hash while its session list is rewritten or its points deleted
+        self._alias_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @classmethod
+    def connect(cls, host: str = QDRANT_HOST, port: int = QDRANT_PORT, **kwargs) -> "VectorStore":
+        return cls(AsyncQdrantClient(host=host, port=port), **kwargs)
+
+    async def ensure_collection(self):
+        if self._ready:
+            return
+        if not await self.client.collection_exists(self.collection):
+            await self.client.create_collection(
+                collection_name=self.collection,
+                vectors_config=models.VectorParams(size=self.dim, distance=models.Distance.COSINE),
+            )
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            await self.client.create_payload_index(
+                collection_name=self.collection,
+                field_name=field_name,
+                field_schema=field_schema,
+            )
+        self._ready = True
+
+    async def scroll_all(self, scroll_filter: models.Filter, with_vectors: bool = False) -> list:
+        points, offset = [], None
+        while True:
+            page, offset = await self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=scroll_filter,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors,
+            )
+            points.extend(page)
+            if offset is None:
+                return points
+
+    async def find_content(self, content_hash: str) -> list:
+        return await self.scroll_all(content_filter(content_hash), with_vectors=True)
+
+    async def scroll_session(self, cv_session_id: str, limit: int) -> Tuple[list, Optional[object]]:
+        """First `limit` points of a session with vectors, and the next offset (None if that was all)."""
+        with stage(QDRANT_QUERY):
+            return await self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=session_filter(cv_session_id),
+                limit=limit,
+                with_payload=True,
+                with_vectors=True,
+            )
+
+    async def search_session(self, cv_session_id: str, query_vector: List[float], limit: int,
+                             section: Optional[str] = None) -> list:
+        with stage(QDRANT_QUERY):
+            return (await self.client.query_points(
+                collection_name=self.collection,
+                query=query_vector,
+                query_filter=session_filter(cv_session_id, section),
+                limit=limit
+            )).points
+
+    @staticmethod
+    def chunk_points(cv_session_ids: List[str], content_hash: str, chunks: List[str], vectors: List[List[float]],
+                     sections: Optional[List[str]] = None) -> List[models.PointStruct]:
+        created_at = time.time()
+        return [
+            models.PointStruct(
+                id=str(uuid.uuid4()),
+                vector=vector,
+                payload={
+                    "text": chunk,
+                    # A list so re-uploads of the same file can alias these points
+                    "cv_session_id": list(cv_session_ids),
+                    "content_hash": content_hash,
+                    "chunk_index": i,
+                    "section": sections[i] if sections else None,
+                    "created_at": created_at,
+                }
+            )
+            for i, (chunk, vector) in enumerate(zip(chunks, vectors))
+        ]
+
+    async def upsert_points(self, points: List[models.PointStruct], wait: bool = True):
+        """`wait=False` returns once Qdrant has queued the batch rather than
+        applied it, so bulk loads overlap network, indexing and embedding."""
+        with stage(QDRANT_UPSERT):
+            await self.client.upsert(collection_name=self.collection, points=points, wait=wait)
+
+    async def upsert_chunks(self, cv_session_id: str, content_hash: str, chunks: List[str],
+                            vectors: List[List[float]], sections: Optional[List[str]] = None):
+        await self.upsert_points(self.chunk_points([cv_session_id], content_hash, chunks, vectors, sections))
+
+    async def find_contents(self, content_hashes: List[str]) -> Dict[str, list]:
+        """Stored points (payload only) per content hash, for many files in one scroll."""
+        if not content_hashes:
+            return {}
+        points = await self.scroll_all(models.Filter(must=[
+            models.FieldCondition(key="content_hash", match=models.MatchAny(any=list(content_hashes)))
+        ]))
+        found: Dict[str, list] = {}
+        for point in points:
+            found.setdefault(point.payload["content_hash"], []).append(point)
+        return found
+
+    async def add_session(self, points: list, cv_session_id: str):
+        """Appends a session id to the `cv_session_id` list of existing points."""
+        await self.add_sessions(points, [cv_session_id])
+
+    def _alias_lock(self, content_hash: Optional[str]) -> asyncio.Lock:
+        lock = self._alias_locks.get(content_hash)
+        if lock is None:
+            lock = self._alias_locks[content_hash] = asyncio.Lock()
+        return lock
+
+    async def _reread(self, point_ids: list) -> list:
+        return await self.client.retrieve(self.collection, ids=point_ids, with_payload=["cv_session_id", "created_at"])
+
+    @staticmethod
+    def _by_content(points: list) -> Dict[Optional[str], list]:
+        groups: Dict[Optional[str], list] = {}
+        for point in points:
+            groups.setdefault(point.payload.get("content_hash"), []).append(point.id)
+        return groups
+
+    async def add_sessions(self, points: list, cv_session_ids: List[str]):
+        """Appends session ids to the points of one file. The list is re-read
+        under a per-file lock: `points` may predate a concurrent upload of the
+        same file, whose session would otherwise be overwritten."""
+        async with self._alias_lock(points[0].payload["content_hash"]):
+            current = await self._reread([points[0].id])
+            sessions = payload_sessions(current[0] if current else points[0])
+            await self.client.set_payload(
+                collection_name=self.collection,
+                # The new sessions restart the points' TTL
+                payload={"cv_session_id": sessions + [s for s in cv_session_ids if s not in sessions],
+                         "created_at": time.time()},
+                points=[p.id for p in points],
+            )
+
+    async def delete_points(self, point_ids: list, batch_size: int = QDRANT_DELETE_BATCH_SIZE):
+        for start in range(0, len(point_ids), batch_size):
+            await self.client.delete(
+                collection_name=self.collection,
+                points_selector=models.PointIdsList(points=point_ids[start:start + batch_size]),
+            )
+
+    async def delete_session(self, cv_session_id: str) -> dict:
+        """Detaches a session from its points and deletes the points no other
+        session still refers to. Each file's points are re-read under the
+        lock `add_sessions` takes, so a concurrent alias is not lost."""
+        points = await self.scroll_all(session_filter(cv_session_id))
+        deleted, detached = 0, 0
+        for content_hash, point_ids in self._by_content(points).items():
+            async with self._alias_lock(content_hash):
+                orphaned = []
+                # Points of one file share their session list, so this is one call per file
+                remaining: Dict[Tuple[str, ...], list] = {}
+                for point in await self._reread(point_ids):
+                    others = tuple(s for s in payload_sessions(point) if s != cv_session_id)
+                    if others:
+                        remaining.setdefault(others, []).append(point.id)
+                    else:
+                        orphaned.append(point.id)
+                for others, ids in remaining.items():
+                    await self.client.set_payload(
+                        collection_name=self.collection,
+                        payload={"cv_session_id": list(others)},
+                        points=ids,
+                    )
+                await self.delete_points(orphaned)
+            deleted += len(orphaned)
+            detached += sum(len(ids) for ids in remaining.values())
+        return {"deleted_points": deleted, "detached_points": detached}
+
+    async def delete_expired(self, cutoff: float, batch_size: int = QDRANT_DELETE_BATCH_SIZE) -> Tuple[int, Set[str]]:
+        """Deletes points whose `created_at` is before `cutoff`, `batch_size`
+        at a time. Returns how many were removed and the sessions they held.
+        Points stored before `created_at` existed never match. Points are
+        re-checked under the alias lock: an alias added meanwhile restarts
+        their TTL and keeps them."""
+        removed, session_ids = 0, set()
+        while True:
+            page, _ = await self.client.scroll(
+                collection_name=self.collection,
+                scroll_filter=expired_filter(cutoff),
+                limit=batch_size,
+                with_payload=["cv_session_id", "content_hash"],
+            )
+            if not page:
+                return removed, session_ids
+            for content_hash, point_ids in self._by_content(page).items():
+                async with self._alias_lock(content_hash):
+                    expired = [p for p in await self._reread(point_ids) if p.payload.get("created_at", cutoff) < cutoff]
+                    await self.delete_points([p.id for p in expired], batch_size)
+                for point in expired:
+                    session_ids.update(payload_sessions(point))
+                removed += len(expired)
+
+    async def set_content_summary(self, content_hash: str, cv_summary: str):
+        await self.client.set_payload(
+            collection_name=self.collection,
+            payload={"cv_summary": cv_summary},
+            points=content_filter(content_hash),
+        )
+
+    async def close(self):
+        await self.client.close()
@@ -120,6 +120,12 @@ describe('ChatGateway', () => {
 
       // Verify progress tracking
       expect(mockInterview.question_count).toBe(3);
+
+      // The closing note rides beside the message, not inside it
+      expect(httpService.post).toHaveBeenCalledWith(expect.any(String), expect.objectContaining({
+        message: text,
+        instruction: expect.stringContaining('last response'),
+      }));
       
       // Verify session_completed emitted
       expect(mockSocket.emit).toHaveBeenCalledWith('session_completed', expect.any(Object));
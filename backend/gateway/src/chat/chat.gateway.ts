@@ -100,6 +100,37 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
     }
   }
 
+  private async generateTurn(
+    aiServiceUrl: string,
+    cv_session_id: string,
+    message: string,
+    history: { role: string; content: string }[],
+    instruction?: string,
+  ) {
+    try {
+      // The AI service keeps the transcript; only send the new message
+      return await firstValueFrom(
+        this.httpService.post(`${aiServiceUrl}/v1/chat/generate`, {
+          cv_session_id,
+          message,
+          instruction,
+          seq: history.length,
+        }),
+      );
+    } catch (error) {
+      if (error.response?.status !== 409) throw error;
+      // Transcript missing or out of sync (e.g. AI service restart): resync with the full history
+      return firstValueFrom(
+        this.httpService.post(`${aiServiceUrl}/v1/chat/generate`, {
+          cv_session_id,
+          message,
+          instruction,
+          history,
+        }),
+      );
+    }
+  }
+
   @SubscribeMessage('candidate_message')
   async handleMessage(
     @MessageBody() data: { interviewId: string; text: string },
@@ -138,14 +169,15 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
       // If we reached the limit, we tell the AI to conclude
       const isLastQuestion = interview.question_count >= this.MAX_QUESTIONS;
       
-      const response = await firstValueFrom(
-        this.httpService.post(`${aiServiceUrl}/v1/chat/generate`, {
-          cv_session_id: cv_session_id,
-          message: isLastQuestion 
-            ? `${data.text} (Note: This is the last response. Conclude the interview and say goodbye.)` 
-            : data.text,
-          history: interview.messages.map(m => ({ role: m.role, content: m.content }))
-        })
+      const response = await this.generateTurn(
+        aiServiceUrl,
+        cv_session_id,
+        data.text,
+        interview.messages.map(m => ({ role: m.role, content: m.content })),
+        // Sent beside the message so it stays out of the stored transcript
+        isLastQuestion
+          ? 'Note: This is the last response. Conclude the interview and say goodbye.'
+          : undefined,
       );
 
       const aiText = response.data.response;
@@ -169,12 +201,12 @@ export class ChatGateway implements OnGatewayConnection, OnGatewayDisconnect {
           message: "Interview completed. Generating your technical report..." 
         });
         
-        // Trigger report generation in background
-        await this.interviewsService.evaluateInterview(interview.id, interview.tenant_id);
-        
-        client.emit('report_ready', { 
-          message: "Your evaluation is complete. Thank you!" 
-        });
+        // Trigger report generation in background; the socket turn does not wait on it
+        this.interviewsService.evaluateInterview(interview.id, interview.tenant_id)
+          .then(() => client.emit('report_ready', {
+            message: "Your evaluation is complete. Thank you!"
+          }))
+          .catch(error => console.error('Error generating report:', error.message));
       }
 
     } catch (error) {
@@ -122,19 +122,21 @@ export class InterviewsService {
     const aiServiceUrl = this.configService.get<string>('AI_SERVICE_URL', 'http://localhost:8001');
 
     try {
-      const response = await firstValueFrom(
-        this.httpService.post(`${aiServiceUrl}/v1/report/generate`, {
+      // Report generation runs as a job on the AI service; poll until it settles
+      const submitted = await firstValueFrom(
+        this.httpService.post(`${aiServiceUrl}/v1/report/jobs`, {
           candidate_name: interview.candidate_name,
           transcript: interview.messages.map(m => ({ role: m.role, content: m.content })),
           cv_session_id: interview.rubric?.cv_session_id
         })
       );
+      const report = await this.waitForReportJob(aiServiceUrl, submitted.data.job_id);
 
       interview.rubric = {
         ...interview.rubric,
-        evaluation: response.data.evaluation
+        evaluation: report.evaluation
       };
-      interview.report_url = response.data.report_filename;
+      interview.report_url = report.report_filename;
       interview.status = 'completed';
 
       return this.interviewRepository.save(interview);
@@ -143,4 +145,17 @@ export class InterviewsService {
       throw new InternalServerErrorException('Failed to generate report');
     }
   }
+
+  private async waitForReportJob(aiServiceUrl: string, jobId: string, intervalMs = 2000, timeoutMs = 10 * 60 * 1000) {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      const { data: job } = await firstValueFrom(
+        this.httpService.get(`${aiServiceUrl}/v1/report/jobs/${jobId}`)
+      );
+      if (job.status === 'succeeded') return job.result;
+      if (job.status === 'failed') throw new Error(`Report job failed: ${job.error}`);
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+    throw new Error(`Report job ${jobId} timed out`);
+  }
 }